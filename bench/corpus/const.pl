@@ -0,0 +1,13 @@
+const size = 100, step = 3, scale = 1000;
+var i, j, s;
+begin
+  s := 0; i := 0;
+  while i < size * size / 4 do
+  begin
+    j := i * (scale / 10) + step * step - 1;
+    if size > 0 then s := s + j / (scale * 2) - (step - 2);
+    while 0 <> 0 do s := 0;
+    i := i + 2 - 1
+  end;
+  write s; writeln
+end.
@@ -0,0 +1,16 @@
+function fib(n)
+begin
+  if n < 2 then return n;
+  return fib(n - 1) + fib(n - 2)
+end;
+
+var i, s;
+begin
+  s := 0; i := 0;
+  while i < 50 do
+  begin
+    s := s + fib(i / 2);
+    i := i + 1
+  end;
+  write s; writeln
+end.
@@ -0,0 +1,31 @@
+function multiply(x,y)
+  var a,b,c;
+begin a := x; b := y; c := 0;
+  while b > 0 do
+  begin
+    if odd b then c := c + a;
+    a := 2*a; b := b/2;
+  end;
+  return c
+end;
+
+function gcd(x,y)
+begin
+  if x <>y then
+  begin
+    if x < y then return gcd(x, y-x);
+    return gcd(x-y,y)
+  end;
+  return x
+end;
+
+var i, s;
+begin
+  i := 0; s := 0;
+  while i < 2000 do
+  begin
+    s := s + multiply(i, 12345) + gcd(i + 1, 36);
+    i := i + 1
+  end;
+  write s; writeln
+end.
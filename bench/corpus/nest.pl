@@ -0,0 +1,50 @@
+var total;
+
+function outer(n)
+  var a;
+  function middle(m)
+    var b;
+    function inner(k)
+      var c;
+      function leaf(j)
+      begin
+        total := total + a + b + c + j;
+        return j
+      end;
+    begin
+      c := 0;
+      while c < k do
+      begin
+        c := c + leaf(c) - c + 1
+      end;
+      return c
+    end;
+  begin
+    b := 0;
+    while b < m do
+    begin
+      b := b + 1;
+      if inner(b) <> b then write 0
+    end;
+    return b
+  end;
+begin
+  a := 0;
+  while a < n do
+  begin
+    a := a + 1;
+    if middle(a) <> a then write 0
+  end;
+  return a
+end;
+
+var i;
+begin
+  total := 0; i := 0;
+  while i < 6 do
+  begin
+    i := i + 1;
+    if outer(12) <> 12 then write 0
+  end;
+  write total; writeln
+end.
@@ -0,0 +1,9 @@
+var i;
+begin
+  i := 0;
+  while i < 100000 do
+  begin
+    write i; writeln;
+    i := i + 1
+  end
+end.
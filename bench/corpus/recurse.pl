@@ -0,0 +1,29 @@
+function fib(n)
+begin
+  if n < 2 then return n;
+  return fib(n - 1) + fib(n - 2)
+end;
+
+function ack(m, n)
+begin
+  if m = 0 then return n + 1;
+  if n = 0 then return ack(m - 1, 1);
+  return ack(m - 1, ack(m, n - 1))
+end;
+
+function depth(n)
+begin
+  if n = 0 then return 0;
+  return depth(n - 1) + 1
+end;
+
+var i, s;
+begin
+  s := 0; i := 0;
+  while i < 36 do
+  begin
+    s := s + fib(i / 2);
+    i := i + 1
+  end;
+  write s; write ack(2, 30); write depth(5000); writeln
+end.
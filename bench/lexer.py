@@ -0,0 +1,225 @@
+'''
+Benchmark of the lexer.
+
+Compare tokens per second of `SourceReader.next_token` in each `ReadMode` with the
+character-by-character `KeyTable` path which the lexer used before it became table-driven,
+and with a raw regular expression scan which creates no tokens.
+
+Execute by:
+
+    python -m bench.lexer [<source_program>] [<repeat>]
+'''
+import os
+import re
+import string
+import sys
+import tempfile
+import time
+from compiler.getsource import KeyWd, KeySym, KeyToken, KeyEtc, ReadMode, SourceReader
+
+class LegacyToken:
+    '''
+    The previous `Token` with `__dict__`, kept as the baseline of the benchmark.
+    '''
+    def __init__(self, kind, value=None):
+        self.kind = kind
+        self.value = value
+
+class LegacyKeyTable:
+    '''
+    The previous `KeyTable`, kept as the baseline of the benchmark.
+    '''
+    @classmethod
+    def is_keywd(self, token):
+        return token in [x.value for x in KeyWd.__members__.values()]
+
+    @classmethod
+    def to_keywd(self, token):
+        for x in KeyWd:
+            if x.value == token:
+                return x
+        return None
+
+    @classmethod
+    def to_kind(self, chara):
+        if chara == "":
+            return KeyEtc.Others
+
+        if chara in string.digits:
+            return KeyEtc.Digit
+        elif chara in string.ascii_letters:
+            return KeyEtc.Letter
+        elif chara == '+':
+            return KeySym.Plus
+        elif chara == '-':
+            return KeySym.Minus
+        elif chara == '*':
+            return KeySym.Mult
+        elif chara == '/':
+            return KeySym.Div
+        elif chara == '(':
+            return KeySym.Lparen
+        elif chara == ')':
+            return KeySym.Rparen
+        elif chara == '=':
+            return KeySym.Equal
+        elif chara == '<':
+            return KeySym.Lss
+        elif chara == '>':
+            return KeySym.Gtr
+        elif chara == ',':
+            return KeySym.Comma
+        elif chara == '.':
+            return KeySym.Period
+        elif chara == ';':
+            return KeySym.Semicolon
+        elif chara == ':':
+            return KeyEtc.Colon
+        else:
+            return KeyEtc.Others
+
+    @classmethod
+    def is_space(self, chara):
+        return chara == ' ' or chara == '\t'
+
+    @classmethod
+    def is_newline(self, chara):
+        return chara == '\n'
+
+class LegacySourceReader:
+    '''
+    The previous `SourceReader`, kept as the baseline of the benchmark.
+    '''
+    def __init__(self, input_file):
+        self.input_file = open(input_file, 'r')
+        self.line = None
+        self.line_index = 0
+        self.ch = None
+
+    def next_char(self):
+        if self.line == None:
+            self.line = self.input_file.readline()
+            if self.line == "":
+                self.line = None
+                return ""
+            self.line_index = 0
+
+        c = self.line[self.line_index]
+        self.line_index += 1
+        if self.line_index >= len(self.line):
+            self.line = None
+        return c
+
+    def next_token(self):
+        while self.ch == None \
+            or LegacyKeyTable.is_space(self.ch) \
+            or LegacyKeyTable.is_newline(self.ch):
+            self.ch = self.next_char()
+
+        kind = LegacyKeyTable.to_kind(self.ch)
+
+        if kind == KeyEtc.Letter:
+            ident = self.ch
+            self.ch = self.next_char()
+            while LegacyKeyTable.to_kind(self.ch) in [KeyEtc.Letter, KeyEtc.Digit]:
+                ident += self.ch
+                self.ch = self.next_char()
+            if LegacyKeyTable.is_keywd(ident):
+                token = LegacyToken(LegacyKeyTable.to_keywd(ident))
+            else:
+                token = LegacyToken(KeyToken.Id, ident)
+        elif kind == KeyEtc.Digit:
+            num = int(self.ch)
+            self.ch = self.next_char()
+            while LegacyKeyTable.to_kind(self.ch) == KeyEtc.Digit:
+                num = num * 10 + int(self.ch)
+                self.ch = self.next_char()
+            token = LegacyToken(KeyToken.Num, num)
+        elif kind == KeyEtc.Colon:
+            self.ch = self.next_char()
+            if self.ch == "=":
+                token = LegacyToken(KeySym.Assign)
+                self.ch = self.next_char()
+            else:
+                token = LegacyToken(KeyToken.Nul)
+        elif kind == KeySym.Lss:
+            self.ch = self.next_char()
+            if self.ch == "=":
+                token = LegacyToken(KeySym.LssEq)
+                self.ch = self.next_char()
+            elif self.ch == ">":
+                token = LegacyToken(KeySym.NotEq)
+                self.ch = self.next_char()
+            else:
+                token = LegacyToken(KeySym.Lss)
+        elif kind == KeySym.Gtr:
+            self.ch = self.next_char()
+            if self.ch == "=":
+                token = LegacyToken(KeySym.GtrEq)
+                self.ch = self.next_char()
+            else:
+                token = LegacyToken(KeySym.Gtr)
+        else:
+            token = LegacyToken(kind, self.ch)
+            self.ch = self.next_char()
+        return token
+
+    def close(self):
+        self.input_file.close()
+
+RAW_TOKEN = re.compile(rb'[A-Za-z][A-Za-z0-9]*|[0-9]+|:=|<=|<>|>=|[^ \t\r\n]')
+
+def raw_scan(file_name):
+    '''
+    Count tokens by a regular expression without creating tokens.
+    Return the number of tokens and the elapsed seconds.
+    '''
+    start = time.perf_counter()
+    with open(file_name, 'rb') as f:
+        n = sum(1 for _ in RAW_TOKEN.finditer(f.read()))
+    return n, time.perf_counter() - start
+
+def count_tokens(new_reader, file_name):
+    '''
+    Read all tokens of the file.
+    Return the number of tokens and the elapsed seconds.
+    '''
+    start = time.perf_counter()
+    reader = new_reader(file_name)
+    n = 0
+    try:
+        while True:
+            token = reader.next_token()
+            if token.kind == KeyEtc.Others and token.value == "":
+                break
+            n += 1
+    finally:
+        reader.close()
+    return n, time.perf_counter() - start
+
+def main(file_name, repeat):
+    with open(file_name, 'r') as f:
+        source = f.read()
+    fd, path = tempfile.mkstemp(suffix='.pl')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(source * repeat)
+        print("source: %d bytes" % os.path.getsize(path))
+        results = {}
+        readers = [('legacy', LegacySourceReader)] + \
+                  [(mode.value, lambda f, mode=mode: SourceReader(f, mode)) for mode in ReadMode]
+        for name, new_reader in readers:
+            n, sec = count_tokens(new_reader, path)
+            results[name] = n / sec
+            print("%-6s: %d tokens in %.3f sec (%.0f tokens/sec)" % (name, n, sec, n / sec))
+        n, sec = raw_scan(path)
+        print("%-6s: %d tokens in %.3f sec (%.0f tokens/sec)" % ('raw', n, sec, n / sec))
+        for mode in ReadMode:
+            print("speedup of %s: %.1fx" % (mode.value, results[mode.value] / results['legacy']))
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    file_name = sys.argv[1] if len(sys.argv) > 1 else 'resources/sample2.pl'
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    main(file_name, repeat)
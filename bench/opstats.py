@@ -0,0 +1,51 @@
+'''
+Frequencies of codes and sequences of codes over a corpus of programs.
+
+Count codes of compiled programs (static), or codes executed by `Pl0CodeGenerator.execute` (dynamic),
+merge them into the JSON stats in `-o FILE` if given, and print the most common sequences.
+Stats written by `main.py --opstats FILE` or by this script can be merged with `--merge FILE`.
+
+Execute by:
+
+    python -m bench.opstats [--dynamic] [-o <stats.json>] [--merge <stats.json>] ... [<source_program> ...]
+'''
+import argparse
+from compiler.opstats import OpStats, STATIC, DYNAMIC, load, accumulate
+from compiler.output import MemorySink
+from main import compile_source
+
+def collect(file_names, mode):
+    stats = OpStats(mode)
+    for file_name in file_names:
+        gen = compile_source(file_name)
+        if mode == STATIC:
+            stats.add_codes(gen.disassemble())
+        else:
+            gen.execute(MemorySink(), stats)
+    return stats
+
+def report(stats, k=10):
+    print("%s: %d codes of %d runs" % (stats.mode, stats.total(), stats.runs))
+    for n in stats.sizes:
+        print("  %d-grams:" % n)
+        for key, count in stats.most_common(n, k):
+            print("    %-24s %12d %6.2f%%" % (' '.join(key), count, 100.0 * count / max(stats.total(), 1)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Count sequences of codes of PL/0 programs.')
+    parser.add_argument('file_names', nargs='*', metavar='source_program')
+    parser.add_argument('--dynamic', action='store_true', help='count executed codes instead of compiled codes')
+    parser.add_argument('--merge', action='append', default=[], metavar='FILE',
+                        help='JSON stats merged into the result (repeatable)')
+    parser.add_argument('-o', '--output', metavar='FILE', help='merge the result into the JSON stats in FILE')
+    parser.add_argument('-k', type=int, default=10, help='num of the most common sequences printed (default: 10)')
+    args = parser.parse_args(argv)
+    stats = collect(args.file_names, DYNAMIC if args.dynamic else STATIC)
+    for file_name in args.merge:
+        stats.merge(load(file_name))
+    if args.output is not None:
+        stats = accumulate(stats, args.output)
+    report(stats, args.k)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+'''
+Benchmark suite of the phases of the compiler and the interpreters.
+
+For each program of the corpus, time reading tokens by `SourceReader` (tokens/sec),
+compiling by `Pl0Compiler` (lines/sec), and executing by `Pl0VM` and `Pl0CodeGenerator.execute`
+(instructions/sec), and measure the peak memory of compiling and executing by `tracemalloc`.
+Each phase is repeated after warmup runs, and the summary of the samples is written as JSON.
+`compare` reports phases whose min time or peak memory grew more than the threshold,
+and exits with 1 when any phase regressed.
+
+Execute by:
+
+    python -m bench.suite run [-o <results.json>] [--warmup N] [--reps N] [<source_program> ...]
+    python -m bench.suite compare [--threshold RATIO] <base.json> <new.json>
+'''
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from compiler.getsource import KeyEtc, ReadMode, SourceReader
+from compiler.vm import Pl0VM
+from compiler.output import MemorySink
+from bench.vm import count_instructions
+from main import compile_source
+
+# Programs benchmarked by default: loops, recursion, deep nesting and constant expressions
+CORPUS = [
+    'resources/sample2.pl',
+    'bench/corpus/loop.pl',
+    'bench/corpus/recurse.pl',
+    'bench/corpus/nest.pl',
+    'bench/corpus/const.pl',
+]
+WARMUP = 1
+REPS = 5
+# Min seconds of a sample. Short phases are repeated in a sample as `timeit` does
+MIN_TIME = 0.05
+# Default ratio of growth reported as a regression by `compare`
+THRESHOLD = 0.10
+FORMAT_VERSION = 1
+
+def read_tokens(file_name):
+    '''
+    Read all tokens of the file and return the number of them.
+    '''
+    reader = SourceReader(file_name, ReadMode.Buffer)
+    n = 0
+    try:
+        while True:
+            token = reader.next_token()
+            if token.kind == KeyEtc.Others and token.value == "":
+                return n
+            n += 1
+    finally:
+        reader.close()
+
+def measure(run, warmup=WARMUP, reps=REPS, min_time=MIN_TIME):
+    '''
+    Return the list of seconds of a run in `reps` samples after `warmup` runs.
+    A sample repeats runs until it takes `min_time`, where the num of runs is calibrated by the warmup.
+    '''
+    number = 1
+    for _ in range(max(warmup, 1)):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if elapsed > 0:
+            number = max(1, int(min_time / elapsed))
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        samples.append((time.perf_counter() - start) / number)
+    return samples
+
+def summarize(samples, work, unit):
+    '''
+    Return the summary of samples of seconds of doing `work` in `unit`.
+    '''
+    median = statistics.median(samples)
+    return {
+        'samples': samples,
+        'min': min(samples),
+        'median': median,
+        'mean': statistics.mean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'rate': work / median if median > 0 else 0.0,
+        'unit': unit,
+    }
+
+def peak_memory(run):
+    '''
+    Return the peak size in bytes of memory allocated by `run`.
+    '''
+    tracemalloc.start()
+    try:
+        run()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def bench_file(file_name, warmup=WARMUP, reps=REPS):
+    with open(file_name, 'rb') as f:
+        source = f.read()
+    gen = compile_source(file_name)
+    lines = source.count(b'\n')
+    tokens = read_tokens(file_name)
+    instructions = count_instructions(gen)
+    phases = {
+        'lex': summarize(measure(lambda: read_tokens(file_name), warmup, reps), tokens, 'tokens/sec'),
+        'compile': summarize(measure(lambda: compile_source(file_name), warmup, reps), lines, 'lines/sec'),
+        'vm': summarize(measure(lambda: Pl0VM(gen.code, out=MemorySink()).run(), warmup, reps),
+                        instructions, 'instructions/sec'),
+        'execute': summarize(measure(lambda: gen.execute(MemorySink()), warmup, reps),
+                             instructions, 'instructions/sec'),
+    }
+    memory = {
+        'compile': peak_memory(lambda: compile_source(file_name)),
+        'vm': peak_memory(lambda: Pl0VM(gen.code, out=MemorySink()).run()),
+    }
+    return {
+        'bytes': len(source),
+        'lines': lines,
+        'tokens': tokens,
+        'codes': len(gen.code),
+        'instructions': instructions,
+        'phases': phases,
+        'peak_memory': memory,
+    }
+
+def run(file_names, warmup=WARMUP, reps=REPS):
+    '''
+    Benchmark programs and return the results as a dict.
+    '''
+    if reps < 1:
+        raise RuntimeError("reps should be positive: " + str(reps))
+    return {
+        'version': FORMAT_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'warmup': warmup,
+        'reps': reps,
+        'programs': dict((file_name, bench_file(file_name, warmup, reps)) for file_name in file_names),
+    }
+
+def compare(base, new, threshold=THRESHOLD):
+    '''
+    Return the list of (program, metric, base value, new value, ratio, regressed)
+    for each phase and peak memory of programs in both results.
+    A metric regressed when the min time or the peak memory grew more than `threshold`.
+    The min time is the least disturbed by other processes.
+    '''
+    for results in (base, new):
+        if results.get('version') != FORMAT_VERSION:
+            raise RuntimeError("unsupported version of results: " + str(results.get('version')))
+    rows = []
+    for file_name in sorted(set(base['programs']) & set(new['programs'])):
+        b, n = base['programs'][file_name], new['programs'][file_name]
+        metrics = [('time.' + phase, b['phases'][phase]['min'], n['phases'][phase]['min'])
+                   for phase in b['phases'] if phase in n['phases']]
+        metrics += [('memory.' + phase, b['peak_memory'][phase], n['peak_memory'][phase])
+                    for phase in b['peak_memory'] if phase in n['peak_memory']]
+        for metric, old, value in metrics:
+            ratio = value / old if old > 0 else 1.0
+            rows.append((file_name, metric, old, value, ratio, ratio > 1 + threshold))
+    return rows
+
+def print_results(results):
+    for file_name, r in results['programs'].items():
+        print("%s: %d lines, %d tokens, %d codes, %d instructions"
+              % (file_name, r['lines'], r['tokens'], r['codes'], r['instructions']))
+        for phase, s in r['phases'].items():
+            print("  %-8s %10.6f sec (stdev %.6f) %14.0f %s" % (phase, s['median'], s['stdev'], s['rate'], s['unit']))
+        for phase, size in r['peak_memory'].items():
+            print("  %-8s %10d bytes at peak" % (phase, size))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the phases of the compiler and the interpreters.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('run', help='benchmark programs')
+    p.add_argument('file_names', nargs='*', default=CORPUS, metavar='source_program')
+    p.add_argument('-o', '--output', metavar='FILE', help='write the results to FILE as JSON')
+    p.add_argument('--warmup', type=int, default=WARMUP, help='runs before measurement (default: %d)' % WARMUP)
+    p.add_argument('--reps', type=int, default=REPS, help='measured runs (default: %d)' % REPS)
+    p = commands.add_parser('compare', help='compare two results and report regressions')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=THRESHOLD,
+                   help='ratio of growth reported as a regression (default: %.2f)' % THRESHOLD)
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.file_names, args.warmup, args.reps)
+        print_results(results)
+        if args.output is not None:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=1)
+        return 0
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(base, new, args.threshold)
+    for file_name, metric, old, value, ratio, regressed in rows:
+        print("%-28s %-16s %14.6g %14.6g %+7.1f%%%s"
+              % (file_name, metric, old, value, 100.0 * (ratio - 1), '  REGRESSION' if regressed else ''))
+    return 1 if any(row[5] for row in rows) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+'''
+Generator of synthetic PL/0 programs for scaling tests.
+
+Programs are valid for `Pl0Compiler` and always terminate:
+functions call only functions declared before them, loops count a variable which nothing else assigns,
+divisors are never 0, and the estimated num of statements executed by each call is bounded by `budget`.
+Assigned values, parameters and results of functions are reduced below 1000, so values stay small.
+Programs are reproducible from `seed` and the other parameters.
+
+Execute by:
+
+    python -m bench.synth [--seed N] [--size BYTES] [--funcs N] ... [-o <source_program>]
+    python -m bench.synth --curve 1K,10K,100K,1M   # time compiling and executing programs of each size
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from compiler.output import MemorySink
+from compiler.vm import Pl0VM
+
+# Default parameters of `Generator`
+DECLS = 4       # consts and vars declared in each block
+FUNCS = 8       # functions at the top level
+DEPTH = 2       # levels of nested functions in each function at the top level
+STMTS = 6       # statements in the body of each block
+EXPR_DEPTH = 3  # depth of expressions
+LOOPS = 4       # iterations of each `while`
+BUDGET = 5000   # bound of statements executed by a call
+
+# Bound of assigned values
+MODULUS = 1000
+# Depth of nested `while` in a block
+MAX_LOOP_NEST = 2
+
+COMPARE = ['=', '<>', '<', '>', '<=', '>=']
+
+class Scope:
+    '''
+    Names visible in a block.
+    consts, vars, params: names declared in the block
+    funcs: (name, num of parameters, cost) of functions callable in the block
+    counters: names of variables of loops of the block
+    '''
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.consts = []
+        self.vars = []
+        self.params = []
+        self.funcs = []
+        self.counters = []
+
+    def all(self, attr):
+        scope = self
+        names = []
+        while scope is not None:
+            names.extend(getattr(scope, attr))
+            scope = scope.parent
+        return names
+
+class Generator:
+    '''
+    Generator of a PL/0 program from `seed`.
+    Each of `funcs` functions at the top level has a chain of nested functions of `depth` levels,
+    and each block declares `decls` names and has `stmts` statements whose expressions are `expr_depth` deep.
+    '''
+    def __init__(self, seed=0, decls=DECLS, funcs=FUNCS, depth=DEPTH, stmts=STMTS, expr_depth=EXPR_DEPTH,
+                 loops=LOOPS, budget=BUDGET):
+        self.random = random.Random(seed)
+        self.decls = decls
+        self.funcs = funcs
+        self.depth = depth
+        self.stmts = stmts
+        self.expr_depth = expr_depth
+        self.loops = loops
+        self.budget = budget
+        self.names = 0
+        self.size = 0 # bytes written
+
+    def name(self, prefix):
+        self.names += 1
+        return '%s%d' % (prefix, self.names)
+
+    def write(self, out, size=None):
+        '''
+        Write a program to the text stream `out`.
+        When `size` is given, functions at the top level are generated until the program has `size` bytes.
+        Return the num of bytes written.
+        '''
+        self.size = 0
+        scope = Scope()
+        self.emit(out, self.declarations(scope))
+        n = 0
+        while (n < self.funcs) if size is None else (self.size < size):
+            self.emit(out, self.function(scope, 1))
+            n += 1
+        self.emit(out, self.body(scope, '', main=True) + ['.'])
+        return self.size
+
+    def emit(self, out, lines):
+        text = '\n'.join(lines) + '\n'
+        out.write(text)
+        self.size += len(text)
+
+    def declarations(self, scope, indent=''):
+        lines = []
+        # at least one variable is assigned by statements
+        consts = [self.name('c') for _ in range(self.random.randint(0, max(self.decls - 1, 0)))]
+        if consts:
+            lines.append('%sconst %s;' % (indent, ', '.join('%s = %d' % (c, self.random.randrange(MODULUS))
+                                                              for c in consts)))
+        scope.consts.extend(consts)
+        variables = [self.name('v') for _ in range(max(self.decls - len(consts), 1))]
+        scope.counters = [self.name('i') for _ in range(MAX_LOOP_NEST)]
+        lines.append('%svar %s;' % (indent, ', '.join(variables + scope.counters)))
+        scope.vars.extend(variables)
+        return lines
+
+    def function(self, outer, level):
+        '''
+        Return lines of a function at `level`, and make it callable in `outer`.
+        '''
+        indent = '  ' * (level - 1)
+        name = self.name('f')
+        scope = Scope(outer)
+        scope.params = [self.name('p') for _ in range(self.random.randint(0, 3))]
+        lines = ['%sfunction %s(%s)' % (indent, name, ', '.join(scope.params))]
+        lines.extend(self.declarations(scope, indent + '  '))
+        if level < self.depth:
+            lines.extend(self.function(scope, level + 1))
+        lines.extend(self.body(scope, indent))
+        lines[-1] += ';'
+        outer.funcs.append((name, len(scope.params), max(self.cost, 1)))
+        return lines
+
+    def body(self, scope, indent, main=False):
+        self.cost = 0
+        self.mult = 1
+        inner = indent + '  '
+        lines = [indent + 'begin']
+        # no variable is read before it is assigned, since engines may initialize frames differently
+        for v in scope.vars + scope.counters:
+            lines.append('%s%s := %d;' % (inner, v, self.random.randrange(MODULUS)))
+        for p in scope.params:
+            lines.append(self.reduce(p, inner))
+        for _ in range(self.stmts):
+            lines.extend(self.statement(scope, inner, 0))
+        if main:
+            lines.append('%swrite %s;' % (inner, ' + '.join(scope.vars) or '0'))
+            lines.append(inner + 'writeln')
+        else:
+            # the first counter is free after loops
+            result = scope.counters[0]
+            lines.append('%s%s := %s;' % (inner, result, self.expression(scope, self.expr_depth)))
+            lines.append(self.reduce(result, inner))
+            lines.append('%sreturn %s' % (inner, result))
+        lines.append(indent + 'end')
+        return lines
+
+    def reduce(self, v, indent):
+        return '%s%s := %s - %s / %d * %d;' % (indent, v, v, v, MODULUS, MODULUS)
+
+    def statement(self, scope, indent, loops):
+        '''
+        Return lines of statements in `loops` nested `while`. Each statement ends with `;`.
+        '''
+        self.cost += self.mult
+        r = self.random.random()
+        if r < 0.15 and loops < MAX_LOOP_NEST and self.mult * self.loops <= self.budget:
+            counter = scope.counters[loops]
+            inner = indent + '  '
+            lines = ['%s%s := 0;' % (indent, counter),
+                     '%swhile %s < %d do' % (indent, counter, self.loops),
+                     indent + 'begin']
+            self.mult *= self.loops
+            for _ in range(self.random.randint(1, 3)):
+                lines.extend(self.statement(scope, inner, loops + 1))
+            self.mult //= self.loops
+            lines.append('%s%s := %s + 1;' % (inner, counter, counter))
+            lines.append(indent + 'end;')
+            return lines
+        if r < 0.3:
+            cond = self.condition(scope, self.expr_depth - 1)
+            return ['%sif %s then' % (indent, cond), indent + 'begin'] \
+                    + self.statement(scope, indent + '  ', loops) + [indent + 'end;']
+        if r < 0.33:
+            return ['%swrite %s;' % (indent, self.expression(scope, self.expr_depth - 1))]
+        v = self.random.choice(scope.all('vars') + scope.all('params'))
+        return ['%s%s := %s;' % (indent, v, self.expression(scope, self.expr_depth)), self.reduce(v, indent)]
+
+    def condition(self, scope, depth):
+        if self.random.random() < 0.2:
+            return 'odd %s' % self.expression(scope, depth)
+        return '%s %s %s' % (self.expression(scope, depth), self.random.choice(COMPARE), self.expression(scope, depth))
+
+    def expression(self, scope, depth):
+        r = self.random.random()
+        if depth <= 0 or r < 0.2:
+            return self.operand(scope)
+        if r < 0.3:
+            funcs = [f for f in scope.all('funcs') if self.cost + self.mult * f[2] <= self.budget]
+            if funcs:
+                name, pars, cost = self.random.choice(funcs)
+                self.cost += self.mult * cost
+                return '%s(%s)' % (name, ', '.join(self.expression(scope, depth - 1) for _ in range(pars)))
+        if r < 0.35:
+            # `-` is allowed only at the beginning of expressions
+            return '(-%s)' % self.operand(scope)
+        if r < 0.45:
+            # the divisor is positive
+            e = self.expression(scope, depth - 1)
+            return '%s / ((%s) * (%s) + 1)' % (self.expression(scope, depth - 1), e, e)
+        op = self.random.choice(['+', '-', '*'])
+        return '(%s %s %s)' % (self.expression(scope, depth - 1), op, self.expression(scope, depth - 1))
+
+    def operand(self, scope):
+        names = scope.all('consts') + scope.all('vars') + scope.all('params') + scope.counters
+        if not names or self.random.random() < 0.3:
+            return str(self.random.randrange(MODULUS))
+        return self.random.choice(names)
+
+def generate(seed=0, size=None, **params):
+    '''
+    Return the source of a program generated by `Generator` with `params`.
+    '''
+    out = MemorySink()
+    Generator(seed, **params).write(out, size)
+    return out.getvalue()
+
+def parse_size(s):
+    units = {'K': 1000, 'M': 1000 ** 2, 'G': 1000 ** 3}
+    if s[-1:].upper() in units:
+        return int(float(s[:-1]) * units[s[-1:].upper()])
+    return int(s)
+
+def curve(sizes, seed, params):
+    '''
+    Print seconds of compiling and executing generated programs of each size.
+    '''
+    from main import compile_source
+    print("%12s %12s %12s %12s" % ('bytes', 'codes', 'compile', 'vm'))
+    with tempfile.TemporaryDirectory() as d:
+        for size in sizes:
+            file_name = os.path.join(d, 'synth%d.pl' % size)
+            with open(file_name, 'w') as f:
+                n = Generator(seed, **params).write(f, size)
+            start = time.perf_counter()
+            gen = compile_source(file_name)
+            compiled = time.perf_counter() - start
+            start = time.perf_counter()
+            Pl0VM(gen.code, out=MemorySink()).run()
+            executed = time.perf_counter() - start
+            print("%12d %12d %12.3f %12.3f" % (n, len(gen.code), compiled, executed))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic PL/0 program.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--size', type=parse_size, metavar='BYTES',
+                        help='generate functions until the program has BYTES bytes (suffixes K, M and G), '
+                             'instead of --funcs functions')
+    parser.add_argument('--decls', type=int, default=DECLS, help='names declared in each block (default: %d)' % DECLS)
+    parser.add_argument('--funcs', type=int, default=FUNCS, help='functions at the top level (default: %d)' % FUNCS)
+    parser.add_argument('--depth', type=int, default=DEPTH, help='levels of nested functions (default: %d)' % DEPTH)
+    parser.add_argument('--stmts', type=int, default=STMTS, help='statements in each block (default: %d)' % STMTS)
+    parser.add_argument('--expr-depth', type=int, default=EXPR_DEPTH,
+                        help='depth of expressions (default: %d)' % EXPR_DEPTH)
+    parser.add_argument('--loops', type=int, default=LOOPS, help='iterations of each loop (default: %d)' % LOOPS)
+    parser.add_argument('--budget', type=int, default=BUDGET,
+                        help='bound of statements executed by a call (default: %d)' % BUDGET)
+    parser.add_argument('-o', '--output', metavar='FILE', help='write the program to FILE instead of stdout')
+    parser.add_argument('--curve', metavar='SIZES',
+                        help='comma separated sizes of programs whose compile and run time are printed')
+    args = parser.parse_args(argv)
+    params = dict(decls=args.decls, funcs=args.funcs, depth=args.depth, stmts=args.stmts,
+                  expr_depth=args.expr_depth, loops=args.loops, budget=args.budget)
+    if args.curve is not None:
+        curve([parse_size(s) for s in args.curve.split(',')], args.seed, params)
+    elif args.output is not None:
+        with open(args.output, 'w') as f:
+            Generator(args.seed, **params).write(f, args.size)
+    else:
+        Generator(args.seed, **params).write(sys.stdout, args.size)
+
+if __name__ == '__main__':
+    main()
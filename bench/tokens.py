@@ -0,0 +1,82 @@
+'''
+Benchmark of the memory used by the token stream of a large program.
+
+Compare a list of the previous `Token` objects with `__dict__`, a list of shared `Token` objects
+with `__slots__`, and a `TokenStream` of parallel columns.
+
+Execute by:
+
+    python -m bench.tokens [<source_program>] [<lines>]
+'''
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from bench.lexer import LegacySourceReader
+from compiler.getsource import KeyEtc, ReadMode, SourceReader
+
+def read_legacy(file_name):
+    reader = LegacySourceReader(file_name)
+    tokens = []
+    try:
+        while True:
+            token = reader.next_token()
+            tokens.append(token)
+            if token.kind == KeyEtc.Others and token.value == "":
+                return tokens
+    finally:
+        reader.close()
+
+def read_tokens(file_name):
+    reader = SourceReader(file_name, ReadMode.Buffer)
+    try:
+        return list(reader.tokenize())
+    finally:
+        reader.close()
+
+def read_stream(file_name):
+    reader = SourceReader(file_name, ReadMode.Buffer)
+    try:
+        return reader.token_stream()
+    finally:
+        reader.close()
+
+def measure(read, file_name):
+    '''
+    Read all tokens of the file.
+    Return the number of tokens, seconds, retained bytes, retained blocks and peak bytes.
+    '''
+    start = time.perf_counter()
+    read(file_name)
+    sec = time.perf_counter() - start
+    tracemalloc.start()
+    tokens = read(file_name)
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = snapshot.statistics('filename')
+    size = sum(x.size for x in stats)
+    blocks = sum(x.count for x in stats)
+    return len(tokens), sec, size, blocks, peak
+
+def main(file_name, lines):
+    with open(file_name, 'r') as f:
+        program = f.read()
+    source = program * max(1, lines // program.count('\n'))
+    print("source: %d lines, %d bytes" % (source.count('\n'), len(source)))
+    fd, path = tempfile.mkstemp(suffix='.pl')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(source)
+        print("%-7s %10s %8s %12s %10s %12s" % ('', 'tokens', 'sec', 'retained KiB', 'blocks', 'peak KiB'))
+        for name, read in [('legacy', read_legacy), ('tokens', read_tokens), ('stream', read_stream)]:
+            n, sec, size, blocks, peak = measure(read, path)
+            print("%-7s %10d %8.3f %12d %10d %12d" % (name, n, sec, size // 1024, blocks, peak // 1024))
+    finally:
+        os.remove(path)
+
+if __name__ == '__main__':
+    file_name = sys.argv[1] if len(sys.argv) > 1 else 'resources/sample2.pl'
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    main(file_name, lines)
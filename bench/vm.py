@@ -0,0 +1,64 @@
+'''
+Benchmark of the interpreters.
+
+Compare instructions per second of `Pl0CodeGenerator.execute` and `Pl0VM`,
+the number of dispatches of `Pl0VM` with and without superinstructions,
+and the number of executed instructions after small functions are inlined by `Inliner`.
+
+Execute by:
+
+    python -m bench.vm [<source_program> ...]
+'''
+import io
+import sys
+import time
+from compiler.vm import Pl0VM, CountingProg
+from compiler.inline import Inliner
+from main import compile_source
+
+def count_instructions(gen, superinstructions=False):
+    '''
+    Return the number of dispatched codes, which is the number of executed instructions without superinstructions.
+    '''
+    prog = []
+    def run():
+        # the VM is created in `silent` to write to the discarded stdout
+        vm = Pl0VM(gen.code, superinstructions=superinstructions)
+        vm.prog = CountingProg(vm.prog)
+        prog.append(vm.prog)
+        vm.run()
+    silent(run)
+    return prog[0].count
+
+def silent(run):
+    '''
+    Run with stdout discarded and return the elapsed seconds.
+    '''
+    sys.stdout = io.StringIO()
+    try:
+        start = time.perf_counter()
+        run()
+        return time.perf_counter() - start
+    finally:
+        sys.stdout = sys.__stdout__
+
+def main(file_names):
+    for file_name in file_names:
+        gen = compile_source(file_name)
+        n = count_instructions(gen)
+        n_fused = count_instructions(gen, True)
+        sec_execute = silent(gen.execute)
+        sec_plain = silent(lambda: Pl0VM(gen.code, superinstructions=False).run())
+        sec_vm = silent(lambda: Pl0VM(gen.code).run())
+        print("%s: %d instructions, %d dispatches with superinstructions" % (file_name, n, n_fused))
+        print("  execute: %.3f sec (%.0f instructions/sec)" % (sec_execute, n / sec_execute))
+        print("  Pl0VM (plain): %.3f sec (%.0f instructions/sec)" % (sec_plain, n / sec_plain))
+        print("  Pl0VM  : %.3f sec (%.0f instructions/sec)" % (sec_vm, n / sec_vm))
+        print("  speedup: %.1fx" % (sec_execute / sec_vm))
+        gen = compile_source(file_name)
+        inlined = Inliner().run(gen)
+        n_inlined = count_instructions(gen)
+        print("  inline: %d call sites, %d instructions (%+.1f%%)" % (inlined, n_inlined, 100.0 * (n_inlined - n) / n))
+
+if __name__ == '__main__':
+    main(sys.argv[1:] or ['resources/sample2.pl', 'test/integrate1.pl', 'bench/corpus/loop.pl', 'bench/corpus/const.pl'])
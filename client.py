@@ -0,0 +1,78 @@
+'''
+Thin client of the daemon `compiler.server`.
+It imports nothing but `compiler.protocol` and the standard library, so that it starts fast.
+
+Execute by:
+
+    python client.py <source_program> [--engine ENGINE] [-O] [--budget N] [--socket PATH] [-v]
+'''
+import argparse
+import base64
+import socket
+import sys
+from compiler import protocol
+
+ENGINES = ['vm', 'execute', 'python', 'tiered']
+# Extension of compiled programs, sent as they are
+EXTENSION = '.pl0c'
+
+def request(path, message):
+    '''
+    Send a request to the daemon at `path` and return the response.
+    '''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        protocol.send(sock, message)
+        response = protocol.recv(sock)
+    finally:
+        sock.close()
+    if response is None:
+        raise RuntimeError("no response from the server")
+    return response
+
+def build_request(file_name, engine='vm', optimize=False, fold=True, tail_calls=True, budget=None):
+    with open(file_name, 'rb') as f:
+        data = f.read()
+    message = {'engine': engine, 'optimize': optimize, 'fold': fold, 'tail_calls': tail_calls}
+    if budget is not None:
+        message['budget'] = budget
+    if file_name.endswith(EXTENSION):
+        message['code'] = base64.b64encode(data).decode('ascii')
+    else:
+        message['source'] = data.decode('utf-8')
+    return message
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Execute a PL/0 program by the daemon.')
+    parser.add_argument('file_name', help='source program, or compiled program with the extension .pl0c')
+    parser.add_argument('--engine', choices=ENGINES, default='vm',
+                        help='how to execute the program (default: vm)')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='run the peephole optimizer over generated codes')
+    parser.add_argument('--no-fold', dest='fold', action='store_false',
+                        help='do not fold constant expressions and conditions at compile time')
+    parser.add_argument('--no-tail-calls', dest='tail_calls', action='store_false',
+                        help='do not replace `return f(...)` in the function `f` by a jump reusing the frame')
+    parser.add_argument('--budget', type=int, metavar='N',
+                        help='max num of codes executed, lower than the budget of the server')
+    parser.add_argument('--socket', default=protocol.default_socket(),
+                        help='path of the socket of the daemon (default: $%s or %s)'
+                             % (protocol.SOCKET_ENV, protocol.default_socket()))
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='report whether the compiled program was cached and timings to stderr')
+    args = parser.parse_args(argv)
+
+    response = request(args.socket, build_request(args.file_name, args.engine, args.optimize,
+                                                  args.fold, args.tail_calls, args.budget))
+    sys.stdout.write(response['output'])
+    sys.stdout.flush()
+    if args.verbose:
+        sys.stderr.write("cached: %s, timings: %s\n" % (response['cached'], response['timings']))
+    if not response['ok']:
+        sys.stderr.write("error: %s\n" % response['error'])
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from compiler.codegen import CodeSegment, FuncInfo, Pl0CodeGenerator
+from compiler.table import Pl0Table
+
+# File format of compiled programs (.pl0c). All numbers are little endian.
+#   header: magic, version, flags, the num of codes, the size of the debug section
+#   code segment: column `a` (8 bytes each), column `b` (4 bytes each), column `op` (1 byte each)
+#   debug section (optional): JSON of the source file name and `FuncInfo` of functions
+# Columns are laid out so that each of them can be used in place from a mapped file.
+# VERSION is bumped whenever the layout or the schema of the debug section changes:
+#   1: name, level, pars, start, entry and end of functions
+#   2: `pure` and `tails` of functions added
+MAGIC = b'PL0C'
+VERSION = 2
+HEADER = struct.Struct('<4sHHQQ')
+# Bits of flags
+DEBUG = 0x1
+
+EXTENSION = '.pl0c'
+
+def dumps(code, funcs=None, source=None):
+    '''
+    Return bytes of a `CodeSegment` in the .pl0c format.
+    The debug section is written when `funcs` is given.
+    '''
+    assert isinstance(code, CodeSegment)
+    columns = [array('q', code.a), array('i', code.b), array('B', code.op)]
+    if sys.byteorder != 'little':
+        for column in columns:
+            column.byteswap()
+    debug = b''
+    flags = 0
+    if funcs is not None:
+        flags |= DEBUG
+        debug = json.dumps({ 'source': source
+                           , 'funcs': [[f.name, f.level, f.pars, f.start, f.entry, f.end, f.pure, f.tails] for f in funcs]
+                           }).encode('utf-8')
+    header = HEADER.pack(MAGIC, VERSION, flags, len(code), len(debug))
+    return b''.join([header] + [column.tobytes() for column in columns] + [debug])
+
+def dump(gen, file_name, debug=True, source=None):
+    '''
+    Write codes of `gen` to a .pl0c file.
+    '''
+    assert isinstance(gen, Pl0CodeGenerator)
+    data = dumps(gen.code, gen.funcs if debug else None, source)
+    with open(file_name, 'wb') as f:
+        f.write(data)
+
+def loads(buf):
+    '''
+    Read a program in the .pl0c format from a buffer such as `bytes` or `mmap`,
+    and return `Pl0CodeGenerator` holding its codes and `FuncInfo` of the debug section (empty without it).
+    The code segment refers to the buffer without copying on little endian machines, so it is read-only.
+    '''
+    view = memoryview(buf)
+    if len(view) < HEADER.size:
+        raise RuntimeError("not a compiled program: too short")
+    magic, version, flags, n, debug_size = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise RuntimeError("not a compiled program: bad magic " + repr(magic))
+    if version != VERSION:
+        raise RuntimeError("unsupported version of compiled program: %d (expected %d)" % (version, VERSION))
+    a_start = HEADER.size
+    b_start = a_start + 8 * n
+    op_start = b_start + 4 * n
+    debug_start = op_start + n
+    if len(view) != debug_start + debug_size:
+        raise RuntimeError("broken compiled program: size %d (expected %d)" % (len(view), debug_start + debug_size))
+
+    if sys.byteorder == 'little':
+        code = CodeSegment.from_columns(view[op_start:debug_start],
+                                        view[a_start:b_start].cast('q'),
+                                        view[b_start:op_start].cast('i'))
+    else:
+        a, b = array('q', view[a_start:b_start]), array('i', view[b_start:op_start])
+        a.byteswap()
+        b.byteswap()
+        code = CodeSegment.from_columns(array('B', view[op_start:debug_start]), a, b)
+
+    gen = Pl0CodeGenerator(Pl0Table())
+    gen.code = code
+    gen.c_index = n - 1
+    if flags & DEBUG:
+        debug = json.loads(bytes(view[debug_start:]).decode('utf-8'))
+        gen.funcs = [FuncInfo(*f) for f in debug['funcs']]
+    return gen
+
+def load(file_name, use_mmap=True):
+    '''
+    Read a .pl0c file. The file is mapped into memory unless `use_mmap` is False.
+    The mapped file is kept open until `close` of the returned `Pl0CodeGenerator` is called.
+    '''
+    with open(file_name, 'rb') as f:
+        if not use_mmap:
+            return loads(f.read())
+        try:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file can not be mapped
+            return loads(b'')
+    gen = loads(buf)
+    gen.mmap = buf
+    return gen
@@ -0,0 +1,145 @@
+import hashlib
+import os
+import tempfile
+from compiler.compile import compile_source
+from compiler.phases import Phases
+from compiler import bytecode
+
+# Version of the compiler in keys of the cache.
+# Change it whenever codes generated from the same source change.
+COMPILER_VERSION = '0.3'
+# Default bound of the total size of cached files in bytes
+MAX_BYTES = 64 * 1024 * 1024
+# Environment variable which gives the default directory of the cache to `main.main`
+CACHE_ENV = 'PL0_CACHE_DIR'
+
+def source_key(source, fold=True, tail_calls=True):
+    '''
+    Return the key of a source program given as `bytes`.
+    '''
+    h = hashlib.sha256()
+    h.update(('%s/%d/%d/%d\n' % (COMPILER_VERSION, bytecode.VERSION, fold, tail_calls)).encode('ascii'))
+    h.update(source)
+    return h.hexdigest()
+
+class CompileCache:
+    '''
+    On-disk cache of compiled programs in the .pl0c format.
+    Files are named by the SHA-256 of the source bytes, the compiler version and the options of compilation,
+    so an entry never becomes stale and needs no invalidation.
+    Files are written to temporary files and renamed, so that processes can share the directory.
+    The total size of files is kept under `max_bytes` by removing the least recently used ones,
+    whose modification times are updated on hits.
+    Counters:
+    hits: the num of programs loaded from the cache
+    misses: the num of programs compiled
+    evicted: the num of removed files
+    evicted_bytes: the total size of removed files
+    '''
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, source, fold=True, tail_calls=True):
+        return source_key(source, fold, tail_calls)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + bytecode.EXTENSION)
+
+    def get(self, key):
+        '''
+        Return `Pl0CodeGenerator` loaded from the entry of `key`, or None when it is not cached.
+        '''
+        path = self.path(key)
+        try:
+            gen = bytecode.load(path)
+        except (OSError, RuntimeError):
+            # not cached, removed by another process, or broken
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return gen
+
+    def put(self, key, gen, source=None):
+        '''
+        Store codes of `gen` as the entry of `key`, and evict old entries if the cache is too large.
+        '''
+        data = bytecode.dumps(gen.code, gen.funcs, source)
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp, self.path(key))
+        except BaseException:
+            os.unlink(temp)
+            raise
+        self.evict()
+
+    def evict(self):
+        '''
+        Remove the least recently used entries until the total size is at most `max_bytes`.
+        '''
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(bytecode.EXTENSION):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                # removed by another process
+                pass
+            else:
+                self.evicted += 1
+                self.evicted_bytes += size
+            total -= size
+
+    def compile(self, file_name, fold=True, tail_calls=True, phases=None):
+        '''
+        Return `Pl0CodeGenerator` of a source program, compiling it only when it is not cached.
+        The source is read at once to compute its key, so it is always compiled from the buffer.
+        Reading the source and loading the cached program are measured as the phase `read` of `phases`.
+        On a miss, the compile is measured and counted in the same way as `compile_source`,
+        but a hit records no counts of tokens and table entries since the source is not parsed.
+        '''
+        if phases is None:
+            phases = Phases()
+        with phases.phase('read'):
+            with open(file_name, 'rb') as f:
+                source = f.read()
+            key = self.key(source, fold, tail_calls)
+            gen = self.get(key)
+        if gen is not None:
+            self.hits += 1
+            return gen
+        self.misses += 1
+        gen = compile_source(None, fold=fold, tail_calls=tail_calls, phases=phases, source=source)
+        self.put(key, gen, file_name)
+        return gen
+
+    def stats(self):
+        '''
+        Return counters of the cache as a dict.
+        '''
+        return { 'hits': self.hits
+               , 'misses': self.misses
+               , 'evicted': self.evicted
+               , 'evicted_bytes': self.evicted_bytes
+               }
@@ -1,10 +1,16 @@
-import sys
-import itertools
+from array import array
 from enum import Enum, unique
-from compiler.table import RelAddr, Pl0Table
-
-MAX_STACK = 2000
-MAX_LEVEL = 5
+from compiler.table import RelAddr, Pl0Table, MAX_LEVEL
+from compiler.output import StreamSink
+
+# Initial sizes of the stack and the display. Grown on demand.
+INIT_STACK = 2000
+INIT_LEVEL = 5
+# Hard limit of the size of the stack.
+MAX_STACK = 10000000
+# Range of values which `CodeSegment` can hold.
+MIN_VALUE = -2**63
+MAX_VALUE = 2**63 - 1
 
 @unique
 class OpCode(Enum):
@@ -107,113 +113,520 @@ class RetInst(Inst):
             return False
         return self.op_code == other.op_code and self.raddr == other.raddr
 
+# Change of the depth of the stack by codes other than `cal`
+DEPTH = dict([(OpCode.lit, 1), (OpCode.lod, 1), (OpCode.sto, -1), (OpCode.jpc, -1), (OpCode.jmp, 0), (OpCode.ict, 0)]
+             + [(op, -1) for op in Operator if op not in [Operator.neg, Operator.odd, Operator.wrl]]
+             + [(Operator.neg, 0), (Operator.odd, 0), (Operator.wrl, 0)])
+
+# `DEPTH` by the values of `OpCode` and `Operator` in `CodeSegment`
+OP_DEPTH = dict((op.value, d) for op, d in DEPTH.items() if isinstance(op, OpCode))
+OPR_DEPTH = dict((op.value, d) for op, d in DEPTH.items() if isinstance(op, Operator))
+LOD, STO, CAL, RET, ICT, JMP, JPC, OPR = [op.value for op in [OpCode.lod, OpCode.sto, OpCode.cal, OpCode.ret,
+                                                               OpCode.ict, OpCode.jmp, OpCode.jpc, OpCode.opr]]
+WRT, WRL = Operator.wrt.value, Operator.wrl.value
+
+# Kinds of codes by the value of `OpCode`
+VAL_OPS = frozenset([OpCode.lit.value, OpCode.ict.value, OpCode.jmp.value, OpCode.jpc.value])
+REF_OPS = frozenset([OpCode.lod.value, OpCode.sto.value, OpCode.cal.value])
+
+class CodeSegment:
+    '''
+    Codes packed into parallel columns. The i-th code is (op[i], a[i], b[i]).
+    op: value of `OpCode`
+    a: value of `ValInst`, value of `Operator` of `OpInst`, or level of `RefInst` and `RetInst`
+    b: addr of `RefInst`, the num of parameters of `RetInst`, otherwise 0
+    '''
+    def __init__(self):
+        self.op = array('B')
+        self.a = array('q')
+        self.b = array('i')
+
+    @classmethod
+    def from_columns(cls, op, a, b):
+        '''
+        Create a segment over existing columns, such as `array` or `memoryview` of a mapped file.
+        Columns which do not support changes make a read-only segment.
+        '''
+        seg = cls.__new__(cls)
+        seg.op = op
+        seg.a = a
+        seg.b = b
+        return seg
+
+    def __len__(self):
+        return len(self.op)
+
+    def __getitem__(self, i):
+        return (self.op[i], self.a[i], self.b[i])
+
+    def __eq__(self, other):
+        if other is None or not isinstance(other, CodeSegment):
+            return False
+        return self.op == other.op and self.a == other.a and self.b == other.b
+
+    def append(self, op, a, b):
+        try:
+            self.a.append(a)
+        except OverflowError:
+            raise RuntimeError("too large value: " + str(a))
+        self.op.append(op)
+        self.b.append(b)
+
+    def set(self, i, op, a, b):
+        try:
+            self.a[i] = a
+        except OverflowError:
+            raise RuntimeError("too large value: " + str(a))
+        self.op[i] = op
+        self.b[i] = b
+
+    def truncate(self, n):
+        '''
+        Remove codes from the index `n`.
+        '''
+        del self.op[n:]
+        del self.a[n:]
+        del self.b[n:]
+
+    def release(self):
+        '''
+        Release columns which are views of a buffer, such as a mapped file. The segment can not be used after that.
+        '''
+        for column in [self.op, self.a, self.b]:
+            if isinstance(column, memoryview):
+                column.release()
+
+    def nbytes(self):
+        '''
+        Return the size of the columns in bytes.
+        '''
+        return sum(len(x) * x.itemsize for x in [self.op, self.a, self.b])
+
+def encode(code):
+    '''
+    Encode an `Inst` to (op, a, b) of `CodeSegment`.
+    '''
+    if isinstance(code, ValInst):
+        return (code.op_code.value, code.value, 0)
+    elif isinstance(code, OpInst):
+        return (OpCode.opr.value, code.op.value, 0)
+    elif isinstance(code, RefInst) or isinstance(code, RetInst):
+        return (code.op_code.value, code.raddr.level, code.raddr.addr)
+    else:
+        raise RuntimeError("illegal code: " + str(code))
+
+def decode(op, a, b):
+    '''
+    Decode (op, a, b) of `CodeSegment` to an `Inst`.
+    '''
+    if op in VAL_OPS:
+        return ValInst(OpCode(op), a)
+    elif op in REF_OPS:
+        return RefInst(OpCode(op), RelAddr(a, b))
+    elif op == OpCode.opr.value:
+        return OpInst(Operator(a))
+    elif op == OpCode.ret.value:
+        return RetInst(a, b)
+    else:
+        raise RuntimeError("illegal op: " + str(op))
+
+def assemble(codes):
+    '''
+    Pack a list of `Inst` into a `CodeSegment`.
+    '''
+    seg = CodeSegment()
+    for code in codes:
+        seg.append(*encode(code))
+    return seg
+
+def disassemble(seg):
+    '''
+    Unpack a `CodeSegment` into a list of `Inst`.
+    '''
+    return [decode(op, a, b) for op, a, b in zip(seg.op, seg.a, seg.b)]
+
+class FuncInfo:
+    '''
+    Codes of a function or the main block.
+    name: the name of the function ('dummy' for the main block)
+    level: the level of the inside of the function
+    pars: the num of parameters
+    start: the index of `jmp` at the beginning of the block, which jumps over nested functions to `entry`
+    entry: the index of `ict` which starts the function's process
+    end: the index next to the last code of the function
+    pure: True when the result depends only on the arguments and the call has no effect (see `mark_pure`)
+    tails: the indices of `jmp` of tail calls of the function itself (see `Pl0Compiler.tail_call`)
+    '''
+    def __init__(self, name, level, pars, start, entry, end, pure=False, tails=()):
+        self.name = name
+        self.level = level
+        self.pars = pars
+        self.start = start
+        self.entry = entry
+        self.end = end
+        self.pure = pure
+        self.tails = list(tails)
+
+    def __str__(self):
+        return "FuncInfo {name=%s, level=%d, pars=%d, start=%d, entry=%d, end=%d, pure=%s, tails=%s}" \
+                % (self.name, self.level, self.pars, self.start, self.entry, self.end, self.pure, self.tails)
+
+    def __repr__(self):
+        return "FuncInfo {name=%s, level=%d, pars=%d, start=%d, entry=%d, end=%d, pure=%s, tails=%s}" \
+                % (self.name, self.level, self.pars, self.start, self.entry, self.end, self.pure, self.tails)
+
+    def __eq__(self, other):
+        if other is None or not isinstance(other, FuncInfo):
+            return False
+        return self.name == other.name and self.level == other.level and self.pars == other.pars \
+                and self.start == other.start and self.entry == other.entry and self.end == other.end \
+                and self.pure == other.pure and self.tails == other.tails
+
+def func_index(funcs):
+    '''
+    Return a dict of `FuncInfo` of the functions called by `cal` to each address.
+    The address is `entry` of the function, or `start` when it is called before its `entry` is known.
+    Build it once for a program, since it replaces a scan of `funcs` for each `cal`.
+    '''
+    index = {}
+    for f in funcs:
+        # codes of a function removed by `Peephole` are empty
+        if f.entry < f.end:
+            index.setdefault(f.entry, f)
+            index.setdefault(f.start, f)
+    return index
+
+def falls_off(code, f, index):
+    '''
+    Return True when the function `f` may reach `ret` without a value pushed by `return`.
+    Then it returns the last variable of the frame or the saved `pc`, which depend on the caller.
+    `code` is the `CodeSegment` of the program and `index` is its `func_index`.
+    '''
+    ops, a, b = code.op, code.a, code.b
+    depths = {f.entry + 1: 0}
+    work = [f.entry + 1]
+    while work:
+        i = work.pop()
+        depth = depths[i]
+        op = ops[i]
+        if op == RET:
+            if depth == 0:
+                return True
+            continue
+        if op == CAL:
+            depth += 1 - index[b[i]].pars
+        elif op == ICT:
+            depth += a[i]
+        elif op == OPR:
+            depth += OPR_DEPTH[a[i]]
+        else:
+            depth += OP_DEPTH[op]
+        if op == JMP:
+            nexts = (a[i],)
+        elif op == JPC:
+            nexts = (i + 1, a[i])
+        else:
+            nexts = (i + 1,)
+        for j in nexts:
+            if j not in depths:
+                depths[j] = depth
+                work.append(j)
+    return False
+
+def mark_pure(code, funcs):
+    '''
+    Set `FuncInfo.pure` of functions which access only their own parameters and variables,
+    never write, call only pure functions and always end with `return`.
+    Accesses of outer levels are found by the levels of `lod` and `sto` taken from the symbol table.
+    Variables are assumed to be assigned before they are read.
+    `code` is the `CodeSegment` of the program, which is read in place.
+    '''
+    index = func_index(funcs)
+    ops, a, b = code.op, code.a, code.b
+    candidates = []
+    for f in funcs:
+        f.pure = False
+        if f.level == 0:
+            continue
+        calls = []
+        own = True
+        for i in range(f.entry + 1, f.end):
+            op = ops[i]
+            if op == LOD or op == STO:
+                own = own and a[i] >= f.level
+            elif op == OPR:
+                own = own and a[i] != WRT and a[i] != WRL
+            elif op == CAL:
+                g = index.get(b[i])
+                own = own and g is not None
+                calls.append(g)
+        if own and not falls_off(code, f, index):
+            f.pure = True
+            candidates.append((f, calls))
+    # remove functions calling impure ones until nothing changes, which keeps mutual recursion pure
+    changed = True
+    while changed:
+        changed = False
+        for f, calls in candidates:
+            if f.pure and not all(g.pure for g in calls):
+                f.pure = False
+                changed = True
+
+class StackFull(Exception):
+    '''
+    Raised by `Pl0CodeGenerator.run` when the stack or the display is too small for the code at `pc`.
+    '''
+    def __init__(self, pc, top):
+        super().__init__(pc, top)
+        self.pc = pc
+        self.top = top
+
+class BudgetExceeded(RuntimeError):
+    '''
+    Raised by interpreters when the program executed `budget` codes without finishing.
+    '''
+    def __init__(self, budget):
+        super().__init__("instruction budget exceeded (max %d)" % budget)
+        self.budget = budget
+
+class BudgetedCodes:
+    '''
+    Codes which raise `BudgetExceeded` when more than `budget` codes are fetched by `Pl0CodeGenerator.run`.
+    '''
+    def __init__(self, codes, budget):
+        self.codes = codes
+        self.budget = budget
+        self.fetched = 0
+
+    def __getitem__(self, i):
+        self.fetched += 1
+        if self.fetched > self.budget:
+            raise BudgetExceeded(self.budget)
+        return self.codes[i]
+
 class Pl0CodeGenerator:
-    def __init__(self, table):
+    '''
+    Code generator and interpreter of codes for a stack machine.
+    Generated codes are packed into `code`, and `disassemble` returns the list of `Inst` unpacked from it.
+    `funcs` is the list of `FuncInfo` of compiled functions in the order of their ends, the main block last.
+    `max_stack` and `max_level` limit the size of the stack and the display in `execute`.
+    `mmap` is the mapped file which `code` refers to when the program is loaded by `bytecode.load`.
+    '''
+    def __init__(self, table, max_stack=MAX_STACK, max_level=MAX_LEVEL):
         assert isinstance(table, Pl0Table)
         self.table = table
-        self.codes = []
+        self.code = CodeSegment()
         self.c_index = -1
+        self.funcs = []
+        self.tails = [] # indices of `jmp` of tail calls not recorded in `funcs` yet
+        self.max_stack = max_stack
+        self.max_level = max_level
+        self.out = None
+        self.mmap = None
+
+    def close(self):
+        '''
+        Release the code segment and close the mapped file of a program loaded by `bytecode.load`.
+        '''
+        self.code.release()
+        if self.mmap is not None:
+            self.mmap.close()
+            self.mmap = None
+
+    def disassemble(self):
+        '''
+        Return a new list of `Inst` of the generated codes. Changes to the list are not reflected in `code`.
+        '''
+        return disassemble(self.code)
 
     def next_code(self):
         return self.c_index + 1
 
-    def enter(self, code):
+    def emit(self, op, a, b):
+        '''
+        Enter a new code given as (op, a, b) of `CodeSegment`.
+        '''
         self.c_index += 1
-        if len(self.codes) == self.c_index:
-            self.codes.append(code)
-        elif len(self.codes) > self.c_index:
-            self.codes[self.c_index] = code
+        if len(self.code) == self.c_index:
+            self.code.append(op, a, b)
+        elif len(self.code) > self.c_index:
+            self.code.set(self.c_index, op, a, b)
         else:
-            raise RuntimeError("illegal index: " + self.c_index)
+            raise RuntimeError("illegal index: " + str(self.c_index))
+
+    def enter(self, code):
+        self.emit(*encode(code))
 
     def gencode_v(self, op_code, value):
-        self.enter(ValInst(op_code, value))
+        self.emit(op_code.value, value, 0)
         return self.c_index
 
     def gencode_t(self, op_code, ti):
-        self.enter(RefInst(op_code, self.table.reladdr(ti)))
+        raddr = self.table.reladdr(ti)
+        self.emit(op_code.value, raddr.level, raddr.addr)
         return self.c_index
 
     def gencode_o(self, op):
-        self.enter(OpInst(op))
+        self.emit(OpCode.opr.value, op.value, 0)
         return self.c_index
 
     def gencode_r(self):
         # skip if the previous code is `ret`
-        if self.codes[self.c_index].op_code == OpCode.ret:
+        if self.code.op[self.c_index] == OpCode.ret.value:
             return self.c_index
-        self.enter(RetInst(self.table.b_level(), self.table.f_pars()))
+        self.emit(OpCode.ret.value, self.table.b_level(), self.table.f_pars())
         return self.c_index
 
+    def record_func(self, name, level, pars, start, entry):
+        '''
+        Record `FuncInfo` of a function whose codes end at the current code.
+        '''
+        end = self.next_code()
+        tails = [i for i in self.tails if entry <= i < end]
+        self.tails = [i for i in self.tails if i < entry]
+        self.funcs.append(FuncInfo(name, level, pars, start, entry, end, tails=tails))
+
+    def tail_jump(self, target):
+        '''
+        Enter `jmp` to `target` of a tail call.
+        '''
+        self.tails.append(self.gencode_v(OpCode.jmp, target))
+
+    def mark_pure(self):
+        '''
+        Mark pure functions among `funcs` after compilation.
+        '''
+        if any(f.level > 0 for f in self.funcs):
+            mark_pure(self.code, self.funcs)
+
+    def rollback(self, index):
+        '''
+        Remove codes generated from `index`, so that the next code is entered at `index`.
+        '''
+        self.c_index = index - 1
+        self.code.truncate(index)
+        self.tails = [i for i in self.tails if i < index]
+
     def backpatch(self, backp):
         '''
         Backpatch an address of jmp operation.
         The target code should be `ValInst(OpCode.jmp, _)` `ValInst(OpCode.jpc, _)`.
         '''
-        code = self.codes[backp]
-        assert isinstance(code, ValInst)
-        code.value = self.next_code()
+        assert self.code.op[backp] in [OpCode.jmp.value, OpCode.jpc.value]
+        self.code.a[backp] = self.next_code()
 
-    def execute(self):
-        stack = [x for x in itertools.repeat(0, MAX_STACK)]
-        display = [x for x in itertools.repeat(0, MAX_LEVEL)] # store `top` of each level when functions are called
+    def execute(self, out=None, stats=None, budget=None):
+        '''
+        Execute the codes, writing values to the sink `out` (`StreamSink` of `sys.stdout` by default).
+        Executed codes are counted into `stats` (`OpStats` of the dynamic mode) if it is given.
+        `BudgetExceeded` is raised when `budget` codes are fetched before the main block returns.
+        '''
+        self.out = out if out is not None else StreamSink()
+        stack = [0] * INIT_STACK
+        display = array('q', bytes(8 * INIT_LEVEL)) # store `top` of each level when functions are called
+        codes = self.disassemble()
+        fetched = codes if stats is None else stats.trace(codes)
+        if budget is not None:
+            fetched = BudgetedCodes(fetched, budget)
         pc = top = 0
 
-        while True:
-            code = self.codes[pc]
-            pc += 1
-
-            if code.op_code == OpCode.lit:
-                assert isinstance(code, ValInst)
-                stack[top] = code.value
-                top += 1
-            elif code.op_code == OpCode.lod:
-                assert isinstance(code, RefInst)
-                stack[top] = stack[display[code.raddr.level] + code.raddr.addr]
-                top += 1
-            elif code.op_code == OpCode.sto:
-                assert isinstance(code, RefInst)
-                top -= 1
-                stack[display[code.raddr.level] + code.raddr.addr] = stack[top]
-            elif code.op_code == OpCode.cal:
-                assert isinstance(code, RefInst)
-                # `code.raddr.level` means the level of the name of called function
-                # `code.raddr.addr` means the start index of called function
-                lev = code.raddr.level + 1 # level of the inside of function is one greater than the name of function
-                stack[top] = display[lev] # save display temporarily
-                stack[top+1] = pc # save pc temporarily
-                display[lev] = top # save top temporarily
-                pc = code.raddr.addr
-                # `OpCode.cal` should be followed by `OpCode.ict` which increases `top`.
-            elif code.op_code == OpCode.ret:
-                assert isinstance(code, RetInst)
-                # `code.raddr.level` means the level of the inside of called function
-                # `code.raddr.addr` means the num of arguments of function
-                top -= 1
-                temp = stack[top] # return value of function
-                top = display[code.raddr.level] # recover top
-                display[code.raddr.level] = stack[top] # recover display
-                pc = stack[top+1] # recover pc
-                top -= code.raddr.addr # decreate stack for the number of arguments of function
-                stack[top] = temp
-                top += 1
-            elif code.op_code == OpCode.ict:
-                assert isinstance(code, ValInst)
-                top += code.value
-            elif code.op_code == OpCode.jmp:
-                assert isinstance(code, ValInst)
-                pc = code.value
-            elif code.op_code == OpCode.jpc:
-                assert isinstance(code, ValInst)
-                top -= 1
-                if stack[top] == 0:
+        try:
+            while True:
+                try:
+                    self.run(fetched, stack, display, pc, top)
+                    return
+                except StackFull as e:
+                    pc, top = e.pc, e.top
+                    if stats is not None:
+                        stats.drop()
+                    self.grow(codes[pc], stack, display, top)
+        finally:
+            self.out.flush()
+
+    def run(self, codes, stack, display, pc, top):
+        '''
+        Execute codes from `pc` until the main block returns.
+        Raise `StackFull` with `pc` of the code to resume from when `stack` or `display` is too small.
+        '''
+        try:
+            while True:
+                code = codes[pc]
+                pc += 1
+
+                if code.op_code == OpCode.lit:
+                    assert isinstance(code, ValInst)
+                    stack[top] = code.value
+                    top += 1
+                elif code.op_code == OpCode.lod:
+                    assert isinstance(code, RefInst)
+                    stack[top] = stack[display[code.raddr.level] + code.raddr.addr]
+                    top += 1
+                elif code.op_code == OpCode.sto:
+                    assert isinstance(code, RefInst)
+                    stack[display[code.raddr.level] + code.raddr.addr] = stack[top-1]
+                    top -= 1
+                elif code.op_code == OpCode.cal:
+                    assert isinstance(code, RefInst)
+                    # `code.raddr.level` means the level of the name of called function
+                    # `code.raddr.addr` means the start index of called function
+                    lev = code.raddr.level + 1 # level of the inside of function is one greater than the name of function
+                    stack[top] = display[lev] # save display temporarily
+                    stack[top+1] = pc # save pc temporarily
+                    display[lev] = top # save top temporarily
+                    pc = code.raddr.addr
+                    # `OpCode.cal` should be followed by `OpCode.ict` which increases `top`.
+                elif code.op_code == OpCode.ret:
+                    assert isinstance(code, RetInst)
+                    # `code.raddr.level` means the level of the inside of called function
+                    # `code.raddr.addr` means the num of arguments of function
+                    top -= 1
+                    temp = stack[top] # return value of function
+                    top = display[code.raddr.level] # recover top
+                    display[code.raddr.level] = stack[top] # recover display
+                    pc = stack[top+1] # recover pc
+                    top -= code.raddr.addr # decreate stack for the number of arguments of function
+                    stack[top] = temp
+                    top += 1
+                elif code.op_code == OpCode.ict:
+                    assert isinstance(code, ValInst)
+                    top += code.value
+                elif code.op_code == OpCode.jmp:
+                    assert isinstance(code, ValInst)
                     pc = code.value
-            elif code.op_code == OpCode.opr:
-                assert isinstance(code, OpInst)
-                top = self.operate(code, top, stack)
-
-            if pc == 0:
-                break
+                elif code.op_code == OpCode.jpc:
+                    assert isinstance(code, ValInst)
+                    top -= 1
+                    if stack[top] == 0:
+                        pc = code.value
+                elif code.op_code == OpCode.opr:
+                    assert isinstance(code, OpInst)
+                    top = self.operate(code, top, stack)
+
+                if pc == 0:
+                    break
+        except IndexError:
+            # No code changes the state before it fails on a short stack or display,
+            # so the failed code can be executed again after they are grown.
+            raise StackFull(pc - 1, top)
+
+    def grow(self, code, stack, display, top):
+        '''
+        Grow `stack` and `display` to execute `code`.
+        Raise error when they reach the limit.
+        '''
+        # every code accesses `stack` only below `top + 2`
+        size = top + 2
+        level = code.raddr.level + 2 if code.op_code == OpCode.cal else 0
+        if size <= len(stack) and level <= len(display):
+            raise RuntimeError("illegal access: " + str(code))
+        if size > len(stack):
+            if size > self.max_stack:
+                raise RuntimeError("stack overflow (max %d)" % self.max_stack)
+            stack.extend([0] * (min(max(size, 2 * len(stack)), self.max_stack) - len(stack)))
+        if level > len(display):
+            if level > self.max_level:
+                raise RuntimeError("too deep nesting of functions (max %d)" % self.max_level)
+            display.extend(array('q', bytes(8 * (min(max(level, 2 * len(display)), self.max_level) - len(display)))))
 
     def operate(self, code, top, stack):
         if code.op == Operator.neg:
@@ -271,12 +684,10 @@ class Pl0CodeGenerator:
                 stack[top-2] = 0
             return (top-1)
         elif code.op == Operator.wrt:
-            sys.stdout.write(str(stack[top-1]))
-            sys.stdout.flush()
+            self.out.write(str(stack[top-1]))
             return (top-1)
         elif code.op == Operator.wrl:
-            sys.stdout.write('\n')
-            sys.stdout.flush()
+            self.out.write('\n')
             return top
         else:
             raise RuntimeError("illegal op: " + str(code.op))
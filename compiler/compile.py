@@ -1,23 +1,46 @@
-from compiler.getsource import KeyWd, KeySym, KeyToken, Token, SourceReader
-from compiler.codegen import OpCode, Operator, Pl0CodeGenerator
+from compiler.getsource import KeyWd, KeySym, KeyToken, Token, ReadMode, SourceReader, TokenStream
+from compiler.codegen import OpCode, Operator, Pl0CodeGenerator, MIN_VALUE, MAX_VALUE
 from compiler.table import IdKind, Pl0Table
+from compiler.phases import Phases
 
 # First relative address of each block.
 # 'Two' means addresses used for temporary storage of `display` and `pc`.
 FIRSTADDR = 2 
 
+# Operators evaluated at compile time on constant operands, in the same way as the machine
+FOLD = {
+    Operator.neg: lambda x: -x,
+    Operator.odd: lambda x: x % 2,
+    Operator.add: lambda x, y: x + y,
+    Operator.sub: lambda x, y: x - y,
+    Operator.mul: lambda x, y: x * y,
+    Operator.div: lambda x, y: int(x / y),
+    Operator.eq: lambda x, y: 1 if x == y else 0,
+    Operator.ls: lambda x, y: 1 if x < y else 0,
+    Operator.gr: lambda x, y: 1 if x > y else 0,
+    Operator.neq: lambda x, y: 1 if x != y else 0,
+    Operator.lseq: lambda x, y: 1 if x <= y else 0,
+    Operator.greq: lambda x, y: 1 if x >= y else 0,
+}
+
 class Pl0Compiler:
     '''
     Analyze syntax and translate to codes for a stack machine.
+    `reader` is a `SourceReader` or a `TokenStream` read in advance.
+    When `fold` is True, constant expressions and conditions are evaluated at compile time.
+    When `tail_calls` is True, `return f(...)` in the function `f` reuses the frame (see `tail_call`).
     '''
-    def __init__(self, reader, table, gen):
-        assert isinstance(reader, SourceReader)
+    def __init__(self, reader, table, gen, fold=True, tail_calls=True):
+        assert isinstance(reader, SourceReader) or isinstance(reader, TokenStream)
         assert isinstance(table, Pl0Table)
         assert isinstance(gen, Pl0CodeGenerator)
         self.reader = reader
         self.table = table
         self.gen = gen
+        self.fold = fold
+        self.tail_calls = tail_calls
         self.token = None
+        self.entry = None # the index of `ict` of the function whose statements are being compiled
 
     def next_token(self):
         '''
@@ -45,6 +68,7 @@ class Pl0Compiler:
         self.next_token()
         self.table.block_begin(FIRSTADDR)
         self.block(0) # argument 0 is dummy
+        self.gen.mark_pure()
 
     def block(self, p_index):
         '''
@@ -65,10 +89,13 @@ class Pl0Compiler:
             else:
                 break
         self.gen.backpatch(backp) # backpatch the address of jmp to function
-        self.table.change_v(p_index, self.gen.next_code())
+        entry = self.gen.next_code()
+        self.table.change_v(p_index, entry)
         self.gen.gencode_v(OpCode.ict, self.table.frame_l())
+        self.entry = entry
         self.statement()
         self.gen.gencode_r()
+        self.gen.record_func(self.table.name(p_index), self.table.b_level(), self.table.pars(p_index), backp, entry)
         self.table.block_end()
 
     def const_decl(self):
@@ -146,16 +173,25 @@ class Pl0Compiler:
                 return
             elif self.token.kind == KeyWd.If:
                 self.next_token()
-                self.condition()
+                start = self.gen.next_code()
+                cond = self.condition()
                 self.check_get(self.token, KeyWd.Then)
-                back_p = self.gen.gencode_v(OpCode.jpc, 0)
-                self.statement()
-                self.gen.backpatch(back_p)
+                if cond is None:
+                    back_p = self.gen.gencode_v(OpCode.jpc, 0)
+                    self.statement()
+                    self.gen.backpatch(back_p)
+                else:
+                    # the statement is always or never executed
+                    self.gen.rollback(start)
+                    self.statement()
+                    if cond == 0:
+                        self.gen.rollback(start)
                 return
             elif self.token.kind == KeyWd.Ret:
                 self.next_token()
                 self.expression()
-                self.gen.gencode_r()
+                if not self.tail_call():
+                    self.gen.gencode_r()
                 return
             elif self.token.kind == KeyWd.Begin:
                 self.next_token()
@@ -171,12 +207,21 @@ class Pl0Compiler:
             elif self.token.kind == KeyWd.While:
                 self.next_token()
                 backp2 = self.gen.next_code()
-                self.condition()
+                cond = self.condition()
                 self.check_get(self.token, KeyWd.Do)
-                backp = self.gen.gencode_v(OpCode.jpc, 0)
-                self.statement()
-                self.gen.gencode_v(OpCode.jmp, backp2)
-                self.gen.backpatch(backp)
+                if cond is None:
+                    backp = self.gen.gencode_v(OpCode.jpc, 0)
+                    self.statement()
+                    self.gen.gencode_v(OpCode.jmp, backp2)
+                    self.gen.backpatch(backp)
+                else:
+                    # loop forever without checking the condition, or never
+                    self.gen.rollback(backp2)
+                    self.statement()
+                    if cond == 0:
+                        self.gen.rollback(backp2)
+                    else:
+                        self.gen.gencode_v(OpCode.jmp, backp2)
                 return
             elif self.token.kind == KeyWd.Write:
                 self.next_token()
@@ -199,39 +244,91 @@ class Pl0Compiler:
             else:
                 raise RuntimeError("unexpected token: " + str(self.token))
 
+    def tail_call(self):
+        '''
+        Replace `cal` of the current function at the end of the expression of `return`
+        by `sto` of the arguments into the parameters and `jmp` to the code next to `ict`,
+        which runs the function again in the same frame.
+        The arguments are evaluated before they are stored, since they are on the stack.
+        Return True when it is replaced.
+        '''
+        if not self.tail_calls or self.table.b_level() == 0:
+            return False
+        gen = self.gen
+        i = gen.c_index
+        if gen.code.op[i] != OpCode.cal.value or gen.code.b[i] != self.entry:
+            return False
+        gen.rollback(i)
+        level = self.table.b_level()
+        pars = self.table.f_pars()
+        # the last arguments which are the same parameters need not be stored
+        k = 1
+        while k <= pars and gen.code.op[gen.c_index] == OpCode.lod.value \
+                and gen.code.a[gen.c_index] == level and gen.code.b[gen.c_index] == -k:
+            gen.rollback(gen.c_index)
+            k += 1
+        for addr in range(k, pars + 1):
+            gen.emit(OpCode.sto.value, level, -addr)
+        gen.tail_jump(self.entry + 1)
+        return True
+
+    def fold_o(self, op, start, *values):
+        '''
+        Generate the operator `op` on operands whose codes start at `start`.
+        When all the operands are constant, replace their codes by the result
+        and return it. Otherwise return None.
+        '''
+        if self.fold and None not in values and not (op == Operator.div and values[1] == 0):
+            value = FOLD[op](*values)
+            if MIN_VALUE <= value <= MAX_VALUE:
+                self.gen.rollback(start)
+                self.gen.gencode_v(OpCode.lit, value)
+                return value
+        self.gen.gencode_o(op)
+        return None
+
     def expression(self):
+        '''
+        Parse an expression.
+        Return its value when it is constant, otherwise None. The same applies to `term`, `factor` and `condition`.
+        '''
+        start = self.gen.next_code()
         prev_token = self.token
         if prev_token.kind in [KeySym.Plus, KeySym.Minus]:
             # for unary operators
             self.next_token()
-            self.term()
+            value = self.term()
             if prev_token.kind == KeySym.Minus:
-                self.gen.gencode_o(Operator.neg)
+                value = self.fold_o(Operator.neg, start, value)
         else:
-            self.term()
+            value = self.term()
         prev_token = self.token
         while prev_token.kind in [KeySym.Plus, KeySym.Minus]:
             self.next_token()
-            self.term()
+            right = self.term()
             if prev_token.kind == KeySym.Plus:
-                self.gen.gencode_o(Operator.add)
+                value = self.fold_o(Operator.add, start, value, right)
             else:
-                self.gen.gencode_o(Operator.sub)
+                value = self.fold_o(Operator.sub, start, value, right)
             prev_token = self.token
+        return value
 
     def term(self):
-        self.factor()
+        start = self.gen.next_code()
+        value = self.factor()
         prev_token = self.token
         while prev_token.kind in [KeySym.Mult, KeySym.Div]:
             self.next_token()
-            self.factor()
+            right = self.factor()
             if prev_token.kind == KeySym.Mult:
-                self.gen.gencode_o(Operator.mul)
+                value = self.fold_o(Operator.mul, start, value, right)
             else:
-                self.gen.gencode_o(Operator.div)
+                value = self.fold_o(Operator.div, start, value, right)
             prev_token = self.token
+        return value
 
     def factor(self):
+        value = None
         if self.token.kind == KeyToken.Id:
             t_index = self.table.search(self.token.value, IdKind.Var)
             kind = self.table.kind(t_index)
@@ -239,7 +336,8 @@ class Pl0Compiler:
                 self.gen.gencode_t(OpCode.lod, t_index)
                 self.next_token()
             elif kind == IdKind.Const:
-                self.gen.gencode_v(OpCode.lit, self.table.val(t_index))
+                value = self.table.val(t_index)
+                self.gen.gencode_v(OpCode.lit, value)
                 self.next_token()
             elif kind == IdKind.Func:
                 self.next_token()
@@ -266,42 +364,68 @@ class Pl0Compiler:
             else:
                 raise RuntimeError("unexpected IdKind: " + str(kind))
         elif self.token.kind == KeyToken.Num:
-            self.gen.gencode_v(OpCode.lit, self.token.value)
+            value = self.token.value
+            self.gen.gencode_v(OpCode.lit, value)
             self.next_token()
         elif self.token.kind == KeySym.Lparen:
             self.next_token()
-            self.expression()
+            value = self.expression()
             self.check_get(self.token, KeySym.Rparen)
 
         if self.token.kind in [KeyToken.Id, KeyToken.Num, KeySym.Lparen]:
             raise RuntimeError("unexpected token: " + str(self.token))
+        return value
 
-    def code_o(self, op):
+    def code_o(self, op, start, *values):
         '''
         just for `condition` method
         '''
         self.next_token()
-        self.expression()
-        self.gen.gencode_o(op)
+        right = self.expression()
+        return self.fold_o(op, start, *(values + (right,)))
 
     def condition(self):
+        start = self.gen.next_code()
         if self.token.kind == KeyWd.Odd:
-            self.code_o(Operator.odd)
-            return
+            return self.code_o(Operator.odd, start)
 
-        self.expression()
+        left = self.expression()
         kind = self.token.kind
         if kind == KeySym.Equal:
-            self.code_o(Operator.eq)
+            return self.code_o(Operator.eq, start, left)
         elif kind == KeySym.Lss:
-            self.code_o(Operator.ls)
+            return self.code_o(Operator.ls, start, left)
         elif kind == KeySym.Gtr:
-            self.code_o(Operator.gr)
+            return self.code_o(Operator.gr, start, left)
         elif kind == KeySym.NotEq:
-            self.code_o(Operator.neq)
+            return self.code_o(Operator.neq, start, left)
         elif kind == KeySym.LssEq:
-            self.code_o(Operator.lseq)
+            return self.code_o(Operator.lseq, start, left)
         elif kind == KeySym.GtrEq:
-            self.code_o(Operator.greq)
+            return self.code_o(Operator.greq, start, left)
         else:
             raise RuntimeError("unexpected token: " + str(token))
+
+def compile_source(file_name, read_mode=ReadMode.Buffer, fold=True, tail_calls=True, phases=None, source=None):
+    '''
+    Compile the source program in the file `file_name`, or the in-memory `source` when it is given.
+    When `phases` measures phases, all tokens are read in the phase `read` before the phase `compile`.
+    '''
+    if phases is None:
+        phases = Phases()
+    with phases.phase('read'):
+        reader = SourceReader(file_name, read_mode, source)
+        source = reader.token_stream() if phases.enabled else reader
+    table = Pl0Table()
+    gen = Pl0CodeGenerator(table)
+    compiler = Pl0Compiler(source, table, gen, fold, tail_calls)
+
+    try:
+        with phases.phase('compile'):
+            compiler.compile()
+    finally:
+        reader.close()
+    if phases.enabled:
+        phases.count('tokens', len(source) - 1) # without the end of the source
+        phases.count('table_entries', len(table.table) - 1)
+    return gen
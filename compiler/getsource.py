@@ -1,7 +1,13 @@
+import mmap
+import re
 import string
+import sys
+from array import array
+from collections import namedtuple
 from enum import Enum, unique
 
 MAXLINE = 120
+MAXNUM = 2**63 - 1 # largest number literal, which fits the column of values in `CodeSegment`
 
 @unique # Assert that values of enum are different from each other
 class KeyWd(Enum):
@@ -51,74 +57,110 @@ class KeyEtc(Enum):
     Colon  = "colon"
     Others = "others"
 
+@unique
+class ReadMode(Enum):
+    Line   = "line"   # read the file line by line
+    Buffer = "buffer" # read the whole file into a single buffer
+    Mmap   = "mmap"   # map the file into memory
+
+class Token:
+    __slots__ = ('kind', 'value')
+
+    def __init__(self, kind, value=None):
+        self.kind = kind
+        self.value = value
+
+    def __eq__(self, other):
+        if not isinstance(other, Token):
+            return False
+        if self.kind != other.kind:
+            return False
+        if self.value != other.value:
+            return False
+        return True
+
+    def __str__(self):
+        return "Token {kind=%s, value=%s}" % (self.kind, repr(self.value))
+
+    def __repr__(self):
+        return "Token {kind=%s, value=%s}" % (self.kind, repr(self.value))
+
+# Kind of each character which can start a token.
+# Characters not in the table are `KeyEtc.Others`.
+CHAR_KIND = dict(
+        [(c, KeyEtc.Digit) for c in string.digits] +
+        [(c, KeyEtc.Letter) for c in string.ascii_letters] +
+        [(x.value, x) for x in KeySym if len(x.value) == 1] +
+        [(':', KeyEtc.Colon)])
+
+KEYWD_TABLE = dict((x.value, x) for x in KeyWd)
+KEYSYM_TABLE = dict((x.value, x) for x in KeySym)
+KEYTOKEN_TABLE = dict((x.value, x) for x in KeyToken)
+
+# All kinds of tokens. The index in this list is the code of the kind in `TokenStream`.
+TOKEN_KINDS = list(KeyWd) + list(KeySym) + list(KeyToken) + list(KeyEtc)
+KIND_CODE = dict((kind, i) for i, kind in enumerate(TOKEN_KINDS))
+
+# A token following spaces.
+# Groups are 1: identifier or keyword, 2: number, 3: symbol of two characters, 4: any other character.
+# `\r` is a space, since files read in text mode end lines by `\r` and `\r\n` as well as `\n`
+# (universal newlines), and sources in memory or mapped by mmap are read in the same way.
+TOKEN_RUN = '[ \t\r\n]*(?:([A-Za-z][A-Za-z0-9]*)|([0-9]+)|(:=|<=|<>|>=)|(%s))'
+# Any other character. In bytes, a character is a whole sequence of UTF-8.
+STR_CHAR = '[^ \t\r\n]'
+BYTES_CHAR = rb'[\xc0-\xff][\x80-\xbf]*|[^ \t\r\n]'
+
+# Shared tokens of keywords and symbols, which always have the same value.
+# Single characters not in `CHAR_TOKEN` are `KeyEtc.Others` with the character itself as value.
+KEYWD_TOKEN = dict((x.value, Token(x)) for x in KeyWd)
+PAIR_TOKEN = dict((x.value, Token(x)) for x in KeySym if len(x.value) == 2)
+CHAR_TOKEN = dict((c, Token(KeyToken.Nul) if kind == KeyEtc.Colon else Token(kind, c))
+                  for c, kind in CHAR_KIND.items()
+                  if kind not in [KeyEtc.Letter, KeyEtc.Digit])
+CHAR_TOKEN['<'] = Token(KeySym.Lss)
+CHAR_TOKEN['>'] = Token(KeySym.Gtr)
+
+def bytes_to_str(b):
+    return str(b, 'utf-8')
+
+# Regular expressions and tables of the lexer for each type of source buffer.
+# token_run: `TOKEN_RUN`, char: a single character, keywd_token: shared tokens of keywords,
+# pair_token: tokens of symbols of two characters, char_token: tokens of a single character,
+# text: function to convert a slice of the buffer to `str`
+Syntax = namedtuple('Syntax', ['token_run', 'char', 'keywd_token', 'pair_token', 'char_token', 'text'])
+
+STR_SYNTAX = Syntax(re.compile(TOKEN_RUN % STR_CHAR), re.compile(STR_CHAR + '|[ \t\r\n]'),
+                    KEYWD_TOKEN, PAIR_TOKEN, CHAR_TOKEN, str)
+BYTES_SYNTAX = Syntax(re.compile(TOKEN_RUN.encode() % BYTES_CHAR), re.compile(BYTES_CHAR + rb'|[ \t\r\n]'),
+                      dict((k.encode(), v) for k, v in KEYWD_TOKEN.items()),
+                      dict((k.encode(), v) for k, v in PAIR_TOKEN.items()),
+                      dict((k.encode(), v) for k, v in CHAR_TOKEN.items()),
+                      bytes_to_str)
+
 class KeyTable:
     @classmethod
     def is_keywd(self, token):
-        return token in [x.value for x in KeyWd.__members__.values()]
+        return token in KEYWD_TABLE
 
     @classmethod
     def to_keywd(self, token):
-        for x in KeyWd:
-            if x.value == token:
-                return x
-        return None
+        return KEYWD_TABLE.get(token)
 
     @classmethod
     def to_keysym(self, token):
-        for x in KeySym:
-            if x.value == token:
-                return x
-        return None
+        return KEYSYM_TABLE.get(token)
 
     @classmethod
     def to_keytoken(self, token):
-        for x in KeyToken:
-            if x.value == token:
-                return x
-        return None
+        return KEYTOKEN_TABLE.get(token)
 
     @classmethod
     def is_keysym(self, token):
-        return token in [x.value for x in KeySym.__members__.values()]
+        return token in KEYSYM_TABLE
 
     @classmethod
     def to_kind(self, chara):
-        # FIXME
-        if chara == "":
-            return KeyEtc.Others
-
-        if chara in string.digits:
-            return KeyEtc.Digit
-        elif chara in string.ascii_letters:
-            return KeyEtc.Letter
-        elif chara == '+':
-            return KeySym.Plus
-        elif chara == '-':
-            return KeySym.Minus
-        elif chara == '*':
-            return KeySym.Mult
-        elif chara == '/':
-            return KeySym.Div
-        elif chara == '(':
-            return KeySym.Lparen
-        elif chara == ')':
-            return KeySym.Rparen
-        elif chara == '=':
-            return KeySym.Equal
-        elif chara == '<':
-            return KeySym.Lss
-        elif chara == '>':
-            return KeySym.Gtr
-        elif chara == ',':
-            return KeySym.Comma
-        elif chara == '.':
-            return KeySym.Period
-        elif chara == ';':
-            return KeySym.Semicolon
-        elif chara == ':':
-            return KeyEtc.Colon
-        else:
-            return KeyEtc.Others
+        return CHAR_KIND.get(chara, KeyEtc.Others)
 
     @classmethod
     def is_space(self, chara):
@@ -128,115 +170,211 @@ class KeyTable:
     def is_newline(self, chara):
         return chara == '\n'
 
-class Token:
-    def __init__(self, kind, value=None):
-        self.kind = kind
-        self.value = value
+class TokenStream:
+    '''
+    Whole token stream of a source program, stored in parallel columns.
+    kinds: code of the kind of each token (the index in `TOKEN_KINDS`)
+    refs: index of each token in `pool`
+    offsets: offset of each token in the source
+    pool: distinct token objects of the stream. Shared tokens of `SourceReader` appear only once.
+    The parser can walk the stream by index, or through `next_token` like `SourceReader`.
+    '''
+    def __init__(self):
+        self.kinds = array('B')
+        self.refs = array('I')
+        self.offsets = array('I')
+        self.pool = []
+        self.pool_index = {}
+        self.index = 0
 
-    def __eq__(self, other):
-        if not isinstance(other, Token):
-            return False
-        if self.kind != other.kind:
-            return False
-        if self.value != other.value:
-            return False
-        return True
+    def append(self, token, offset):
+        ref = self.pool_index.get(id(token))
+        if ref is None:
+            ref = len(self.pool)
+            self.pool.append(token)
+            self.pool_index[id(token)] = ref
+        self.kinds.append(KIND_CODE[token.kind])
+        self.refs.append(ref)
+        self.offsets.append(offset)
 
-    def __str__(self):
-        return "Token {kind=%s, value=%s}" % (self.kind, repr(self.value))
+    def __len__(self):
+        return len(self.kinds)
 
-    def __repr__(self):
-        return "Token {kind=%s, value=%s}" % (self.kind, repr(self.value))
+    def __iter__(self):
+        pool = self.pool
+        return (pool[ref] for ref in self.refs)
+
+    def kind(self, i):
+        return TOKEN_KINDS[self.kinds[i]]
+
+    def value(self, i):
+        return self.pool[self.refs[i]].value
+
+    def offset(self, i):
+        return self.offsets[i]
+
+    def token(self, i):
+        return self.pool[self.refs[i]]
+
+    def next_token(self):
+        '''
+        Return the token at the cursor and advance it.
+        The last token of the stream is returned repeatedly at the end.
+        '''
+        i = self.index
+        if i < len(self.refs) - 1:
+            self.index = i + 1
+        return self.pool[self.refs[i]]
+
+    def close(self):
+        pass
 
 class SourceReader:
-    def __init__(self, input_file):
-        self.input_file = open(input_file, 'r')
-        self.line = None
-        self.line_index = 0
-        self.ch = None 
+    '''
+    Reader of a source program.
+    In `ReadMode.Line`, `buf` is the current line of the input file.
+    In `ReadMode.Buffer` and `ReadMode.Mmap`, `buf` is the whole source and `pos` is the offset into it.
+    A source in bytes, such as a file mapped in `ReadMode.Mmap`, is decoded as UTF-8.
+    `base` is the offset of `buf` in the source and `offset` is the offset of the last token.
+    '''
+    def __init__(self, input_file=None, mode=ReadMode.Line, source=None):
+        '''
+        Open the file `input_file` in `mode`,
+        or read an in-memory source program `source` given as `str` or `bytes` as in `ReadMode.Buffer`.
+        '''
+        self.input_file = None
+        self.mmap = None
+        if (input_file is None) == (source is None):
+            raise RuntimeError("either input_file or source should be given")
+        if source is not None:
+            self.mode = ReadMode.Buffer
+            self.set_buffer(source)
+            return
+        self.mode = mode
+        if mode == ReadMode.Line:
+            self.input_file = open(input_file, 'r')
+            self.set_buffer("")
+        elif mode == ReadMode.Buffer:
+            with open(input_file, 'r') as f:
+                self.set_buffer(f.read())
+        elif mode == ReadMode.Mmap:
+            self.input_file = open(input_file, 'rb')
+            try:
+                self.mmap = mmap.mmap(self.input_file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.set_buffer(self.mmap)
+            except ValueError:
+                # an empty file can not be mapped
+                self.set_buffer(b"")
+        else:
+            raise RuntimeError("illegal mode: " + str(mode))
+
+    def set_buffer(self, buf):
+        self.buf = buf
+        self.pos = 0
+        self.base = 0
+        self.offset = 0
+        self.syntax = STR_SYNTAX if isinstance(buf, str) else BYTES_SYNTAX
+        # shared tokens of keywords, identifiers and numbers appeared so far
+        self.names = dict(self.syntax.keywd_token)
+        self.tokens = self.tokenize()
+
+    def next_line(self):
+        '''
+        Read the next line from the input file.
+        Return False at the end of the source.
+        '''
+        if self.mode != ReadMode.Line:
+            return False
+        self.base += len(self.buf)
+        self.buf = self.input_file.readline()
+        self.pos = 0
+        return self.buf != ""
 
     def next_char(self):
         '''
         Read a character from the input file.
         '''
-        if self.line == None:
-            self.line = self.input_file.readline()
-            if self.line == "":
-                self.line = None
-                return ""
-            self.line_index = 0
-
-        c = self.line[self.line_index]
-        self.line_index += 1
-        if self.line_index >= len(self.line):
-            self.line = None
-        return c
+        if self.pos >= len(self.buf) and not self.next_line():
+            return ""
+        c = self.syntax.char.match(self.buf, self.pos).group()
+        self.pos += len(c)
+        return self.syntax.text(c)
 
     def next_token(self):
         '''
-        Read a token from the input file
+        Read a token from the input file.
         '''
-        # first reading or spaces
-        while self.ch == None \
-            or KeyTable.is_space(self.ch) \
-            or KeyTable.is_newline(self.ch):
-            self.ch = self.next_char()
-
-        kind = KeyTable.to_kind(self.ch)
-
-        # parse letters
-        if kind == KeyEtc.Letter:
-            ident = self.ch
-            self.ch = self.next_char()
-            while KeyTable.to_kind(self.ch) in [KeyEtc.Letter, KeyEtc.Digit]:
-                ident += self.ch
-                self.ch = self.next_char()
-            # when ident is keywd
-            if KeyTable.is_keywd(ident):
-                token = Token(KeyTable.to_keywd(ident))
-            # when ident is not keywd, such as name of variables
-            else:
-                token = Token(KeyToken.Id, ident)
-        # parse number
-        elif kind == KeyEtc.Digit:
-            num = int(self.ch)
-            self.ch = self.next_char()
-            while KeyTable.to_kind(self.ch) == KeyEtc.Digit:
-                num = num * 10 + int(self.ch)
-                self.ch = self.next_char()
-            token = Token(KeyToken.Num, num)
-        # parse assignment
-        elif kind == KeyEtc.Colon:
-            self.ch = self.next_char()
-            if self.ch == "=":
-                token = Token(KeySym.Assign)
-                self.ch = self.next_char()
-            else:
-                token = Token(KeyToken.Nul)
-        # parse '<', '<=', or '<>'
-        elif kind == KeySym.Lss:
-            self.ch = self.next_char()
-            if self.ch == "=":
-                token = Token(KeySym.LssEq)
-                self.ch = self.next_char()
-            elif self.ch == ">":
-                token = Token(KeySym.NotEq)
-                self.ch = self.next_char()
-            else:
-                token = Token(KeySym.Lss)
-        # parse '>' or '>='
-        elif kind == KeySym.Gtr:
-            self.ch = self.next_char()
-            if self.ch == "=":
-                token = Token(KeySym.GtrEq)
-                self.ch = self.next_char()
-            else:
-                token = Token(KeySym.Gtr)
-        else:
-            token = Token(kind, self.ch)
-            self.ch = self.next_char()
+        token = next(self.tokens, None)
+        if token is None:
+            return Token(KeyEtc.Others, "")
         return token
 
-    def close(self):
-        self.input_file.close()
+    def tokenize(self):
+        '''
+        Generate tokens until the end of the source.
+        The last token is `Token(KeyEtc.Others, "")`.
+        Tokens never span lines, so each token is sliced out of `buf` by offset.
+        Tokens of the same keyword, symbol, identifier or number are the same object and must not be modified.
+        '''
+        syntax = self.syntax
+        token_run, pair_token, char_token, text = syntax.token_run, syntax.pair_token, syntax.char_token, syntax.text
+        names = self.names
+        while True:
+            m = token_run.match(self.buf, self.pos)
+            # only spaces are left in `buf`
+            while m is None:
+                if not self.next_line():
+                    self.pos = len(self.buf)
+                    self.offset = self.base + self.pos
+                    yield Token(KeyEtc.Others, "")
+                    return
+                m = token_run.match(self.buf, 0)
+            self.pos = m.end()
+
+            group = m.lastindex
+            self.offset = self.base + m.start(group)
+            # parse letters
+            if group == 1:
+                ident = m.group(1)
+                token = names.get(ident)
+                # when ident is neither keywd nor known name of variables
+                if token is None:
+                    token = Token(KeyToken.Id, sys.intern(text(ident)))
+                    names[ident] = token
+                yield token
+            # parse number
+            elif group == 2:
+                digits = m.group(2)
+                token = names.get(digits)
+                if token is None:
+                    value = int(digits)
+                    if value > MAXNUM:
+                        raise RuntimeError("too large number: " + text(digits))
+                    token = Token(KeyToken.Num, value)
+                    names[digits] = token
+                yield token
+            # parse ':=', '<=', '<>' or '>='
+            elif group == 3:
+                yield pair_token[m.group(3)]
+            # parse a single character
+            else:
+                c = m.group(4)
+                token = char_token.get(c)
+                if token is None:
+                    token = Token(KeyEtc.Others, text(c))
+                yield token
 
+    def token_stream(self):
+        '''
+        Read all the rest of tokens into a `TokenStream`.
+        '''
+        stream = TokenStream()
+        for token in self.tokens:
+            stream.append(token, self.offset)
+        return stream
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.close()
+        if self.input_file is not None:
+            self.input_file.close()
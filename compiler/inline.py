@@ -0,0 +1,119 @@
+from compiler.codegen import OpCode, ValInst, RefInst, Pl0CodeGenerator, assemble, func_index, falls_off
+from compiler.table import RelAddr, FuncEntry
+
+# Default max num of codes of the body of inlined functions
+THRESHOLD = 16
+
+def inlinable(code, f, index, threshold=THRESHOLD):
+    '''
+    Return True when calls of the function `f` can be replaced by its body:
+    the body has at most `threshold` codes, calls no function (so it is not recursive
+    and no function sees its frame through `display`), and always ends with `return`.
+    `code` is the `CodeSegment` of the program and `index` is its `func_index`.
+    '''
+    if f.level == 0 or f.end - f.entry - 1 > threshold:
+        return False
+    if OpCode.cal.value in code.op[f.entry+1:f.end]:
+        return False
+    return not falls_off(code, f, index)
+
+class Inliner:
+    '''
+    Pass over the codes of `Pl0CodeGenerator` after compilation which replaces calls of small functions by their bodies.
+    Parameters and variables of an inlined function are moved to slots added to the frame of the caller,
+    arguments are stored into them, and `ret` becomes `jmp` to the end of the body with the value on the stack.
+    Callers which may end without `return` are not changed, since their value is the last slot of the frame.
+    '''
+    def __init__(self, threshold=THRESHOLD):
+        self.threshold = threshold
+        self.inlined = 0
+
+    def run(self, gen):
+        '''
+        Inline calls in the codes of `gen` and return the number of inlined calls.
+        '''
+        assert isinstance(gen, Pl0CodeGenerator)
+        codes = gen.disassemble()
+        funcs = gen.funcs
+        index = func_index(funcs)
+        callees = dict((f.entry, f) for f in funcs if inlinable(gen.code, f, index, self.threshold))
+        # the caller of each code, the first slot added to its frame, and the num of added slots
+        caller = [None] * len(codes)
+        base = {}
+        extra = {}
+        for f in funcs:
+            if f.level > 0 and falls_off(gen.code, f, index):
+                continue
+            for i in range(f.entry + 1, f.end):
+                code = codes[i]
+                if code.op_code == OpCode.cal:
+                    g = index.get(code.raddr.addr)
+                    if g is not None and g.entry in callees:
+                        caller[i] = f
+                        base[f.entry] = codes[f.entry].value
+                        # slots are shared by all inlined calls in the function
+                        extra[f.entry] = max(extra.get(f.entry, 0), g.pars + codes[g.entry].value - 2)
+
+        self.inlined = 0
+        result = []    # new codes
+        fixed = set()  # indices of new jumps whose targets are already new indices
+        reloc = [0] * (len(codes) + 1)
+        for i, code in enumerate(codes):
+            reloc[i] = len(result)
+            f = caller[i]
+            if f is None:
+                result.append(code)
+                continue
+            g = index[code.raddr.addr]
+            self.inline(codes, f, g, base[f.entry], result, fixed)
+            self.inlined += 1
+        reloc[len(codes)] = len(result)
+
+        for k, code in enumerate(result):
+            if k in fixed:
+                continue
+            if code.op_code == OpCode.jmp or code.op_code == OpCode.jpc:
+                code.value = reloc[code.value]
+            elif code.op_code == OpCode.cal:
+                code.raddr.addr = reloc[code.raddr.addr]
+        for f in funcs:
+            if f.entry in base:
+                result[reloc[f.entry]] = ValInst(OpCode.ict, base[f.entry] + extra[f.entry])
+        for entry in gen.table.table:
+            if isinstance(entry, FuncEntry):
+                entry.raddr.addr = reloc[entry.raddr.addr]
+        for f in funcs:
+            f.start, f.entry, f.end = reloc[f.start], reloc[f.entry], reloc[f.end]
+            f.tails = [reloc[i] for i in f.tails]
+        gen.code = assemble(result)
+        gen.c_index = len(result) - 1
+        return self.inlined
+
+    def inline(self, codes, f, g, base, result, fixed):
+        '''
+        Append the body of `g` called in `f` to `result`, using slots from `base` of the frame of `f`.
+        '''
+        def slot(addr):
+            # parameters first, and then variables
+            return base + g.pars + addr if addr < 0 else base + g.pars + addr - 2
+
+        for k in range(1, g.pars + 1):
+            result.append(RefInst(OpCode.sto, RelAddr(f.level, slot(-k))))
+        start = len(result)
+        end = start + (g.end - g.entry - 2) # the last `ret` is removed
+        for i in range(g.entry + 1, g.end):
+            code = codes[i]
+            if code.op_code == OpCode.lod or code.op_code == OpCode.sto:
+                if code.raddr.level == g.level:
+                    code = RefInst(code.op_code, RelAddr(f.level, slot(code.raddr.addr)))
+                else:
+                    code = RefInst(code.op_code, RelAddr(code.raddr.level, code.raddr.addr))
+            elif code.op_code == OpCode.jmp or code.op_code == OpCode.jpc:
+                code = ValInst(code.op_code, start + code.value - g.entry - 1)
+                fixed.add(len(result))
+            elif code.op_code == OpCode.ret:
+                if i == g.end - 1:
+                    break
+                code = ValInst(OpCode.jmp, end)
+                fixed.add(len(result))
+            result.append(code)
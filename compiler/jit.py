@@ -0,0 +1,307 @@
+import time
+from compiler.vm import Pl0VM, predecode, make_loop, MAX_STACK, MAX_LEVEL,\
+                       LIT, LOD, STO, CAL, RET, ICT, JMP, JPC, NEG, ADD, SUB, MUL, DIV, ODD,\
+                       EQ, LS, GR, NEQ, LSEQ, GREQ, WRT, WRL
+
+# Default num of executions of a block in the interpreter before it is compiled
+THRESHOLD = 50
+
+# Opcodes which replace the first code of blocks in `Pl0TieredVM.tiered`
+ENTER = 29 # block not compiled yet. `a` is the index of the block
+JIT = 30   # compiled block. `a` is the index of the block and `c` is the compiled function
+
+# Python operators of binary opcodes
+ARITH_SYMBOL = {ADD: '+', SUB: '-', MUL: '*'}
+COMPARE_SYMBOL = {EQ: '==', LS: '<', GR: '>', NEQ: '!=', LSEQ: '<=', GREQ: '>='}
+
+class Block:
+    '''
+    Basic block of pre-decoded codes from `start` to `end` (exclusive).
+    count: the num of executions in the interpreter
+    func: the compiled function or None
+    '''
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.count = 0
+        self.func = None
+
+    def __str__(self):
+        return "Block {index=%d, start=%d, end=%d, count=%d}" % (self.index, self.start, self.end, self.count)
+
+    def __repr__(self):
+        return "Block {index=%d, start=%d, end=%d, count=%d}" % (self.index, self.start, self.end, self.count)
+
+def find_blocks(prog):
+    '''
+    Split pre-decoded codes into basic blocks at targets of jumps and calls and next to jumps, calls and returns.
+    Blocks end with `jmp`, `jpc`, `cal` or `ret`. `ict` appears only at the beginning of blocks.
+    `ret` of the main block is left to the interpreter to stop there.
+    Return the list of blocks which have at least one code.
+    '''
+    leaders = set([0])
+    for i, (op, a, b, _) in enumerate(prog):
+        if op == JMP or op == JPC:
+            leaders.add(a)
+            leaders.add(i + 1)
+        elif op == CAL:
+            leaders.add(b)
+            leaders.add(i + 1)
+        elif op == RET or op == ICT:
+            leaders.add(i + 1)
+    blocks = []
+    starts = sorted(x for x in leaders if x < len(prog))
+    for start, next_start in zip(starts, starts[1:] + [len(prog)]):
+        end = start
+        while end < next_start:
+            op, a, _, _ = prog[end]
+            if (op == ICT and end > start) or (op == RET and a == 0):
+                break
+            end += 1
+            if op in (JMP, JPC, CAL, RET):
+                break
+        if end > start:
+            blocks.append(Block(len(blocks), start, end))
+    return blocks
+
+def find_loops(prog):
+    '''
+    Return the index of the last backward `jmp` to each loop header.
+    '''
+    loops = {}
+    for i, (op, a, _, _) in enumerate(prog):
+        if op == JMP and a <= i:
+            loops[a] = max(loops.get(a, i), i)
+    return loops
+
+def block_code(prog, block, goto):
+    '''
+    Translate a block into lines of Python statements.
+    Values pushed in the block are kept in locals.
+    `goto(pc, top)` returns lines to continue from `pc` with `top` given as a Python expression.
+    Return the lines, the size of `stack` over `top` used by the block, and the level of `display` set by the block.
+    '''
+    body = []
+    values = [] # Python expressions of values, and whether each is a condition
+    temps = [0]
+    low = [0] # the num of values below `top` popped by the block
+
+    def temp(expr):
+        name = 't%d' % temps[0]
+        temps[0] += 1
+        body.append('%s = %s' % (name, expr))
+        return name
+
+    def pop():
+        if values:
+            return values.pop()
+        low[0] += 1
+        return (temp('stack[top - %d]' % low[0]), False)
+
+    def number():
+        expr, is_cond = pop()
+        return '(1 if %s else 0)' % expr if is_cond else expr
+
+    def leave():
+        # store values left by the block on the stack
+        for k, value in enumerate(values):
+            expr, is_cond = value
+            body.append('stack[top + %d] = %s' % (k - low[0], '(1 if %s else 0)' % expr if is_cond else expr))
+        n = len(values) - low[0]
+        return 'top + %d' % n if n != 0 else 'top'
+
+    exit_ = None
+    size = 0
+    level = None
+    for pc in range(block.start, block.end):
+        op, a, b, _ = prog[pc]
+        if op == LIT:
+            values.append(('(%d)' % a, False))
+        elif op == LOD:
+            values.append((temp('stack[display[%d] + %d]' % (a, b)), False))
+        elif op == STO:
+            body.append('stack[display[%d] + %d] = %s' % (a, b, number()))
+        elif op in ARITH_SYMBOL:
+            right = number()
+            values.append(('(%s %s %s)' % (number(), ARITH_SYMBOL[op], right), False))
+        elif op == DIV:
+            right = number()
+            values.append(('int(%s / %s)' % (number(), right), False))
+        elif op in COMPARE_SYMBOL:
+            right = number()
+            values.append(('%s %s %s' % (number(), COMPARE_SYMBOL[op], right), True))
+        elif op == NEG:
+            values.append(('(-%s)' % number(), False))
+        elif op == ODD:
+            values.append(('(%s %% 2)' % number(), False))
+        elif op == WRT:
+            body.append('write(str(%s))' % number())
+        elif op == WRL:
+            body.append("write('\\n')")
+        elif op == ICT:
+            body.append('top += %d' % a)
+            size += a
+        elif op == JMP:
+            exit_ = goto(a, leave())
+        elif op == JPC:
+            cond = temp(pop()[0])
+            top = leave()
+            exit_ = ['if %s:' % cond] + ['    ' + line for line in goto(pc + 1, top)] + goto(a, top)
+        elif op == CAL:
+            top = leave()
+            size += 2
+            level = a + 1
+            exit_ = [ 'top = %s' % top
+                    , 'stack[top] = display[%d]' % level
+                    , 'stack[top + 1] = %d' % (pc + 1)
+                    , 'display[%d] = top' % level
+                    ] + goto(b, 'top')
+        elif op == RET:
+            # the return address is known only at run time
+            exit_ = [ 'value = %s' % number()
+                    , 'top = display[%d]' % a
+                    , 'display[%d] = stack[top]' % a
+                    , 'pc = stack[top + 1]'
+                    , 'stack[top - %d] = value' % b
+                    , 'return (pc, top - %d)' % (b - 1)
+                    ]
+            values = []
+        else:
+            raise RuntimeError("illegal op in block: " + str(op))
+    if exit_ is None:
+        exit_ = goto(block.end, leave())
+    size += max(0, len(values) - low[0])
+    return body + exit_, size, level
+
+def guard(size, level, bail):
+    '''
+    Return lines to check `stack` and `display` before a block.
+    '''
+    lines = []
+    if size > 0:
+        lines.append('if top + %d > len(stack):' % size)
+        lines.append('    ' + bail)
+    if level is not None:
+        lines.append('if %d >= len(display):' % level)
+        lines.append('    ' + bail)
+    return lines
+
+def translate(prog, blocks, name):
+    '''
+    Translate blocks into the source of a Python function `<name>(stack, display, top)`, which starts at `blocks[0]`.
+    When more blocks are given (the blocks of a loop), control moves among them in the function.
+    The function returns (pc, top) to continue from when control leaves the blocks,
+    or None without any change when `stack` or `display` is too small to execute the first block.
+    Other blocks leave control to the interpreter in that case.
+    '''
+    lines = ['def %s(stack, display, top):' % name]
+    if len(blocks) == 1:
+        code, size, level = block_code(prog, blocks[0], lambda pc, top: ['return (%d, %s)' % (pc, top)])
+        lines.extend('    ' + line for line in guard(size, level, 'return None') + code)
+        return '\n'.join(lines) + '\n'
+
+    starts = set(block.start for block in blocks)
+    def goto(pc, top):
+        if pc not in starts:
+            return ['return (%d, %s)' % (pc, top)]
+        if top == 'top':
+            return ['pc = %d' % pc, 'continue']
+        return ['top = %s' % top, 'pc = %d' % pc, 'continue']
+
+    lines.append('    pc = %d' % blocks[0].start)
+    lines.append('    while True:')
+    for i, block in enumerate(blocks):
+        code, size, level = block_code(prog, block, goto)
+        bail = 'return None' if i == 0 else 'return (%d, top)' % block.start
+        lines.append('        %s pc == %d:' % ('if' if i == 0 else 'elif', block.start))
+        lines.extend('            ' + line for line in guard(size, level, bail) + code)
+    return '\n'.join(lines) + '\n'
+
+class Pl0TieredVM(Pl0VM):
+    '''
+    `Pl0VM` which interprets codes and compiles hot basic blocks into Python functions.
+    The first code of each block in `tiered` counts executions of the block,
+    and is replaced by a call of the compiled function when the count reaches `threshold`.
+    A hot header of a loop is compiled together with the rest of the loop.
+    Counters:
+    compiled: the num of compiled blocks
+    compile_time: seconds spent to compile blocks
+    hits: the num of executions of compiled blocks
+    misses: the num of executions of blocks in the interpreter
+    '''
+    def __init__(self, code, max_stack=MAX_STACK, max_level=MAX_LEVEL, threshold=THRESHOLD, out=None):
+        super().__init__(code, max_stack, max_level, superinstructions=False, out=out)
+        self.threshold = threshold
+        self.blocks = find_blocks(self.prog)
+        self.loops = find_loops(self.prog)
+        self.tiered = list(self.prog)
+        for block in self.blocks:
+            self.tiered[block.start] = (ENTER, block.index, 0, 0)
+        self.compiled = 0
+        self.compile_time = 0.0
+        self.hits = 0
+
+    @property
+    def misses(self):
+        return sum(block.count for block in self.blocks)
+
+    def stats(self):
+        '''
+        Return counters of the JIT compiler as a dict.
+        '''
+        total = self.hits + self.misses
+        return { 'blocks': len(self.blocks)
+               , 'compiled': self.compiled
+               , 'compile_time': self.compile_time
+               , 'hits': self.hits
+               , 'misses': self.misses
+               , 'hit_rate': self.hits / total if total > 0 else 0.0
+               }
+
+    def compile(self, block):
+        '''
+        Compile a block and replace the first code of the block in `tiered` by a call of it.
+        When the block is the header of a loop, the whole loop is compiled into the function.
+        '''
+        start = time.perf_counter()
+        end = self.loops.get(block.start, block.start)
+        region = [x for x in self.blocks if block.start <= x.start <= end]
+        name = 'block_%d' % block.index
+        source = translate(self.prog, region, name)
+        namespace = {'write': self.out.write}
+        exec(compile(source, '<pl0 %s>' % name, 'exec'), namespace)
+        block.func = namespace[name]
+        self.tiered[block.start] = (JIT, block.index, 0, block.func)
+        self.compiled += 1
+        self.compile_time += time.perf_counter() - start
+
+    loop = make_loop('''
+        Execute codes from `pc` in the same way as `Pl0VM.loop`,
+        calling compiled blocks and counting executions of the others.
+        ''',
+        setup='''
+            tiered = self.tiered
+            blocks = self.blocks
+            threshold = self.threshold
+            hits = self.hits''',
+        fetch='''
+            op, a, b, c = tiered[pc]
+            pc += 1
+            if op == JIT:
+                r = c(stack, display, top)
+                if r is not None:
+                    pc, top = r
+                    hits += 1
+                    continue
+                op, a, b, c = prog[pc-1]
+            elif op == ENTER:
+                block = blocks[a]
+                block.count += 1
+                if block.count == threshold:
+                    self.compile(block)
+                op, a, b, c = prog[pc-1]''',
+        save='''
+            self.hits = hits''',
+        superinstructions=False,
+        names={'ENTER': ENTER, 'JIT': JIT})
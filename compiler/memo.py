@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from compiler.codegen import func_index
+from compiler.vm import Pl0VM, make_loop, MAX_STACK, MAX_LEVEL, CAL, RET
+
+# Default max num of results cached for each function
+MEMO_SIZE = 4096
+
+# Opcodes which replace codes of pure functions in `Pl0MemoVM`
+MEMO = 31 # `cal` of a pure function. `c` is the `Memo` of the function
+MRET = 32 # `ret` of a pure function, which caches the result
+
+class Memo:
+    '''
+    LRU cache of results of a pure function keyed by the tuple of arguments.
+    hits: the num of calls answered by the cache
+    misses: the num of calls executed
+    '''
+    def __init__(self, func, size=MEMO_SIZE):
+        self.func = func
+        self.pars = func.pars
+        self.size = size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __str__(self):
+        return "Memo {func=%s, hits=%d, misses=%d, size=%d}" % (self.func.name, self.hits, self.misses, len(self.cache))
+
+    def __repr__(self):
+        return "Memo {func=%s, hits=%d, misses=%d, size=%d}" % (self.func.name, self.hits, self.misses, len(self.cache))
+
+class Pl0MemoVM(Pl0VM):
+    '''
+    `Pl0VM` which memoizes results of calls of pure functions marked by `mark_pure`.
+    `funcs` is the list of `FuncInfo` of the program. Each pure function has its own `Memo` of `size` results.
+    Calls of pure functions are replaced by `MEMO`, which returns a cached result without calling the function,
+    and `ret` of them by `MRET`, which caches the result of the call in `pending` on the top.
+    Superinstructions are not used.
+    '''
+    CALLS = (CAL, MEMO)
+
+    def __init__(self, code, funcs, max_stack=MAX_STACK, max_level=MAX_LEVEL, size=MEMO_SIZE, out=None):
+        super().__init__(code, max_stack, max_level, superinstructions=False, out=out)
+        self.memos = {}
+        for f in funcs:
+            if f.pure:
+                self.memos[f.entry] = Memo(f, size)
+                for i in range(f.entry, f.end):
+                    op, a, b, _ = self.prog[i]
+                    if op == RET:
+                        self.prog[i] = (MRET, a, b, 0)
+        index = func_index(funcs)
+        for i, (op, a, b, _) in enumerate(self.prog):
+            if op == CAL:
+                f = index.get(b)
+                if f is not None and f.entry in self.memos:
+                    self.prog[i] = (MEMO, a, b, self.memos[f.entry])
+        self.pending = [] # (`Memo`, arguments) of calls of pure functions being executed
+
+    def stats(self):
+        '''
+        Return counters of each pure function as a dict keyed by `<name>@<entry>`.
+        '''
+        return dict(('%s@%d' % (m.func.name, m.func.entry), {'hits': m.hits, 'misses': m.misses, 'size': len(m.cache)})
+                    for m in self.memos.values())
+
+    loop = make_loop('''
+        Execute codes from `pc` in the same way as `Pl0VM.loop`, memoizing calls of pure functions.
+        ''',
+        setup='''
+            pending = self.pending''',
+        extra=[ (MEMO, '''
+                    key = tuple(stack[top-c.pars:top])
+                    cache = c.cache
+                    value = cache.get(key)
+                    if value is not None:
+                        cache.move_to_end(key)
+                        c.hits += 1
+                        top -= c.pars
+                        stack[top] = value
+                        top += 1
+                    else:
+                        lev = a + 1
+                        stack[top] = display[lev] # save display temporarily
+                        stack[top+1] = pc # save pc temporarily
+                        display[lev] = top # save top temporarily
+                        pc = b
+                        c.misses += 1
+                        pending.append((c, key))''')
+              , (MRET, '''
+                    temp = stack[top-1] # return value of function
+                    top = display[a] # recover top
+                    display[a] = stack[top] # recover display
+                    pc = stack[top+1] # recover pc
+                    top -= b
+                    stack[top] = temp
+                    top += 1
+                    memo, key = pending.pop()
+                    cache = memo.cache
+                    cache[key] = temp
+                    if len(cache) > memo.size:
+                        cache.popitem(last=False)''')
+              ],
+        superinstructions=False,
+        names={'MEMO': MEMO, 'MRET': MRET})
@@ -0,0 +1,228 @@
+import sys
+from compiler.codegen import OpCode, Operator, Pl0CodeGenerator, func_index, falls_off
+from compiler.output import StreamSink
+
+# Hard limit of the depth of calls of functions.
+MAX_DEPTH = 100000
+
+# Python operators of binary `Operator`
+BINARY = {
+    Operator.add: '+',
+    Operator.sub: '-',
+    Operator.mul: '*',
+    Operator.eq: '==',
+    Operator.ls: '<',
+    Operator.gr: '>',
+    Operator.neq: '!=',
+    Operator.lseq: '<=',
+    Operator.greq: '>=',
+}
+
+INDENT = '    '
+
+def var_name(level, addr):
+    '''
+    Return the Python name of the variable or the parameter at (level, addr).
+    Names are unique among levels, so closures of nested functions find them.
+    '''
+    if addr < 0:
+        return 'a%d_%d' % (level, -addr)
+    return 'v%d_%d' % (level, addr)
+
+def func_name(f):
+    return 'f_%s_%d' % (f.name, f.entry)
+
+class Pl0Native:
+    '''
+    Backend which translates codes of `Pl0CodeGenerator` into Python source and executes it.
+    Each function (and the main block) becomes a Python function nested in the same way,
+    whose variables and parameters are Python locals, and variables of outer levels are accessed through closures.
+    `while` and `if` are recovered from the pattern of `jpc` and `jmp` generated by `Pl0Compiler`,
+    so codes rewritten by `Peephole` are not supported.
+    Variables are initialized to 0 when functions are called.
+    Functions which may end without `return` are rejected, since the value they return in other engines
+    is whatever is on the top of the stack, which depends on the caller.
+    `max_depth` limits the depth of calls.
+    Values are written to the sink `out` (`StreamSink` of `sys.stdout` by default).
+    '''
+    def __init__(self, gen, max_depth=MAX_DEPTH, out=None):
+        assert isinstance(gen, Pl0CodeGenerator)
+        if not gen.funcs:
+            raise RuntimeError("no information of functions (compiled program without the debug section?)")
+        self.codes = gen.disassemble()
+        self.funcs = gen.funcs
+        self.index = func_index(self.funcs)
+        self.max_depth = max_depth
+        self.out = out if out is not None else StreamSink()
+        for f in self.funcs:
+            if f.level > 0 and falls_off(gen.code, f, self.index):
+                raise RuntimeError("function %s may end without return, whose value is undefined" % f.name)
+        self.loops = self.find_loops()
+        self.tail_loops = set(f.entry for f in self.funcs if f.tails and not self.has_loops(f))
+        lines = []
+        self.function(self.funcs[-1], '', lines)
+        lines.append('%s()' % func_name(self.funcs[-1]))
+        self.source = '\n'.join(lines) + '\n'
+        self.program = compile(self.source, '<pl0>', 'exec')
+
+    def find_loops(self):
+        '''
+        Return the indices of backward `jmp` of `while` whose condition is always true, for each loop header.
+        Other backward `jmp` are the ends of `while` with `jpc` to the next code in the loop, or tail calls.
+        '''
+        tails = set(i for f in self.funcs for i in f.tails)
+        loops = {}
+        for k, code in enumerate(self.codes):
+            if code.op_code != OpCode.jmp or code.value >= k or k in tails:
+                continue
+            h = code.value
+            if not any(c.op_code == OpCode.jpc and c.value == k + 1 for c in self.codes[h:k]):
+                loops.setdefault(h, []).append(k)
+        return loops
+
+    def has_loops(self, f):
+        '''
+        Return True when the function `f` has backward `jmp` other than tail calls.
+        '''
+        return any(code.op_code == OpCode.jmp and code.value <= k and k not in f.tails
+                   for k, code in enumerate(self.codes[f.entry:f.end], f.entry))
+
+    def function(self, f, indent, lines):
+        '''
+        Translate the function `f` into lines of a Python function.
+        '''
+        params = [var_name(f.level, -i) for i in range(f.pars, 0, -1)]
+        lines.append('%sdef %s(%s):' % (indent, func_name(f), ', '.join(params)))
+        inner = indent + INDENT
+        entry = self.codes[f.entry]
+        if entry.op_code != OpCode.ict:
+            raise RuntimeError("unsupported code at %d: %s" % (f.entry, entry))
+        local = [var_name(f.level, addr) for addr in range(2, entry.value)]
+
+        body = []
+        if f.entry in self.tail_loops:
+            # tail calls assign the parameters and continue the loop
+            body.append(inner + 'while True:')
+            self.statements(f.entry + 1, f.end, f, inner + INDENT, body)
+        else:
+            self.statements(f.entry + 1, f.end, f, inner, body)
+        # variables of outer levels assigned in the function
+        outer = sorted(set(var_name(code.raddr.level, code.raddr.addr)
+                           for code in self.codes[f.entry+1:f.end]
+                           if code.op_code == OpCode.sto and code.raddr.level < f.level))
+        if outer:
+            lines.append('%snonlocal %s' % (inner, ', '.join(outer)))
+        if local:
+            lines.append('%s%s = 0' % (inner, ' = '.join(local)))
+        for g in self.funcs:
+            if g.level == f.level + 1 and f.start < g.start < f.entry:
+                self.function(g, inner, lines)
+        lines.extend(body)
+
+    def statements(self, i, j, f, indent, lines):
+        '''
+        Translate codes from `i` to `j` (exclusive) of the function `f` into lines of Python statements.
+        '''
+        codes = self.codes
+        size = len(lines)
+        stack = [] # Python expressions of values on the stack
+        start = i # the index where the current statement starts
+        while i < j:
+            t = i
+            while t < j and codes[t].op_code == OpCode.sto and codes[t].raddr.level == f.level and codes[t].raddr.addr < 0:
+                t += 1
+            if t in f.tails and len(stack) >= t - i:
+                # `sto` of arguments into parameters and `jmp` of a tail call
+                values = dict((code.raddr.addr, stack.pop()) for code in codes[i:t])
+                if f.entry in self.tail_loops:
+                    if values:
+                        lines.append('%s%s = %s' % (indent, ', '.join(var_name(f.level, addr) for addr in values),
+                                                    ', '.join(values.values())))
+                    lines.append(indent + 'continue')
+                else:
+                    # a loop of the function can not be continued from a nested loop
+                    args = [values.get(-k, var_name(f.level, -k)) for k in range(f.pars, 0, -1)]
+                    lines.append('%sreturn %s(%s)' % (indent, func_name(f), ', '.join(args)))
+                i = t + 1
+                continue
+            if not stack:
+                start = i
+                ends = [k for k in self.loops.get(i, []) if k < j]
+                if ends:
+                    lines.append(indent + 'while True:')
+                    self.statements(i, max(ends), f, indent + INDENT, lines)
+                    i = max(ends) + 1
+                    continue
+            code = codes[i]
+            op_code = code.op_code
+            if op_code == OpCode.lit:
+                stack.append(str(code.value))
+            elif op_code == OpCode.lod:
+                stack.append(var_name(code.raddr.level, code.raddr.addr))
+            elif op_code == OpCode.sto:
+                lines.append('%s%s = %s' % (indent, var_name(code.raddr.level, code.raddr.addr), stack.pop()))
+            elif op_code == OpCode.cal:
+                # a nested function calls its enclosing function at `start`
+                g = self.index[code.raddr.addr]
+                args = stack[len(stack)-g.pars:]
+                del stack[len(stack)-g.pars:]
+                stack.append('%s(%s)' % (func_name(g), ', '.join(args)))
+            elif op_code == OpCode.ret:
+                # the stack is empty only at the end of the main block, since no function falls off
+                lines.append(('%sreturn %s' % (indent, stack.pop() if stack else '')).rstrip())
+            elif op_code == OpCode.jpc:
+                cond = stack.pop()
+                target = code.value
+                if target <= i or target > j:
+                    raise RuntimeError("unsupported code at %d: %s" % (i, code))
+                back = codes[target-1]
+                if back.op_code == OpCode.jmp and back.value == start and target - 1 > i:
+                    lines.append('%swhile %s:' % (indent, cond))
+                    self.statements(i + 1, target - 1, f, indent + INDENT, lines)
+                else:
+                    lines.append('%sif %s:' % (indent, cond))
+                    self.statements(i + 1, target, f, indent + INDENT, lines)
+                i = target
+                continue
+            elif op_code == OpCode.opr:
+                op = code.op
+                if op in BINARY:
+                    right = stack.pop()
+                    stack.append('(%s %s %s)' % (stack.pop(), BINARY[op], right))
+                elif op == Operator.div:
+                    right = stack.pop()
+                    stack.append('int(%s / %s)' % (stack.pop(), right))
+                elif op == Operator.neg:
+                    stack.append('(-%s)' % stack.pop())
+                elif op == Operator.odd:
+                    stack.append('(%s %% 2)' % stack.pop())
+                elif op == Operator.wrt:
+                    lines.append('%swrite(str(%s))' % (indent, stack.pop()))
+                elif op == Operator.wrl:
+                    lines.append("%swrite('\\n')" % indent)
+                else:
+                    raise RuntimeError("unsupported code at %d: %s" % (i, code))
+            else:
+                # `jmp` and `ict` appear only in the patterns of blocks and loops
+                raise RuntimeError("unsupported code at %d: %s" % (i, code))
+            i += 1
+        if len(lines) == size:
+            lines.append(indent + 'pass')
+
+    def run(self):
+        '''
+        Execute the translated program.
+        '''
+        # the limit is process-wide, so it is left as it is when it is already high enough,
+        # e.g. raised once by `compiler.server` whose threads run programs concurrently
+        limit = sys.getrecursionlimit()
+        if limit < self.max_depth:
+            sys.setrecursionlimit(self.max_depth)
+        try:
+            exec(self.program, {'write': self.out.write})
+        except RecursionError:
+            raise RuntimeError("too deep calls of functions (max %d)" % self.max_depth)
+        finally:
+            if limit < self.max_depth:
+                sys.setrecursionlimit(limit)
+            self.out.flush()
@@ -0,0 +1,182 @@
+import json
+import os
+from collections import Counter
+from compiler.codegen import OpInst
+
+# Modes of `OpStats`
+STATIC = 'static'
+DYNAMIC = 'dynamic'
+
+# Default lengths of sequences counted by `OpStats`
+SIZES = (1, 2, 3)
+
+# Version of the JSON format
+FORMAT_VERSION = 1
+
+def op_name(code):
+    '''
+    Return the name of `Operator` of `opr`, or the name of `OpCode` of other codes.
+    The names of both enums are distinct.
+    '''
+    if isinstance(code, OpInst):
+        return code.op.name
+    return code.op_code.name
+
+class OpStats:
+    '''
+    Frequencies of codes and sequences of codes, which are mergeable among programs and runs.
+    In the static mode, sequences of adjacent codes of programs are counted by `add_codes`.
+    In the dynamic mode, sequences of codes executed by `Pl0CodeGenerator.execute` are counted
+    through the codes wrapped by `trace`.
+    grams: `Counter` of tuples of names of codes for each length in `sizes`
+    runs: the num of programs or runs counted
+    '''
+    def __init__(self, mode=STATIC, sizes=SIZES):
+        if mode not in (STATIC, DYNAMIC):
+            raise RuntimeError("unknown mode: " + str(mode))
+        self.mode = mode
+        self.sizes = tuple(sorted(sizes))
+        self.grams = dict((n, Counter()) for n in self.sizes)
+        self.runs = 0
+        self.window = [] # names of the last executed codes
+
+    def __str__(self):
+        return "OpStats {mode=%s, sizes=%s, runs=%d, codes=%d}" % (self.mode, self.sizes, self.runs, self.total())
+
+    def __repr__(self):
+        return "OpStats {mode=%s, sizes=%s, runs=%d, codes=%d}" % (self.mode, self.sizes, self.runs, self.total())
+
+    def __eq__(self, other):
+        if other is None or not isinstance(other, OpStats):
+            return False
+        return self.mode == other.mode and self.sizes == other.sizes and self.runs == other.runs \
+                and self.grams == other.grams
+
+    def total(self):
+        '''
+        Return the num of counted codes.
+        '''
+        return sum(self.grams[1].values()) if 1 in self.grams else 0
+
+    def add_codes(self, codes):
+        '''
+        Count sequences of adjacent codes in the list of `Inst` of a program.
+        '''
+        if self.mode != STATIC:
+            raise RuntimeError("codes are counted only in the static mode")
+        names = [op_name(code) for code in codes]
+        for n in self.sizes:
+            self.grams[n].update(tuple(names[i:i+n]) for i in range(len(names) - n + 1))
+        self.runs += 1
+
+    def trace(self, codes):
+        '''
+        Return the list of `Inst` which counts codes fetched by `Pl0CodeGenerator.run` for a new run.
+        '''
+        if self.mode != DYNAMIC:
+            raise RuntimeError("codes are traced only in the dynamic mode")
+        self.runs += 1
+        self.window = []
+        return TracedCodes(codes, self)
+
+    def record(self, name):
+        window = self.window
+        window.append(name)
+        if len(window) > self.sizes[-1]:
+            del window[0]
+        for n in self.sizes:
+            if n <= len(window):
+                self.grams[n][tuple(window[len(window)-n:])] += 1
+
+    def drop(self):
+        '''
+        Cancel the last recorded code, which is executed again after the stack is grown.
+        '''
+        window = self.window
+        for n in self.sizes:
+            if n <= len(window):
+                key = tuple(window[len(window)-n:])
+                self.grams[n][key] -= 1
+                if self.grams[n][key] == 0:
+                    del self.grams[n][key]
+        # the code fetched before the window is lost, so the next sequences start from the remaining codes
+        del window[-1:]
+
+    def merge(self, other):
+        '''
+        Add the counters of `other` of the same mode and sizes.
+        '''
+        assert isinstance(other, OpStats)
+        if other.mode != self.mode or other.sizes != self.sizes:
+            raise RuntimeError("can not merge %s stats of %s into %s stats of %s"
+                               % (other.mode, other.sizes, self.mode, self.sizes))
+        for n in self.sizes:
+            self.grams[n].update(other.grams[n])
+        self.runs += other.runs
+        return self
+
+    def most_common(self, n, k=None):
+        '''
+        Return the list of (names, count) of the `k` most common sequences of length `n`.
+        '''
+        return self.grams[n].most_common(k)
+
+    def to_dict(self):
+        return {
+            'version': FORMAT_VERSION,
+            'mode': self.mode,
+            'runs': self.runs,
+            'grams': dict((str(n), dict((' '.join(key), count) for key, count in self.grams[n].most_common()))
+                          for n in self.sizes),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get('version') != FORMAT_VERSION:
+            raise RuntimeError("unsupported version of stats: " + str(d.get('version')))
+        grams = d['grams']
+        stats = cls(d['mode'], [int(n) for n in grams])
+        for n in stats.sizes:
+            stats.grams[n].update(dict((tuple(key.split(' ')), count) for key, count in grams[str(n)].items()))
+        stats.runs = d['runs']
+        return stats
+
+    def dumps(self):
+        return json.dumps(self.to_dict(), indent=1)
+
+    @classmethod
+    def loads(cls, s):
+        return cls.from_dict(json.loads(s))
+
+class TracedCodes(list):
+    '''
+    List of `Inst` which records the name of each fetched code into `OpStats`.
+    '''
+    def __init__(self, codes, stats):
+        super().__init__(codes)
+        self.stats = stats
+        self.names = [op_name(code) for code in codes]
+
+    def __getitem__(self, i):
+        self.stats.record(self.names[i])
+        return super().__getitem__(i)
+
+def load(file_name):
+    with open(file_name) as f:
+        return OpStats.loads(f.read())
+
+def dump(stats, file_name):
+    # replace the file at once, so that a reader never sees a partial file
+    temp = file_name + '.tmp'
+    with open(temp, 'w') as f:
+        f.write(stats.dumps())
+    os.replace(temp, file_name)
+
+def accumulate(stats, file_name):
+    '''
+    Merge `stats` into the stats stored in `file_name` if it exists, and store the result.
+    '''
+    if os.path.exists(file_name):
+        stats = load(file_name).merge(stats)
+    dump(stats, file_name)
+    return stats
@@ -0,0 +1,243 @@
+from compiler.codegen import OpCode, Operator, ValInst, RefInst, OpInst,\
+                             Pl0CodeGenerator, assemble
+from compiler.table import FuncEntry
+
+# Comparison and the one with the opposite result
+INVERSE = {
+    Operator.eq: Operator.neq,
+    Operator.neq: Operator.eq,
+    Operator.ls: Operator.greq,
+    Operator.greq: Operator.ls,
+    Operator.gr: Operator.lseq,
+    Operator.lseq: Operator.gr,
+}
+
+def is_jump(code):
+    return code.op_code == OpCode.jmp or code.op_code == OpCode.jpc
+
+def is_val(code, op_code, value):
+    return code.op_code == op_code and isinstance(code, ValInst) and code.value == value
+
+def is_op(code, op):
+    return isinstance(code, OpInst) and code.op == op
+
+def targets(codes):
+    '''
+    Return the set of indices where control is transferred by jumps and calls.
+    '''
+    result = set([0])
+    for code in codes:
+        if code is None:
+            continue
+        if is_jump(code):
+            result.add(code.value)
+        elif code.op_code == OpCode.cal:
+            result.add(code.raddr.addr)
+    return result
+
+def thread_jumps(codes):
+    '''
+    Redirect jumps and calls whose target is `jmp` to the final target,
+    and remove or simplify jumps to the next code.
+    '''
+    def final(i):
+        seen = set()
+        while codes[i].op_code == OpCode.jmp and i not in seen:
+            seen.add(i)
+            i = codes[i].value
+        return i
+
+    changes = 0
+    for i, code in enumerate(codes):
+        if code is None:
+            continue
+        if is_jump(code):
+            target = final(code.value)
+            if target != code.value:
+                code.value = target
+                changes += 1
+        elif code.op_code == OpCode.cal:
+            target = final(code.raddr.addr)
+            if target != code.raddr.addr:
+                code.raddr.addr = target
+                changes += 1
+
+    for i, code in enumerate(codes):
+        if code is None or not is_jump(code) or next_index(codes, i) != code.value:
+            continue
+        if code.op_code == OpCode.jmp:
+            codes[i] = None
+        else:
+            # `jpc` to the next code just pops the condition
+            codes[i] = ValInst(OpCode.ict, -1)
+        changes += 1
+    return changes
+
+def invert_branches(codes):
+    '''
+    Replace `<cmp>; jpc L1; jmp L2; L1:` by `<inverse cmp>; jpc L2; L1:`.
+    '''
+    changes = 0
+    tgts = targets(codes)
+    live = [i for i, code in enumerate(codes) if code is not None]
+    for k in range(1, len(live) - 2):
+        c, j, m = live[k-1], live[k], live[k+1]
+        cmp, jpc, jmp = codes[c], codes[j], codes[m]
+        if cmp is None or jpc is None or jmp is None:
+            continue
+        if isinstance(cmp, OpInst) and cmp.op in INVERSE \
+                and jpc.op_code == OpCode.jpc and jmp.op_code == OpCode.jmp \
+                and jpc.value == live[k+2] and j not in tgts and m not in tgts:
+            codes[c] = OpInst(INVERSE[cmp.op])
+            codes[j] = ValInst(OpCode.jpc, jmp.value)
+            codes[m] = None
+            changes += 1
+    return changes
+
+def remove_dead_codes(codes):
+    '''
+    Remove codes which are never reached from the beginning of the program.
+    Functions which are never called are removed as well.
+    '''
+    reached = [False] * len(codes)
+    work = [0]
+    while work:
+        i = work.pop()
+        while i < len(codes) and not reached[i]:
+            reached[i] = True
+            code = codes[i]
+            if code is None:
+                i += 1
+                continue
+            if code.op_code == OpCode.jmp:
+                work.append(code.value)
+                break
+            elif code.op_code == OpCode.jpc:
+                work.append(code.value)
+            elif code.op_code == OpCode.cal:
+                work.append(code.raddr.addr)
+            elif code.op_code == OpCode.ret:
+                break
+            i += 1
+
+    changes = 0
+    for i, code in enumerate(codes):
+        if code is not None and not reached[i]:
+            codes[i] = None
+            changes += 1
+    return changes
+
+def fold_pairs(codes):
+    '''
+    Remove redundant pairs of codes whose second code is not a target:
+    `lod x; sto x`, `lit 0; opr add`, `lit 0; opr sub`, `lit 1; opr mul`, `opr neg; opr neg` and `ict 0`,
+    and replace `lit k; opr neg` by `lit -k`.
+    '''
+    changes = 0
+    tgts = targets(codes)
+    live = [i for i, code in enumerate(codes) if code is not None]
+    for i in live:
+        if is_val(codes[i], OpCode.ict, 0):
+            codes[i] = None
+            changes += 1
+    live = [i for i in live if codes[i] is not None]
+    k = 0
+    while k < len(live) - 1:
+        i, j = live[k], live[k+1]
+        first, second = codes[i], codes[j]
+        if j in tgts:
+            k += 1
+            continue
+        if isinstance(first, RefInst) and first.op_code == OpCode.lod \
+                and isinstance(second, RefInst) and second.op_code == OpCode.sto \
+                and first.raddr == second.raddr:
+            remove = [i, j]
+        elif is_val(first, OpCode.lit, 0) and (is_op(second, Operator.add) or is_op(second, Operator.sub)):
+            remove = [i, j]
+        elif is_val(first, OpCode.lit, 1) and is_op(second, Operator.mul):
+            remove = [i, j]
+        elif is_op(first, Operator.neg) and is_op(second, Operator.neg):
+            remove = [i, j]
+        elif isinstance(first, ValInst) and first.op_code == OpCode.lit and is_op(second, Operator.neg):
+            codes[i] = ValInst(OpCode.lit, -first.value)
+            remove = [j]
+        else:
+            k += 1
+            continue
+        # a pair removed as a whole does nothing, so it may be a target
+        for r in remove:
+            codes[r] = None
+        changes += 1
+        k += 2
+    return changes
+
+def next_index(codes, i):
+    '''
+    Return the index of the code executed after `codes[i]` unless it jumps.
+    '''
+    i += 1
+    while i < len(codes) and codes[i] is None:
+        i += 1
+    return i
+
+# Passes run by `Peephole` by default
+PASSES = [thread_jumps, invert_branches, fold_pairs, remove_dead_codes]
+
+def compact(codes, table, funcs=()):
+    '''
+    Drop removed codes and relocate jump and call targets, `FuncEntry.raddr.addr` in the table
+    and indices of `FuncInfo` in `funcs`.
+    A target of a removed code is relocated to the next code kept.
+    '''
+    kept = [code for code in codes if code is not None]
+    reloc = [0] * (len(codes) + 1)
+    n = len(kept)
+    reloc[len(codes)] = n
+    for i in range(len(codes) - 1, -1, -1):
+        if codes[i] is not None:
+            n -= 1
+        reloc[i] = n
+
+    for code in kept:
+        if is_jump(code):
+            code.value = reloc[code.value]
+        elif code.op_code == OpCode.cal:
+            code.raddr.addr = reloc[code.raddr.addr]
+    for entry in table.table:
+        if isinstance(entry, FuncEntry):
+            entry.raddr.addr = reloc[entry.raddr.addr]
+    for f in funcs:
+        f.start, f.entry, f.end = reloc[f.start], reloc[f.entry], reloc[f.end]
+        f.tails = [reloc[i] for i in f.tails]
+    return kept
+
+class Peephole:
+    '''
+    Peephole optimizer over the codes of `Pl0CodeGenerator` after compilation.
+    Each pass takes the list of `Inst`, rewrites it in place, replaces removed codes by `None`,
+    and returns the number of changes.
+    Removed codes are dropped and targets are relocated after each pass,
+    and passes are repeated until nothing changes.
+    '''
+    def __init__(self, passes=PASSES):
+        self.passes = list(passes)
+        self.removed = 0
+
+    def run(self, gen):
+        '''
+        Optimize the codes of `gen` and return the number of removed codes.
+        '''
+        assert isinstance(gen, Pl0CodeGenerator)
+        codes = gen.disassemble()
+        size = len(codes)
+        changed = True
+        while changed:
+            changed = False
+            for p in self.passes:
+                if p(codes) > 0:
+                    codes = compact(codes, gen.table, gen.funcs)
+                    changed = True
+        gen.code = assemble(codes)
+        gen.c_index = len(codes) - 1
+        self.removed = size - len(codes)
+        return self.removed
@@ -0,0 +1,92 @@
+import atexit
+import os
+import sys
+
+# Default size of chunks written by `BufferedSink`
+CHUNK = 64 * 1024
+
+class StreamSink:
+    '''
+    Sink which writes each value to a text stream and flushes it at once, as `sys.stdout` was used before.
+    The stream is looked up when the sink is created.
+    '''
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def write(self, s):
+        self.stream.write(s)
+        self.stream.flush()
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+class LineSink(StreamSink):
+    '''
+    Sink which flushes a text stream at the end of each line, for interactive use.
+    '''
+    def write(self, s):
+        self.stream.write(s)
+        if s == '\n':
+            self.stream.flush()
+
+class BufferedSink:
+    '''
+    Sink which writes bytes to a file descriptor in chunks of `size` bytes.
+    The rest is written by `flush`, which is called by the engines at the end of execution and at exit.
+    '''
+    def __init__(self, fd=1, size=CHUNK):
+        self.fd = fd
+        self.size = size
+        self.parts = []
+        self.length = 0
+        atexit.register(self.flush)
+
+    def write(self, s):
+        self.parts.append(s)
+        self.length += len(s)
+        if self.length >= self.size:
+            self.flush()
+
+    def flush(self):
+        if not self.parts:
+            return
+        data = ''.join(self.parts).encode('ascii')
+        self.parts = []
+        self.length = 0
+        view = memoryview(data)
+        while view:
+            n = os.write(self.fd, view)
+            view = view[n:]
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+class MemorySink:
+    '''
+    Sink which keeps the output in memory, for tests and embedding.
+    '''
+    def __init__(self):
+        self.parts = []
+
+    def write(self, s):
+        self.parts.append(s)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+# Sinks selected by name in `main.py`
+SINKS = {
+    'flush': StreamSink,
+    'line': LineSink,
+    'buffered': BufferedSink,
+}
@@ -0,0 +1,67 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class Phases:
+    '''
+    Report of wall time and peak memory of phases (reading, compiling and executing) and counters of a run.
+    Seconds are measured when `timings` is True, and peak bytes of memory traced by `tracemalloc`
+    and counters are recorded when `stats` is True.
+    Nothing is measured when both are False, so callers can use `phase` unconditionally.
+    They can not be both True, since tracing memory slows down the phases whose time is measured
+    (and the `vm` engine counts codes without superinstructions), so they are measured in separate runs.
+    '''
+    def __init__(self, timings=False, stats=False):
+        if timings and stats:
+            raise RuntimeError("timings and stats should be measured in separate runs")
+        self.timings = timings
+        self.stats = stats
+        self.phases = {}
+        self.counts = {}
+
+    @property
+    def enabled(self):
+        return self.timings or self.stats
+
+    @contextmanager
+    def phase(self, name):
+        '''
+        Measure the block of `with` as the phase `name`.
+        '''
+        if not self.enabled:
+            yield
+            return
+        result = self.phases.setdefault(name, {})
+        if self.timings:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                result['seconds'] = result.get('seconds', 0.0) + time.perf_counter() - start
+            return
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            result['peak_bytes'] = max(result.get('peak_bytes', 0), peak)
+
+    def count(self, name, value):
+        if self.stats:
+            self.counts[name] = value
+
+    def to_dict(self):
+        d = {'phases': self.phases}
+        if self.stats:
+            d['counts'] = self.counts
+        return d
+
+    def dumps(self, **info):
+        '''
+        Return the report as a line of JSON with `info` added.
+        '''
+        d = dict(info)
+        d.update(self.to_dict())
+        return json.dumps(d, sort_keys=True)
@@ -0,0 +1,157 @@
+import time
+from compiler.codegen import func_index, disassemble
+from compiler.vm import Pl0VM, make_loop, MAX_STACK, MAX_LEVEL, CAL, RET
+
+# Name of the main block in reports
+MAIN = 'main'
+
+# Default num of the most executed codes in the text report
+TOP_CODES = 20
+
+class FuncProfile:
+    '''
+    Counters of a function.
+    calls: the num of calls
+    codes: the num of codes executed in the function itself
+    inclusive: seconds spent in the function and functions called from it (recursive calls are counted once)
+    exclusive: seconds spent in the function itself
+    '''
+    def __init__(self, name, entry):
+        self.name = name
+        self.entry = entry
+        self.calls = 0
+        self.codes = 0
+        self.inclusive = 0.0
+        self.exclusive = 0.0
+        self.active = 0 # the num of frames of the function on the call stack
+
+    def __str__(self):
+        return "FuncProfile {name=%s, entry=%d, calls=%d, codes=%d, inclusive=%f, exclusive=%f}" \
+                % (self.name, self.entry, self.calls, self.codes, self.inclusive, self.exclusive)
+
+    def __repr__(self):
+        return "FuncProfile {name=%s, entry=%d, calls=%d, codes=%d, inclusive=%f, exclusive=%f}" \
+                % (self.name, self.entry, self.calls, self.codes, self.inclusive, self.exclusive)
+
+class Pl0ProfileVM(Pl0VM):
+    '''
+    `Pl0VM` which counts executions of each code and calls of each function,
+    and measures inclusive and exclusive time of functions.
+    `funcs` is the list of `FuncInfo` of the program, which names functions by the index of `cal` targets.
+    Functions of a program without it are named by their entries.
+    The main loop is generated by `make_loop` with hooks of profiling, so `Pl0VM` runs no check of profiling.
+    Superinstructions are not used, so that every code is counted.
+    '''
+    def __init__(self, code, funcs=(), max_stack=MAX_STACK, max_level=MAX_LEVEL, out=None, clock=time.perf_counter):
+        super().__init__(code, max_stack, max_level, superinstructions=False, out=out)
+        self.code = code
+        self.clock = clock
+        self.counts = [0] * len(self.prog)
+        main = funcs[-1] if funcs else None
+        self.funcs = {}
+        index = func_index(funcs)
+        for i, (op, a, b, _) in enumerate(self.prog):
+            if op == CAL:
+                # `c` of `cal` is the profile of the called function
+                self.prog[i] = (CAL, a, b, self.profile_of(index, b))
+        self.main = FuncProfile(MAIN, main.entry if main is not None else 0)
+        self.funcs[self.main.entry] = self.main
+        # [profile, start time, time of callees, executed codes at the start, codes of callees] of each frame
+        self.frames = []
+        self.executed = 0
+        self.stacks = {} # the num of codes executed in each call stack, keyed by the tuple of names
+
+    def profile_of(self, index, addr):
+        f = index.get(addr)
+        name, entry = (f.name, f.entry) if f is not None else ('f', addr)
+        if entry not in self.funcs:
+            self.funcs[entry] = FuncProfile(name, entry)
+        return self.funcs[entry]
+
+    def run(self):
+        '''
+        Execute the program until the main block returns, profiling the main block as a function.
+        '''
+        self.enter(self.main)
+        super().run()
+
+    def enter(self, profile):
+        profile.calls += 1
+        profile.active += 1
+        self.frames.append([profile, self.clock(), 0.0, self.executed, 0])
+
+    def leave(self, executed):
+        '''
+        Close the frame on the top of the call stack when `executed` codes have been executed in total.
+        '''
+        profile, start, callees, count, callee_count = self.frames.pop()
+        elapsed = self.clock() - start
+        codes = executed - count - callee_count
+        profile.active -= 1
+        if profile.active == 0:
+            profile.inclusive += elapsed
+        profile.exclusive += elapsed - callees
+        profile.codes += codes
+        key = tuple(frame[0].name for frame in self.frames) + (profile.name,)
+        self.stacks[key] = self.stacks.get(key, 0) + codes
+        if self.frames:
+            caller = self.frames[-1]
+            caller[2] += elapsed
+            caller[4] += executed - count
+
+    loop = make_loop('''
+        Execute codes from `pc` in the same way as `Pl0VM.loop`, counting codes and calls.
+        ''',
+        setup='''
+            counts = self.counts
+            executed = self.executed''',
+        fetch='''
+            op, a, b, c = prog[pc]
+            counts[pc] += 1
+            executed += 1
+            pc += 1''',
+        save='''
+            self.executed = executed''',
+        retry='''
+            # the failed code is counted again when it is executed after `grow`
+            counts[pc-1] -= 1
+            executed -= 1''',
+        after={ CAL: '''
+                    self.executed = executed
+                    self.enter(c)'''
+              , RET: '''
+                    self.leave(executed)'''
+              },
+        superinstructions=False)
+
+    def functions(self):
+        '''
+        Return `FuncProfile` of called functions in the descending order of exclusive time.
+        '''
+        return sorted((p for p in self.funcs.values() if p.calls > 0), key=lambda p: -p.exclusive)
+
+    def report(self, top_codes=TOP_CODES):
+        '''
+        Return the profile as text: counters of functions, and the `top_codes` most executed codes.
+        '''
+        total = sum(p.exclusive for p in self.funcs.values())
+        lines = ["%d codes executed in %.6f sec" % (self.executed, total),
+                 "",
+                 "%-20s %10s %12s %12s %12s %7s" % ('function', 'calls', 'codes', 'inclusive', 'exclusive', '%')]
+        for p in self.functions():
+            lines.append("%-20s %10d %12d %12.6f %12.6f %6.1f%%"
+                         % ('%s@%d' % (p.name, p.entry), p.calls, p.codes, p.inclusive, p.exclusive,
+                            100.0 * p.exclusive / total if total > 0 else 0.0))
+        lines.extend(["", "%-8s %12s  %s" % ('pc', 'count', 'code')])
+        codes = disassemble(self.code)
+        hot = sorted((pc for pc, n in enumerate(self.counts) if n > 0), key=lambda pc: -self.counts[pc])
+        for pc in hot[:top_codes]:
+            lines.append("%-8d %12d  %s" % (pc, self.counts[pc], codes[pc]))
+        return '\n'.join(lines) + '\n'
+
+    def collapsed(self):
+        '''
+        Return the num of codes executed in each call stack in the collapsed format of flame graph tools,
+        a line of names of functions joined by `;` and the count for each stack.
+        '''
+        return ''.join('%s %d\n' % (';'.join(key), n) for key, n in sorted(self.stacks.items()) if n > 0)
@@ -0,0 +1,54 @@
+import json
+import os
+import struct
+import tempfile
+
+# Header of a message: the length of the JSON body which follows
+HEADER = struct.Struct('>I')
+# Max length of a message in bytes
+MAX_MESSAGE = 256 * 1024 * 1024
+# Environment variable which gives the path of the socket of the daemon
+SOCKET_ENV = 'PL0_SOCKET'
+
+def default_socket():
+    '''
+    Return the path of the socket: `$PL0_SOCKET`, or a file in the temporary directory for each user.
+    '''
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    return os.path.join(tempfile.gettempdir(), 'pl0d-%d.sock' % os.getuid())
+
+def send(sock, message):
+    '''
+    Send a dict as a message of a length and JSON.
+    '''
+    body = json.dumps(message).encode('utf-8')
+    if len(body) > MAX_MESSAGE:
+        raise RuntimeError("too long message (max %d bytes)" % MAX_MESSAGE)
+    sock.sendall(HEADER.pack(len(body)) + body)
+
+def recv_exact(sock, n):
+    parts = []
+    while n > 0:
+        part = sock.recv(min(n, 1024 * 1024))
+        if not part:
+            return None
+        parts.append(part)
+        n -= len(part)
+    return b''.join(parts)
+
+def recv(sock):
+    '''
+    Receive a message as a dict. Return None when the peer closed the connection.
+    '''
+    header = recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    n, = HEADER.unpack(header)
+    if n > MAX_MESSAGE:
+        raise RuntimeError("too long message (max %d bytes)" % MAX_MESSAGE)
+    body = recv_exact(sock, n)
+    if body is None:
+        raise RuntimeError("connection closed in a message")
+    return json.loads(body.decode('utf-8'))
@@ -0,0 +1,145 @@
+import asyncio
+import sys
+from compiler.codegen import BudgetExceeded
+from compiler.vm import Pl0VM, make_loop, MAX_STACK, MAX_LEVEL
+
+# Default num of codes executed by a program before `Pl0Scheduler` switches to another one
+QUANTUM = 1000
+
+class VMState:
+    '''
+    State of a program executed by `Pl0ResumableVM`.
+    pc, top, stack, display: registers and memory as in `Pl0VM`
+    executed: the num of codes executed so far
+    finished: True after the main block returned
+    '''
+    def __init__(self):
+        self.pc = 0
+        self.top = 0
+        self.stack = None
+        self.display = None
+        self.executed = 0
+        self.finished = False
+
+    def __str__(self):
+        return "VMState {pc=%d, top=%d, executed=%d, finished=%s}" % (self.pc, self.top, self.executed, self.finished)
+
+    def __repr__(self):
+        return "VMState {pc=%d, top=%d, executed=%d, finished=%s}" % (self.pc, self.top, self.executed, self.finished)
+
+def state_property(name):
+    return property(lambda self: getattr(self.state, name), lambda self, value: setattr(self.state, name, value))
+
+class Pl0ResumableVM(Pl0VM):
+    '''
+    `Pl0VM` which keeps its state in `VMState` and executes a bounded num of codes at a time,
+    so that it can be suspended between runs and resumed later.
+    A superinstruction is counted as one code.
+    When `budget` is given, `run` raises `BudgetExceeded` once the program executed `budget` codes.
+    The main loop is generated by `make_loop` with the check of the num of codes, so `Pl0VM` runs no check of it.
+    '''
+    pc = state_property('pc')
+    top = state_property('top')
+    stack = state_property('stack')
+    display = state_property('display')
+
+    def __init__(self, code, max_stack=MAX_STACK, max_level=MAX_LEVEL, superinstructions=True, out=None,
+                 budget=None):
+        self.state = VMState()
+        super().__init__(code, max_stack, max_level, superinstructions, out)
+        self.budget = budget
+
+    @property
+    def finished(self):
+        return self.state.finished
+
+    def run(self, max_steps=None):
+        '''
+        Execute at most `max_steps` codes, or codes until the main block returns when it is None.
+        Return True when the main block has returned, and False when the program can be resumed by `run`.
+        '''
+        state = self.state
+        if state.finished:
+            return True
+        if max_steps is not None and max_steps < 0:
+            raise RuntimeError("max_steps should not be negative: " + str(max_steps))
+        limit = sys.maxsize if max_steps is None else state.executed + max_steps
+        if self.budget is not None:
+            if state.executed >= self.budget:
+                raise BudgetExceeded(self.budget)
+            limit = min(limit, self.budget)
+        try:
+            while True:
+                done = self.loop(limit)
+                if done is None:
+                    break
+                if done:
+                    state.finished = True
+                    return True
+                self.grow()
+        finally:
+            self.out.flush()
+        if self.budget is not None and state.executed >= self.budget:
+            raise BudgetExceeded(self.budget)
+        return False
+
+    loop = make_loop('''
+        Execute codes from `pc` in the same way as `Pl0VM.loop` until `executed` reaches `limit`.
+        Return None with `pc` of the code to resume from when it reaches `limit`.
+        ''',
+        params=', limit=sys.maxsize',
+        setup='''
+            state = self.state
+            executed = state.executed''',
+        # `executed` never passes `limit`. This form runs faster than `while executed < limit`
+        fetch='''
+            if executed == limit:
+                self.pc = pc
+                self.top = top
+                state.executed = executed
+                return None
+            op, a, b, c = prog[pc]
+            pc += 1
+            executed += 1''',
+        save='''
+            state.executed = executed''',
+        retry='''
+            # the failed code is counted again when it is executed after `grow`
+            executed -= 1''')
+
+class Pl0Scheduler:
+    '''
+    Scheduler which interleaves programs in an asyncio event loop.
+    Each program runs `quantum` codes and yields to the event loop, whose queue of ready tasks is FIFO,
+    so programs (and other tasks of the loop) take turns in round robin.
+    switches: the num of times programs yielded
+    '''
+    def __init__(self, quantum=QUANTUM):
+        if quantum < 1:
+            raise RuntimeError("quantum should be positive: " + str(quantum))
+        self.quantum = quantum
+        self.switches = 0
+
+    async def execute(self, vm):
+        '''
+        Execute `Pl0ResumableVM` until its main block returns, and return its `VMState`.
+        `BudgetExceeded` and errors of the program are raised from here.
+        '''
+        assert isinstance(vm, Pl0ResumableVM)
+        while not vm.run(self.quantum):
+            self.switches += 1
+            await asyncio.sleep(0)
+        return vm.state
+
+    async def gather(self, vms):
+        '''
+        Execute programs concurrently, and return the list of `VMState` of each program,
+        or the exception which stopped it.
+        '''
+        return await asyncio.gather(*(self.execute(vm) for vm in vms), return_exceptions=True)
+
+    def run(self, vms):
+        '''
+        Execute programs in a new event loop, and return the results of `gather`.
+        '''
+        return asyncio.run(self.gather(vms))
@@ -0,0 +1,287 @@
+'''
+Daemon which compiles and executes PL/0 programs sent over a Unix domain socket.
+
+Execute by:
+
+    python -m compiler.server [--socket PATH] [--workers N] [--cache-size N] [--budget N]
+
+and send programs by `client.py`.
+'''
+import argparse
+import base64
+import os
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from compiler.getsource import SourceReader
+from compiler.table import Pl0Table
+from compiler.codegen import Pl0CodeGenerator
+from compiler.compile import Pl0Compiler
+from compiler.vm import Pl0VM
+from compiler.native import Pl0Native, MAX_DEPTH
+from compiler.jit import Pl0TieredVM
+from compiler.resumable import Pl0ResumableVM
+from compiler.optimize import Peephole
+from compiler.output import MemorySink
+from compiler.cache import source_key
+from compiler import bytecode, protocol
+
+# Default num of threads which handle connections
+WORKERS = 4
+# Default max num of compiled programs kept in memory
+CACHE_ENTRIES = 256
+# Default max num of codes executed by a request
+BUDGET = 100 * 1000 * 1000
+
+def run_vm(gen, out, budget):
+    if budget is None:
+        Pl0VM(gen.code, out=out).run()
+    else:
+        Pl0ResumableVM(gen.code, out=out, budget=budget).run()
+
+# Engines selected by name in requests, which take the budget of codes or None
+ENGINES = {
+    'vm': run_vm,
+    'execute': lambda gen, out, budget: gen.execute(out, budget=budget),
+    'python': lambda gen, out, budget: Pl0Native(gen, out=out).run(),
+    'tiered': lambda gen, out, budget: Pl0TieredVM(gen.code, out=out).run(),
+}
+# Engines which stop programs at the budget. Others run only on a server without the budget
+BUDGETED = ('vm', 'execute')
+
+class MemoryCache:
+    '''
+    LRU cache of compiled programs in the .pl0c format keyed by the SHA-256 of the source and the options.
+    Programs are kept as bytes and loaded for each request, since optimizers rewrite `Pl0CodeGenerator`.
+    It is shared by threads of `Pl0Server`.
+    '''
+    def __init__(self, size=CACHE_ENTRIES):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self.lock:
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+def compile_bytes(source, fold=True, tail_calls=True):
+    '''
+    Compile a source program given as `bytes` into the .pl0c format.
+    '''
+    reader = SourceReader(source=source)
+    table = Pl0Table()
+    gen = Pl0CodeGenerator(table)
+    try:
+        Pl0Compiler(reader, table, gen, fold, tail_calls).compile()
+    finally:
+        reader.close()
+    return bytecode.dumps(gen.code, gen.funcs)
+
+class Pl0Server:
+    '''
+    Server of a Unix domain socket at `path`.
+    Each request is a message of `protocol` with either `source` (the text of a source program)
+    or `code` (a compiled program in the .pl0c format encoded by base64), and optional
+    `engine`, `optimize`, `fold` and `tail_calls` as the options of `main.py`.
+    The response has `ok`, `output` written by the program, `error` when it failed,
+    `cached` when the compiled program was found in `cache`, and `timings` in seconds.
+    Connections are handled by a pool of `workers` threads, and a connection can send many requests.
+    A request fails with `BudgetExceeded` after `budget` codes (a request can give a smaller `budget`),
+    so that no program holds a thread forever. The budget is disabled by None,
+    which is required by the `python` and `tiered` engines.
+    The recursion limit of the process is raised once for the `python` engine while the server is running,
+    since it is shared by threads.
+    '''
+    def __init__(self, path, workers=WORKERS, cache_size=CACHE_ENTRIES, budget=BUDGET):
+        self.path = path
+        self.workers = workers
+        self.budget = budget
+        self.cache = MemoryCache(cache_size)
+        self.sock = None
+        self.pool = None
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def bind(self):
+        if os.path.exists(self.path):
+            # remove the socket left by a daemon which did not stop normally
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.path)
+            else:
+                raise RuntimeError("another server is running at " + self.path)
+            finally:
+                probe.close()
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(self.path)
+        self.sock.listen(128)
+
+    def serve_forever(self):
+        '''
+        Accept connections until `shutdown` is called.
+        '''
+        if self.sock is None:
+            self.bind()
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, MAX_DEPTH))
+        self.pool = ThreadPoolExecutor(self.workers)
+        try:
+            while not self.stopped.is_set():
+                try:
+                    conn, _ = self.sock.accept()
+                except OSError:
+                    # the socket is closed by `shutdown`
+                    break
+                self.pool.submit(self.handle_connection, conn)
+        finally:
+            self.pool.shutdown(wait=True)
+            self.close()
+            sys.setrecursionlimit(limit)
+
+    def shutdown(self):
+        '''
+        Stop `serve_forever`, which closes the socket after requests in progress are handled.
+        '''
+        self.stopped.set()
+        sock = self.sock
+        if sock is not None:
+            try:
+                # wake up `accept`
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def handle_connection(self, conn):
+        try:
+            with conn:
+                while True:
+                    request = protocol.recv(conn)
+                    if request is None:
+                        return
+                    protocol.send(conn, self.handle(request))
+        except (OSError, RuntimeError, ValueError) as e:
+            # the connection is broken or the message is malformed
+            sys.stderr.write("pl0d: %s\n" % e)
+
+    def handle(self, request):
+        '''
+        Compile and execute the program of `request` and return the response.
+        '''
+        start = time.perf_counter()
+        with self.lock:
+            self.requests += 1
+        out = MemorySink()
+        response = {'ok': False, 'output': '', 'cached': False, 'timings': {}}
+        try:
+            if request.get('command') == 'stats':
+                response['ok'] = True
+                response['stats'] = {'requests': self.requests, 'cache': self.cache.stats()}
+                return response
+            engine = request.get('engine', 'vm')
+            if engine not in ENGINES:
+                raise RuntimeError("unknown engine: " + str(engine))
+            optimize = bool(request.get('optimize', False))
+            if optimize and engine == 'python':
+                raise RuntimeError("python engine does not support optimized codes")
+            budget = self.budget
+            if 'budget' in request:
+                budget = int(request['budget']) if budget is None else min(int(request['budget']), budget)
+            if budget is not None and budget < 1:
+                raise RuntimeError("budget should be positive: " + str(budget))
+            if budget is not None and engine not in BUDGETED:
+                raise RuntimeError("%s engine can not stop programs at the budget of codes" % engine)
+            gen = self.load(request, response)
+            if optimize:
+                Peephole().run(gen)
+            executed = time.perf_counter()
+            ENGINES[engine](gen, out, budget)
+            response['timings']['execute'] = time.perf_counter() - executed
+            response['ok'] = True
+        except Exception as e:
+            response['error'] = '%s: %s' % (type(e).__name__, e)
+        finally:
+            response['output'] = out.getvalue()
+            response['timings']['total'] = time.perf_counter() - start
+        return response
+
+    def load(self, request, response):
+        '''
+        Return `Pl0CodeGenerator` of the program of `request`, compiling the source only when it is not cached.
+        '''
+        if 'code' in request:
+            return bytecode.loads(base64.b64decode(request['code']))
+        if 'source' not in request:
+            raise RuntimeError("no program in the request")
+        source = request['source'].encode('utf-8')
+        fold = bool(request.get('fold', True))
+        tail_calls = bool(request.get('tail_calls', True))
+        key = source_key(source, fold, tail_calls)
+        data = self.cache.get(key)
+        if data is None:
+            start = time.perf_counter()
+            data = compile_bytes(source, fold, tail_calls)
+            response['timings']['compile'] = time.perf_counter() - start
+            self.cache.put(key, data)
+        else:
+            response['cached'] = True
+        return bytecode.loads(data)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve compiling and executing PL/0 programs over a Unix socket.')
+    parser.add_argument('--socket', default=protocol.default_socket(),
+                        help='path of the socket (default: $%s or %s)'
+                             % (protocol.SOCKET_ENV, protocol.default_socket()))
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='threads which handle connections (default: %d)' % WORKERS)
+    parser.add_argument('--cache-size', type=int, default=CACHE_ENTRIES,
+                        help='max num of compiled programs kept in memory (default: %d)' % CACHE_ENTRIES)
+    parser.add_argument('--budget', type=int, default=BUDGET,
+                        help='max num of codes executed by a request, or 0 for no limit, '
+                             'which is required by the python and tiered engines (default: %d)' % BUDGET)
+    args = parser.parse_args(argv)
+    server = Pl0Server(args.socket, args.workers, args.cache_size, args.budget or None)
+    server.bind()
+    sys.stderr.write("pl0d: listening at %s\n" % args.socket)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+
+if __name__ == '__main__':
+    main()
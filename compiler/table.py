@@ -1,8 +1,11 @@
-import itertools
+from array import array
 from enum import Enum, unique
 
-MAX_TABLE = 100
-MAX_LEVEL = 5
+# Initial capacity for the levels of blocks. Grown on demand.
+INIT_LEVEL = 5
+# Hard limits of the number of entries and the levels of blocks.
+MAX_TABLE = 1000000
+MAX_LEVEL = 256
 
 @unique
 class IdKind(Enum):
@@ -126,16 +129,24 @@ class ConstEntry(Entry):
 class Pl0Table:
     '''
     Symbol table for Pl0 compiler.
+    Entries are kept in `table` in the order of declarations.
+    `names` maps each name to the stack of indices of visible entries with the name,
+    so that the innermost declaration is on the top of the stack.
+    `names` reflects the entries up to `names_index`, which follows `t_index`.
+    `max_table` and `max_level` limit the number of entries and the levels of blocks.
     '''
-    def __init__(self):
-        self.table = [x for x in itertools.repeat(None, MAX_TABLE)]
-        self.table[0] = FuncEntry('dummy', RelAddr(0, 0))
+    def __init__(self, max_table=MAX_TABLE, max_level=MAX_LEVEL):
+        self.max_table = max_table
+        self.max_level = max_level
+        self.table = [FuncEntry('dummy', RelAddr(0, 0))]
+        self.names = {'dummy': [0]}
+        self.names_index = 0
         self.t_index = None
         self.level = None # Level of blocks. Incremented when enter new blocks.
         self.local_addr = None # Set at the beginning and end of the block. 2 + the num of local variables of the block
         self.tf_index = None # Index of the function of the table. Set when enter the declaration of functions.
-        self.index = [x for x in itertools.repeat(0, MAX_LEVEL)]
-        self.addr = [x for x in itertools.repeat(0, MAX_LEVEL)]
+        self.index = array('q', bytes(8 * INIT_LEVEL))
+        self.addr = array('q', bytes(8 * INIT_LEVEL))
 
     def enter(self, entry):
         '''
@@ -143,11 +154,19 @@ class Pl0Table:
         '''
         self.t_index += 1
         if len(self.table) == self.t_index:
+            if self.t_index >= self.max_table:
+                raise RuntimeError("too many entries in symtable (max %d)" % self.max_table)
             self.table.append(entry)
         elif len(self.table) > self.t_index:
             self.table[self.t_index] = entry
         else:
             raise RuntimeError("illegal index: " + str(self.t_index))
+        stack = self.names.get(entry.name)
+        if stack is None:
+            self.names[entry.name] = [self.t_index]
+        else:
+            stack.append(self.t_index)
+        self.names_index = self.t_index
 
     def block_begin(self, first_addr):
         '''
@@ -158,6 +177,11 @@ class Pl0Table:
             self.t_index = 0
             self.level = 0
         else:
+            if self.level + 1 >= self.max_level:
+                raise RuntimeError("too deep nesting of blocks (max %d)" % self.max_level)
+            if self.level >= len(self.index):
+                self.index.extend(self.index)
+                self.addr.extend(self.addr)
             self.index[self.level] = self.t_index # save t_index temporarily
             self.addr[self.level] = self.local_addr # save local_addr temporarily
             self.local_addr = first_addr
@@ -169,7 +193,12 @@ class Pl0Table:
         '''
         self.level -= 1
         if self.level >= 0:
-            self.t_index = self.index[self.level] # recover t_index
+            t_index = self.index[self.level]
+            # entries declared in the block become invisible
+            for i in range(self.names_index, t_index, -1):
+                self.names[self.table[i].name].pop()
+            self.names_index = t_index
+            self.t_index = t_index # recover t_index
             self.local_addr = self.addr[self.level] # recover local_addr
 
     def b_level(self):
@@ -244,13 +273,25 @@ class Pl0Table:
         Raise error when not found.
         '''
         l = self.t_index
-        for i in range(l, -1, -1):
-            if id_ == self.table[i].name:
-                return i
+        if l == self.names_index:
+            stack = self.names.get(id_)
+            if stack:
+                return stack[-1]
+        else:
+            # `t_index` is moved by hand, so scan the table
+            for i in range(l, -1, -1):
+                if id_ == self.table[i].name:
+                    return i
         # if k == IdKind.Var:
         #     return self.enter_var(id_)
         raise RuntimeError("unknown var or function: " + id_)
 
+    def name(self, i):
+        '''
+        Return name of the specified entry.
+        '''
+        return self.table[i].name
+
     def kind(self, i):
         '''
         Return kind of the specified entry.
@@ -0,0 +1,404 @@
+import linecache
+import operator
+import sys
+import textwrap
+from array import array
+from compiler.codegen import OpCode, Operator, CodeSegment, INIT_STACK, INIT_LEVEL, MAX_STACK
+from compiler.table import MAX_LEVEL
+from compiler.output import StreamSink
+
+# Opcodes of pre-decoded codes.
+# `OpCode.opr` is split into one opcode for each `Operator`, so that every code is dispatched once.
+LIT = 0
+LOD = 1
+STO = 2
+CAL = 3
+RET = 4
+ICT = 5
+JMP = 6
+JPC = 7
+NEG = 8
+ADD = 9
+SUB = 10
+MUL = 11
+DIV = 12
+ODD = 13
+EQ = 14
+LS = 15
+GR = 16
+NEQ = 17
+LSEQ = 18
+GREQ = 19
+WRT = 20
+WRL = 21
+# Superinstructions fused from sequences of codes by `fuse`.
+INC = 22     # lod x; lit k; opr add|sub; sto x
+STO_VV = 23  # lod x; lod y; opr <arith>; sto z
+STO_VK = 24  # lod x; lit k; opr <arith>; sto z
+STO_KV = 25  # lit k; lod y; opr <arith>; sto z
+JPC_VV = 26  # lod x; lod y; opr <cmp>; jpc L
+JPC_VK = 27  # lod x; lit k; opr <cmp>; jpc L
+CAL_ICT = 28 # cal f, where f starts with ict n
+
+# Opcode of pre-decoded codes for each value of `OpCode` and `Operator`
+OPCODE_OF = {
+    OpCode.lit.value: LIT,
+    OpCode.lod.value: LOD,
+    OpCode.sto.value: STO,
+    OpCode.cal.value: CAL,
+    OpCode.ret.value: RET,
+    OpCode.ict.value: ICT,
+    OpCode.jmp.value: JMP,
+    OpCode.jpc.value: JPC,
+}
+OPERATOR_OF = {
+    Operator.neg.value: NEG,
+    Operator.add.value: ADD,
+    Operator.sub.value: SUB,
+    Operator.mul.value: MUL,
+    Operator.div.value: DIV,
+    Operator.odd.value: ODD,
+    Operator.eq.value: EQ,
+    Operator.ls.value: LS,
+    Operator.gr.value: GR,
+    Operator.neq.value: NEQ,
+    Operator.lseq.value: LSEQ,
+    Operator.greq.value: GREQ,
+    Operator.wrt.value: WRT,
+    Operator.wrl.value: WRL,
+}
+
+def div(x, y):
+    return int(x / y)
+
+# Functions of operators fused into superinstructions
+ARITH = {ADD: operator.add, SUB: operator.sub, MUL: operator.mul, DIV: div}
+COMPARE = {EQ: operator.eq, LS: operator.lt, GR: operator.gt, NEQ: operator.ne, LSEQ: operator.le, GREQ: operator.ge}
+
+def predecode(code):
+    '''
+    Decode a `CodeSegment` once into a list of (opcode, a, b, c) tuples.
+    `c` is 0 except for superinstructions.
+    '''
+    assert isinstance(code, CodeSegment)
+    prog = []
+    for op, a, b in zip(code.op, code.a, code.b):
+        if op == OpCode.opr.value:
+            prog.append((OPERATOR_OF[a], 0, 0, 0))
+        elif op in OPCODE_OF:
+            prog.append((OPCODE_OF[op], a, b, 0))
+        else:
+            raise RuntimeError("illegal op: " + str(op))
+    return prog
+
+def fuse(prog):
+    '''
+    Return a copy of pre-decoded codes in which common sequences are fused into superinstructions.
+    A superinstruction replaces the first code of a sequence and skips the rest, which are left as they are,
+    so no target of jumps moves and a jump into the middle of a sequence executes the original codes.
+    '''
+    fused = list(prog)
+    n = len(prog)
+    for i, (op, a, b, _) in enumerate(prog):
+        if op == CAL:
+            if prog[b][0] == ICT:
+                fused[i] = (CAL_ICT, a, b + 1, prog[b][1])
+            continue
+        if i + 3 >= n or (op != LOD and op != LIT):
+            continue
+        (op2, a2, b2, _), (op3, _, _, _), (op4, a4, b4, _) = prog[i+1:i+4]
+        if op4 == STO and op3 in ARITH:
+            if op == LOD and op2 == LIT and (op3 == ADD or op3 == SUB) and a4 == a and b4 == b:
+                fused[i] = (INC, a, b, a2 if op3 == ADD else -a2)
+            elif op == LOD and op2 == LOD:
+                fused[i] = (STO_VV, a, b, (a2, b2, ARITH[op3], a4, b4))
+            elif op == LOD and op2 == LIT:
+                fused[i] = (STO_VK, a, b, (a2, ARITH[op3], a4, b4))
+            elif op == LIT and op2 == LOD:
+                fused[i] = (STO_KV, a2, b2, (a, ARITH[op3], a4, b4))
+        elif op4 == JPC and op3 in COMPARE and op == LOD:
+            if op2 == LOD:
+                fused[i] = (JPC_VV, a, b, (a2, b2, COMPARE[op3], a4))
+            elif op2 == LIT:
+                fused[i] = (JPC_VK, a, b, (a2, COMPARE[op3], a4))
+    return fused
+
+# Bodies of opcodes in the main loop generated by `make_loop`, in the order of dispatch.
+# A body runs with the code `op, a, b, c`, `pc` of the next code, and the locals `stack`, `display`, `top` and `write`.
+# No body changes the state before it fails on a short stack or display (see `Pl0VM.loop`).
+BODIES = [
+    (LOD, '''
+        stack[top] = stack[display[a] + b]
+        top += 1'''),
+    (LIT, '''
+        stack[top] = a
+        top += 1'''),
+    (STO, '''
+        stack[display[a] + b] = stack[top-1]
+        top -= 1'''),
+    (JPC_VK, '''
+        k, cmp, target = c
+        if cmp(stack[display[a] + b], k):
+            pc += 3
+        else:
+            pc = target'''),
+    (JPC_VV, '''
+        level, addr, cmp, target = c
+        if cmp(stack[display[a] + b], stack[display[level] + addr]):
+            pc += 3
+        else:
+            pc = target'''),
+    (STO_VK, '''
+        k, fn, level, addr = c
+        stack[display[level] + addr] = fn(stack[display[a] + b], k)
+        pc += 3'''),
+    (STO_VV, '''
+        level_y, addr_y, fn, level, addr = c
+        stack[display[level] + addr] = fn(stack[display[a] + b], stack[display[level_y] + addr_y])
+        pc += 3'''),
+    (STO_KV, '''
+        k, fn, level, addr = c
+        stack[display[level] + addr] = fn(k, stack[display[a] + b])
+        pc += 3'''),
+    (INC, '''
+        stack[display[a] + b] += c
+        pc += 3'''),
+    (JPC, '''
+        top -= 1
+        if stack[top] == 0:
+            pc = a'''),
+    (JMP, '''
+        pc = a'''),
+    (ADD, '''
+        top -= 1
+        stack[top-1] += stack[top]'''),
+    (SUB, '''
+        top -= 1
+        stack[top-1] -= stack[top]'''),
+    (MUL, '''
+        top -= 1
+        stack[top-1] *= stack[top]'''),
+    (DIV, '''
+        top -= 1
+        stack[top-1] = int(stack[top-1] / stack[top])'''),
+    (LS, '''
+        top -= 1
+        stack[top-1] = 1 if stack[top-1] < stack[top] else 0'''),
+    (GR, '''
+        top -= 1
+        stack[top-1] = 1 if stack[top-1] > stack[top] else 0'''),
+    (LSEQ, '''
+        top -= 1
+        stack[top-1] = 1 if stack[top-1] <= stack[top] else 0'''),
+    (GREQ, '''
+        top -= 1
+        stack[top-1] = 1 if stack[top-1] >= stack[top] else 0'''),
+    (EQ, '''
+        top -= 1
+        stack[top-1] = 1 if stack[top-1] == stack[top] else 0'''),
+    (NEQ, '''
+        top -= 1
+        stack[top-1] = 1 if stack[top-1] != stack[top] else 0'''),
+    (ODD, '''
+        stack[top-1] = stack[top-1] % 2'''),
+    (NEG, '''
+        stack[top-1] = -stack[top-1]'''),
+    (CAL_ICT, '''
+        # `cal` followed by `ict c` at the start of the function
+        lev = a + 1
+        stack[top] = display[lev]
+        stack[top+1] = pc
+        display[lev] = top
+        top += c
+        pc = b'''),
+    (CAL, '''
+        # `a` is the level of the name of called function, and `b` is the start index of it
+        lev = a + 1
+        stack[top] = display[lev] # save display temporarily
+        stack[top+1] = pc # save pc temporarily
+        display[lev] = top # save top temporarily
+        pc = b'''),
+    (ICT, '''
+        top += a'''),
+    (RET, '''
+        # `a` is the level of the inside of called function, and `b` is the num of arguments
+        temp = stack[top-1] # return value of function
+        top = display[a] # recover top
+        display[a] = stack[top] # recover display
+        pc = stack[top+1] # recover pc
+        top -= b
+        stack[top] = temp
+        top += 1'''),
+    (WRT, '''
+        top -= 1
+        write(str(stack[top]))'''),
+    (WRL, '''
+        write('\\n')'''),
+]
+# Superinstructions, which are skipped by loops of programs without them
+FUSED = (JPC_VK, JPC_VV, STO_VK, STO_VV, STO_KV, INC, CAL_ICT)
+# Names of the opcodes above, which `make_loop` writes into the dispatch
+NAMES = dict((globals()[name], name) for name in ('LIT', 'LOD', 'STO', 'CAL', 'RET', 'ICT', 'JMP', 'JPC',
+                                                  'NEG', 'ADD', 'SUB', 'MUL', 'DIV', 'ODD', 'EQ', 'LS', 'GR',
+                                                  'NEQ', 'LSEQ', 'GREQ', 'WRT', 'WRL', 'INC', 'STO_VV', 'STO_VK',
+                                                  'STO_KV', 'JPC_VV', 'JPC_VK', 'CAL_ICT'))
+
+# Default fetch of a code in `make_loop`
+FETCH = '''
+    op, a, b, c = prog[pc]
+    pc += 1'''
+
+LOOP = '''
+def loop(self%(params)s):
+    prog = self.prog
+    stack = self.stack
+    display = self.display
+    write = self.out.write
+    pc = self.pc
+    top = self.top
+%(setup)s
+    try:
+        while True:
+%(fetch)s
+%(dispatch)s
+    except IndexError:
+        # No code changes the state before it fails on a short stack or display,
+        # so the failed code can be executed again after they are grown.
+%(retry)s
+        self.pc = pc - 1
+        self.top = top
+%(save)s
+        return False
+'''
+
+def block(lines, indent):
+    return textwrap.indent(textwrap.dedent(lines).strip('\n'), indent) if lines else ''
+
+def make_loop(doc, params='', setup='', fetch=FETCH, save='', retry='', extra=(), after=None,
+              superinstructions=True, names=None):
+    '''
+    Return the main loop of `Pl0VM` or its subclass, generated from the shared `BODIES` of opcodes,
+    so that every loop executes each code in the same way.
+    The loop starts with the locals `prog`, `stack`, `display`, `write`, `pc` and `top`, and then runs hooks:
+    params: extra parameters of the loop, such as ', limit'
+    setup: lines which make extra locals
+    fetch: lines which set `op, a, b, c` of the code at `pc` and the next `pc`
+    save: lines which store extra locals when the loop returns
+    retry: lines which undo the fetch of the code failed on a short stack or display
+    extra: (opcode, body) of opcodes of the subclass, dispatched before `cal`
+    after: lines run after the body of each opcode in the dict, e.g. after `ret` before checking the end
+    superinstructions: False to leave out the bodies of superinstructions
+    names: dict of names used in hooks other than the names of `compiler.vm`
+    '''
+    after = after or {}
+    names = names or {}
+    labels = dict(NAMES)
+    labels.update((value, name) for name, value in names.items() if isinstance(value, int))
+    bodies = [(op, body) for op, body in BODIES if superinstructions or op not in FUSED]
+    k = [op for op, _ in bodies].index(CAL)
+    bodies[k:k] = list(extra)
+    dispatch = []
+    for n, (op, body) in enumerate(bodies):
+        dispatch.append('%s op == %s:' % ('if' if n == 0 else 'elif', labels[op]))
+        dispatch.append(block(body, ' ' * 4))
+        if op in after:
+            dispatch.append(block(after[op], ' ' * 4))
+        if op == RET:
+            dispatch.append('    if pc == 0:')
+            dispatch.append(block('self.pc = pc\nself.top = top\n' + textwrap.dedent(save) + '\nreturn True', ' ' * 8))
+    source = LOOP % { 'params': params
+                    , 'setup': block(setup, ' ' * 4)
+                    , 'fetch': block(fetch, ' ' * 12)
+                    , 'dispatch': block('\n'.join(dispatch), ' ' * 12)
+                    , 'save': block(save, ' ' * 8)
+                    , 'retry': block(retry, ' ' * 8)
+                    }
+    source = '\n'.join(line for line in source.splitlines() if line.strip()) + '\n'
+    # keep the source for tracebacks
+    file_name = '<pl0 loop %d>' % len(LOOPS)
+    LOOPS.append(source)
+    linecache.cache[file_name] = (len(source), None, source.splitlines(True), file_name)
+    namespace = dict(globals())
+    namespace.update(names)
+    exec(compile(source, file_name, 'exec'), namespace)
+    loop = namespace['loop']
+    loop.__doc__ = textwrap.dedent(doc).strip('\n')
+    loop.source = source
+    return loop
+
+# Sources of generated loops
+LOOPS = []
+
+class CountingProg(list):
+    '''
+    Pre-decoded program which counts fetched codes.
+    It replaces `Pl0VM.prog` only when executed codes are counted, so the main loop has no counter.
+    '''
+    def __init__(self, prog):
+        super().__init__(prog)
+        self.count = 0
+
+    def __getitem__(self, i):
+        self.count += 1
+        return super().__getitem__(i)
+
+class Pl0VM:
+    '''
+    Virtual machine which executes a `CodeSegment`.
+    The program is pre-decoded once, and the main loop keeps `pc`, `top` and `stack` in locals.
+    Common sequences are fused into superinstructions unless `superinstructions` is False.
+    `stack` and `display` grow on demand up to `max_stack` and `max_level`.
+    Values are written to the sink `out` (`StreamSink` of `sys.stdout` by default).
+    '''
+    # opcodes which set `display` of the called function
+    CALLS = (CAL, CAL_ICT)
+
+    def __init__(self, code, max_stack=MAX_STACK, max_level=MAX_LEVEL, superinstructions=True, out=None):
+        self.prog = predecode(code)
+        if superinstructions:
+            self.prog = fuse(self.prog)
+        self.max_stack = max_stack
+        self.max_level = max_level
+        self.out = out if out is not None else StreamSink()
+        self.stack = [0] * INIT_STACK
+        self.display = array('q', bytes(8 * INIT_LEVEL)) # store `top` of each level when functions are called
+        self.pc = 0
+        self.top = 0
+
+    def run(self):
+        '''
+        Execute the program until the main block returns.
+        '''
+        try:
+            while not self.loop():
+                self.grow()
+        finally:
+            self.out.flush()
+
+    loop = make_loop('''
+        Execute codes from `pc`.
+        Return True when the main block returns.
+        Return False with `pc` of the code to resume from when `stack` or `display` is too small.
+        ''')
+
+    def grow(self):
+        '''
+        Grow `stack` and `display` to execute the code at `pc`.
+        Raise error when they reach the limit.
+        '''
+        op, a, b, c = self.prog[self.pc]
+        # every code accesses `stack` only below `top + 2`
+        size = self.top + 2
+        level = a + 2 if op in self.CALLS else 0
+        if size <= len(self.stack) and level <= len(self.display):
+            raise RuntimeError("illegal access at %d" % self.pc)
+        if size > len(self.stack):
+            if size > self.max_stack:
+                raise RuntimeError("stack overflow (max %d)" % self.max_stack)
+            n = min(max(size, 2 * len(self.stack)), self.max_stack)
+            self.stack.extend([0] * (n - len(self.stack)))
+        if level > len(self.display):
+            if level > self.max_level:
+                raise RuntimeError("too deep nesting of functions (max %d)" % self.max_level)
+            n = min(max(level, 2 * len(self.display)), self.max_level)
+            self.display.extend(array('q', bytes(8 * (n - len(self.display)))))
@@ -1,28 +1,208 @@
+import argparse
+import os
 import sys
-from compiler.compile import Pl0Compiler
-from compiler.getsource import SourceReader
-from compiler.table import Pl0Table
-from compiler.codegen import Pl0CodeGenerator
+from compiler.compile import compile_source
+from compiler.getsource import ReadMode
+from compiler.vm import Pl0VM, CountingProg
+from compiler.optimize import Peephole
+from compiler.inline import Inliner, THRESHOLD as INLINE_THRESHOLD
+from compiler.native import Pl0Native
+from compiler.jit import Pl0TieredVM, THRESHOLD
+from compiler import bytecode
+from compiler.cache import CompileCache, CACHE_ENV, MAX_BYTES
+from compiler.output import SINKS
+from compiler.memo import Pl0MemoVM, MEMO_SIZE
+from compiler.profiler import Pl0ProfileVM
+from compiler import opstats
+from compiler.phases import Phases
 
-def main(file_name):
-    reader = SourceReader(file_name)
-    table = Pl0Table()
-    gen = Pl0CodeGenerator(table)
-    compiler = Pl0Compiler(reader, table, gen)
+ENGINES = ['vm', 'execute', 'python', 'tiered']
 
-    compiler.compile()
+def main(file_name, timings=False, stats=False, **kwargs):
+    '''
+    Compile and execute the program, and report a line of JSON of `Phases` to stderr
+    when `timings` or `stats` is True. `kwargs` are keyword arguments of `process`.
+    '''
+    phases = Phases(timings, stats)
+    try:
+        process(file_name, phases=phases, **kwargs)
+    finally:
+        if phases.enabled:
+            sys.stderr.write(phases.dumps(file=file_name) + '\n')
 
-    # Print symtable
-    #print(table.table)
-    # Format and print codes
-    #for col, code in zip(range(0, len(gen.codes)), gen.codes):
-    #    print("%d: %s" % (col, code))
+def process(file_name, read_mode=ReadMode.Buffer, engine='vm', optimize=False, verbose=False, fold=True,
+            jit_threshold=THRESHOLD, emit=None, cache_dir=None, cache_size=MAX_BYTES,
+            output='flush', memoize=False, memo_size=MEMO_SIZE, tail_calls=True, inline=None,
+            profile=False, profile_stacks=None, stats_file=None, phases=None):
+    if phases is None:
+        phases = Phases()
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_ENV)
+    if file_name.endswith(bytecode.EXTENSION):
+        # a compiled program is loaded without parsing
+        with phases.phase('read'):
+            gen = bytecode.load(file_name, read_mode == ReadMode.Mmap)
+    elif cache_dir:
+        cache = CompileCache(cache_dir, cache_size)
+        gen = cache.compile(file_name, fold, tail_calls, phases)
+        if verbose:
+            sys.stderr.write("cache: %s\n" % cache.stats())
+    else:
+        gen = compile_source(file_name, read_mode, fold, tail_calls, phases)
 
-    gen.execute()
+    try:
+        if (optimize or inline is not None) and engine == 'python':
+            raise RuntimeError("python engine does not support optimized codes")
+        if memoize and engine != 'vm':
+            raise RuntimeError("only vm engine supports memoization")
+        if stats_file is not None and engine != 'execute':
+            raise RuntimeError("only execute engine records executed codes")
+        profiling = profile or profile_stacks is not None
+        if profiling and (engine != 'vm' or memoize):
+            raise RuntimeError("only vm engine without memoization supports profiling")
+        if inline is not None:
+            size = len(gen.code)
+            with phases.phase('optimize'):
+                inlined = Inliner(inline).run(gen)
+            if verbose:
+                sys.stderr.write("inline: inlined %d call sites (%d -> %d codes)\n" % (inlined, size, len(gen.code)))
+        if optimize:
+            size = len(gen.code)
+            with phases.phase('optimize'):
+                removed = Peephole().run(gen)
+            if verbose:
+                sys.stderr.write("peephole: removed %d of %d codes\n" % (removed, size))
+        phases.count('codes', len(gen.code))
 
-if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        file_name = sys.argv[1]
+        if emit is not None:
+            bytecode.dump(gen, emit, source=file_name)
+            return
+
+        if output not in SINKS:
+            raise RuntimeError("unknown output: " + output)
+        # keep the order of the output written through `sys.stdout` so far
+        sys.stdout.flush()
+        out = SINKS[output]()
+        try:
+            with phases.phase('execute'):
+                execute(gen, engine, out, verbose, jit_threshold, memoize, memo_size,
+                        profile, profile_stacks, stats_file, phases)
+        finally:
+            out.close()
+    finally:
+        # close the mapped file of a compiled program
+        gen.close()
+
+def execute(gen, engine, out, verbose, jit_threshold, memoize, memo_size, profile, profile_stacks, stats_file, phases):
+    '''
+    Execute the codes of `gen` by `engine`.
+    Executed codes are counted into `phases` by the `vm` and `execute` engines only when it records stats.
+    '''
+    if engine == 'vm' and memoize:
+        vm = Pl0MemoVM(gen.code, gen.funcs, size=memo_size, out=out)
+        vm.run()
+        if verbose:
+            sys.stderr.write("memo: %s\n" % vm.stats())
+    elif engine == 'vm' and (profile or profile_stacks is not None):
+        vm = Pl0ProfileVM(gen.code, gen.funcs, out=out)
+        try:
+            vm.run()
+        finally:
+            out.flush()
+            if profile:
+                sys.stderr.write(vm.report())
+            if profile_stacks is not None:
+                with open(profile_stacks, 'w') as f:
+                    f.write(vm.collapsed())
+        phases.count('executed', vm.executed)
+    elif engine == 'vm' and phases.stats:
+        # codes are counted without superinstructions
+        vm = Pl0VM(gen.code, superinstructions=False, out=out)
+        vm.prog = CountingProg(vm.prog)
+        vm.run()
+        phases.count('executed', vm.prog.count)
+    elif engine == 'vm':
+        Pl0VM(gen.code, out=out).run()
+    elif engine == 'execute' and (stats_file is not None or phases.stats):
+        stats = opstats.OpStats(opstats.DYNAMIC)
+        try:
+            gen.execute(out, stats)
+        finally:
+            if stats_file is not None:
+                opstats.accumulate(stats, stats_file)
+        phases.count('executed', stats.total())
+    elif engine == 'execute':
+        gen.execute(out)
+    elif engine == 'python':
+        Pl0Native(gen, out=out).run()
+    elif engine == 'tiered':
+        vm = Pl0TieredVM(gen.code, threshold=jit_threshold, out=out)
+        vm.run()
+        if verbose:
+            sys.stderr.write("jit: %s\n" % vm.stats())
     else:
-        file_name = 'resources/sample1.pl'
-    main(file_name)
+        raise RuntimeError("unknown engine: " + engine)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Compile and execute a PL/0 program.')
+    parser.add_argument('file_name', nargs='?', default='resources/sample1.pl',
+                        help='source program, or compiled program with the extension .pl0c (default: resources/sample1.pl)')
+    parser.add_argument('--read-mode', choices=[x.value for x in ReadMode], default=ReadMode.Buffer.value,
+                        help='how to read the source program (default: buffer). '
+                             'a compiled program is mapped into memory in mmap mode')
+    parser.add_argument('--engine', choices=ENGINES, default='vm',
+                        help='how to execute the program (default: vm)')
+    parser.add_argument('-O', '--optimize', action='store_true',
+                        help='run the peephole optimizer over generated codes')
+    parser.add_argument('--inline', type=int, nargs='?', const=INLINE_THRESHOLD, metavar='N',
+                        help='replace calls of functions with at most N codes (default: %d) by their bodies'
+                             % INLINE_THRESHOLD)
+    parser.add_argument('-v', '--verbose', action='store_true',
+                        help='report what the compile cache, the inliner, the optimizer and the JIT compiler did to stderr')
+    parser.add_argument('--memoize', action='store_true',
+                        help='cache results of calls of pure functions in the vm engine')
+    parser.add_argument('--memo-size', type=int, default=MEMO_SIZE,
+                        help='max num of results cached for each pure function (default: %d)' % MEMO_SIZE)
+    parser.add_argument('--profile', action='store_true',
+                        help='count executed codes and calls, measure time of functions in the vm engine '
+                             'and report them to stderr')
+    parser.add_argument('--profile-stacks', metavar='FILE',
+                        help='write the num of codes executed in each call stack to FILE '
+                             'in the collapsed format of flame graph tools')
+    parser.add_argument('--timings', action='store_true',
+                        help='report wall time of reading, compiling and executing to stderr as a line of JSON. '
+                             'can not be used with --stats')
+    parser.add_argument('--stats', action='store_true',
+                        help='report peak memory traced in each phase, and the nums of tokens, entries of '
+                             'the symbol table, generated codes and executed codes to stderr as a line of JSON. '
+                             'the vm engine runs without superinstructions to count codes, '
+                             'so it executes other codes than a run without --stats. can not be used with --timings')
+    parser.add_argument('--opstats', dest='stats_file', metavar='FILE',
+                        help='count sequences of codes executed by the execute engine '
+                             'and merge them into the JSON stats in FILE')
+    parser.add_argument('--no-fold', dest='fold', action='store_false',
+                        help='do not fold constant expressions and conditions at compile time')
+    parser.add_argument('--jit-threshold', type=int, default=THRESHOLD,
+                        help='executions of a block before the tiered engine compiles it (default: %d)' % THRESHOLD)
+    parser.add_argument('--emit', metavar='FILE',
+                        help='write the compiled program to FILE in the .pl0c format instead of executing it')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='directory of the compile cache (default: $%s, no cache if not set)' % CACHE_ENV)
+    parser.add_argument('--cache-size', type=int, default=MAX_BYTES, metavar='BYTES',
+                        help='bound of the total size of the compile cache (default: %d)' % MAX_BYTES)
+    parser.add_argument('--output', choices=sorted(SINKS), default='flush',
+                        help='how to write the output of the program (default: flush). '
+                             'flush writes each value at once, line flushes at the end of lines, '
+                             'and buffered writes large chunks to the file descriptor of stdout')
+    parser.add_argument('--no-tail-calls', dest='tail_calls', action='store_false',
+                        help='do not replace `return f(...)` in the function `f` by a jump reusing the frame')
+    return parser.parse_args(argv)
+
+if __name__ == '__main__':
+    args = parse_args()
+    main(args.file_name, read_mode=ReadMode(args.read_mode), engine=args.engine, optimize=args.optimize,
+         verbose=args.verbose, fold=args.fold, jit_threshold=args.jit_threshold, emit=args.emit,
+         cache_dir=args.cache_dir, cache_size=args.cache_size, output=args.output,
+         memoize=args.memoize, memo_size=args.memo_size, tail_calls=args.tail_calls, inline=args.inline,
+         profile=args.profile, profile_stacks=args.profile_stacks, stats_file=args.stats_file,
+         timings=args.timings, stats=args.stats)
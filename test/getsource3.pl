@@ -0,0 +1,2 @@
+x1 := 10;
+if a<>b then a<=b; b>=a; a<b; a>b; a : b ? 007
@@ -0,0 +1,39 @@
+'''
+Helpers shared by tests.
+'''
+import sys
+from io import StringIO
+from unittest import TestCase
+from main import compile_source
+
+def compile_file(file_name, fold=True, tail_calls=True):
+    '''
+    Compile the source program `file_name` by `main.compile_source` and return `Pl0CodeGenerator`.
+    '''
+    return compile_source(file_name, fold=fold, tail_calls=tail_calls)
+
+def compile_text(source, fold=True, tail_calls=True):
+    '''
+    Compile the in-memory source program `source` and return `Pl0CodeGenerator`.
+    '''
+    return compile_source(None, fold=fold, tail_calls=tail_calls, source=source)
+
+class OutputTestCase(TestCase):
+    '''
+    Test case whose stdout is kept in `buf`.
+    '''
+    def setUp(self):
+        self.buf = StringIO()
+        sys.stdout = self.buf
+
+    def output(self, run):
+        '''
+        Return what `run()` writes to stdout.
+        '''
+        self.buf.truncate(0)
+        self.buf.seek(0)
+        run()
+        return self.buf.getvalue()
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
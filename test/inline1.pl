@@ -0,0 +1,45 @@
+const k = 3;
+var base, total;
+
+function max(x, y)
+begin
+  if x > y then return x;
+  return y
+end;
+
+function scale(x)
+  var t;
+begin
+  t := x * k;
+  return t + base
+end;
+
+function tally(x)
+begin
+  total := total + x;
+  return total
+end;
+
+function sum(n)
+  var i, s;
+begin
+  i := 0; s := 0;
+  while i < n do
+  begin
+    s := s + max(scale(i), tally(i));
+    i := i + 1
+  end;
+  return s
+end;
+
+function fact(n)
+begin
+  if n = 0 then return 1;
+  return n * fact(n - 1)
+end;
+
+begin
+  base := 10; total := 0;
+  write max(3, 4); write max(4, 3); write scale(2); writeln;
+  write sum(20); write total; write fact(5); writeln
+end.
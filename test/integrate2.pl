@@ -0,0 +1,39 @@
+function sum(n)
+begin
+  if n = 0 then return 0;
+  return n + sum(n - 1)
+end;
+
+function l1(a)
+  function l2(b)
+    function l3(c)
+      function l4(d)
+        function l5(e)
+          function l6(f)
+            function l7(g)
+            begin
+              return a + b + c + d + e + f + g
+            end;
+          begin
+            return l7(f + 1)
+          end;
+        begin
+          return l6(e + 1)
+        end;
+      begin
+        return l5(d + 1)
+      end;
+    begin
+      return l4(c + 1)
+    end;
+  begin
+    return l3(b + 1)
+  end;
+begin
+  return l2(a + 1)
+end;
+
+begin
+  write sum(3000); writeln;
+  write l1(1); writeln;
+end.
@@ -0,0 +1,28 @@
+const m = 7, n = 2;
+var x, i;
+begin
+  x := -m / n; write x; writeln;
+  write (0 - m) / n; writeln;
+  write m / n; writeln;
+  if 1 = 1 then write 1; writeln;
+  while 0 <> 0 do write 0;
+  if odd m then write 2; writeln;
+  if m < n then write 0;
+  write -(m) * (n - 1); writeln;
+  i := 0;
+  while i < m - 1 do i := i + 1;
+  write i; writeln;
+  if x < 0 then
+  begin
+    x := m + x;
+    while 1 = 1 do
+    begin
+      x := x + 2 * n / n;
+      if x > 3 * 3 then
+      begin
+        write x; writeln;
+        return 0
+      end
+    end
+  end
+end.
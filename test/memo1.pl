@@ -0,0 +1,41 @@
+function fib(n)
+begin
+  if n < 2 then return n;
+  return fib(n - 1) + fib(n - 2)
+end;
+
+function even(n)
+  function odd1(m)
+  begin
+    if m = 0 then return 0;
+    return even(m - 1)
+  end;
+begin
+  if n = 0 then return 1;
+  return odd1(n - 1)
+end;
+
+function last(n)
+  var r;
+begin
+  r := n * 2
+end;
+
+var count;
+
+function counted(n)
+begin
+  count := count + 1;
+  return n
+end;
+
+function twice(n)
+begin
+  return counted(n) + counted(n)
+end;
+
+begin
+  count := 0;
+  write fib(20); write even(7); write even(10); write last(4); writeln;
+  write twice(3); write twice(3); write count; writeln
+end.
@@ -0,0 +1,33 @@
+var x, y;
+function f(n)
+  var k;
+begin
+  k := 0;
+  while 1 = 1 do
+    while 1 = 1 do
+    begin
+      k := k + 1;
+      if k > n then return k * 10;
+      x := x + 1
+    end;
+  return 0
+end;
+function even(n)
+  function odd1(m)
+  begin
+    if m = 0 then return 0;
+    return even(m - 1)
+  end;
+begin
+  if n = 0 then return 1;
+  return odd1(n - 1)
+end;
+begin
+  x := 0; y := 5;
+  write f(3); writeln; write x; writeln;
+  write even(7); write even(10); writeln;
+  while x < 0 do ;
+  if x < 0 then while 1 = 1 do x := 1;
+  while x < 9 do begin if odd x then x := x + 2; x := x + 1 end;
+  write x; writeln
+end.
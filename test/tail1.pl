@@ -0,0 +1,46 @@
+function gcd(x, y)
+begin
+  if x <> y then
+  begin
+    if x < y then return gcd(x, y - x);
+    return gcd(x - y, y)
+  end;
+  return x
+end;
+
+function count(n, acc)
+begin
+  if n = 0 then return acc;
+  return count(n - 1, acc + 1)
+end;
+
+function swap(a, b, n)
+begin
+  if n = 0 then return a * 10 + b;
+  return swap(b, a, n - 1)
+end;
+
+function down(n)
+  var k;
+begin
+  k := 0;
+  while 1 = 1 do
+  begin
+    k := k + 1;
+    if k > 2 then
+      if n > 0 then return down(n - 1);
+    if n = 0 then return k
+  end;
+  return 0
+end;
+
+function notail(n)
+begin
+  if n = 0 then return 0;
+  return 1 + notail(n - 1)
+end;
+
+begin
+  write gcd(84, 36); write count(20000, 0); write swap(1, 2, 3); writeln;
+  write down(5); write notail(100); writeln
+end.
@@ -0,0 +1,75 @@
+import os
+import tempfile
+from unittest import main
+from compiler.vm import Pl0VM
+from compiler.native import Pl0Native
+from compiler.bytecode import HEADER, MAGIC, VERSION, dumps, dump, loads, load
+from test.helper import OutputTestCase, compile_file
+
+class TestBytecode(OutputTestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.dir.name, 'a.pl0c')
+
+    def test_dumps(self):
+        gen = compile_file('resources/sample1.pl')
+        data = dumps(gen.code)
+        n = len(gen.code)
+        self.assertEqual(HEADER.unpack_from(data), (MAGIC, VERSION, 0, n, 0))
+        self.assertEqual(len(data), HEADER.size + 13 * n)
+
+    def test_load(self):
+        gen = compile_file('resources/sample2.pl')
+        dump(gen, self.file_name, source='resources/sample2.pl')
+        for use_mmap in [True, False]:
+            sut = load(self.file_name, use_mmap)
+            self.assertEqual(sut.code, gen.code)
+            self.assertEqual(sut.disassemble(), gen.disassemble())
+            self.assertEqual(sut.funcs, gen.funcs)
+            self.assertEqual(sut.c_index, gen.c_index)
+            self.assertEqual(sut.mmap is not None, use_mmap)
+            sut.close()
+            self.assertIsNone(sut.mmap)
+
+    def test_mapped_code_is_read_only(self):
+        dump(compile_file('resources/sample1.pl'), self.file_name)
+        sut = load(self.file_name)
+        with self.assertRaises(TypeError):
+            sut.code.a[0] = 1
+        sut.close()
+
+    def test_load_without_debug(self):
+        dump(compile_file('resources/sample1.pl'), self.file_name, debug=False)
+        sut = load(self.file_name)
+        self.assertEqual(sut.funcs, [])
+        with self.assertRaisesRegex(RuntimeError, "no information of functions"):
+            Pl0Native(sut)
+
+    def test_run(self):
+        gen = compile_file('test/integrate2.pl')
+        dump(gen, self.file_name)
+        Pl0VM(load(self.file_name).code).run()
+        Pl0Native(load(self.file_name)).run()
+        self.assertEqual(self.buf.getvalue(), '4501500\n28\n' * 2)
+
+    def test_broken(self):
+        data = dumps(compile_file('resources/sample1.pl').code)
+        with self.assertRaisesRegex(RuntimeError, "bad magic"):
+            loads(b'XXXX' + data[4:])
+        with self.assertRaisesRegex(RuntimeError, "unsupported version"):
+            loads(HEADER.pack(MAGIC, VERSION + 1, 0, 0, 0))
+        # programs of version 1 have no `pure` and `tails` in the debug section
+        with self.assertRaisesRegex(RuntimeError, "unsupported version of compiled program: 1"):
+            loads(HEADER.pack(MAGIC, 1, 0, 0, 0))
+        with self.assertRaisesRegex(RuntimeError, "broken"):
+            loads(data[:-1])
+        with self.assertRaisesRegex(RuntimeError, "too short"):
+            loads(b'')
+
+    def tearDown(self):
+        super().tearDown()
+        self.dir.cleanup()
+
+if __name__ == '__main__':
+    main()
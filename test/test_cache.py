@@ -0,0 +1,84 @@
+import os
+import sys
+import tempfile
+from io import StringIO
+from unittest import TestCase, main
+from compiler.vm import Pl0VM
+from compiler.cache import CompileCache
+from compiler.phases import Phases
+
+class TestCompileCache(TestCase):
+    def setUp(self):
+        self.buf = StringIO()
+        sys.stdout = self.buf
+        self.dir = tempfile.TemporaryDirectory()
+
+    def files(self):
+        return sorted(os.listdir(self.dir.name))
+
+    def test_hit_and_miss(self):
+        sut = CompileCache(self.dir.name)
+        first = sut.compile('resources/sample2.pl')
+        second = sut.compile('resources/sample2.pl')
+        self.assertEqual(sut.stats(), {'hits': 1, 'misses': 1, 'evicted': 0, 'evicted_bytes': 0})
+        self.assertEqual(second.code, first.code)
+        self.assertEqual(second.funcs, first.funcs)
+        Pl0VM(second.code).run()
+        self.assertEqual(self.buf.getvalue(), '785595\n84361212\n27\n')
+        self.assertEqual(len(self.files()), 1)
+
+    def test_stats(self):
+        sut = CompileCache(self.dir.name)
+        miss, hit = Phases(stats=True), Phases(stats=True)
+        sut.compile('resources/sample2.pl', phases=miss)
+        sut.compile('resources/sample2.pl', phases=hit)
+        self.assertEqual(sorted(miss.phases), ['compile', 'read'])
+        self.assertEqual(sorted(miss.counts), ['table_entries', 'tokens'])
+        self.assertEqual(sorted(hit.phases), ['read'])
+        self.assertEqual(hit.counts, {})
+
+    def test_key(self):
+        sut = CompileCache(self.dir.name)
+        self.assertEqual(sut.key(b'.'), sut.key(b'.'))
+        self.assertNotEqual(sut.key(b'.'), sut.key(b' .'))
+        self.assertNotEqual(sut.key(b'.', fold=True), sut.key(b'.', fold=False))
+        sut.compile('resources/sample1.pl', fold=True)
+        sut.compile('resources/sample1.pl', fold=False)
+        self.assertEqual(sut.misses, 2)
+
+    def test_shared_directory(self):
+        CompileCache(self.dir.name).compile('resources/sample1.pl')
+        sut = CompileCache(self.dir.name)
+        sut.compile('resources/sample1.pl')
+        self.assertEqual((sut.hits, sut.misses), (1, 0))
+
+    def test_broken_entry(self):
+        sut = CompileCache(self.dir.name)
+        sut.compile('resources/sample1.pl')
+        with open(os.path.join(self.dir.name, self.files()[0]), 'wb') as f:
+            f.write(b'broken')
+        sut.compile('resources/sample1.pl')
+        self.assertEqual(sut.misses, 2)
+
+    def test_evict(self):
+        sut = CompileCache(self.dir.name)
+        sut.compile('resources/sample1.pl')
+        sut.compile('resources/sample2.pl')
+        names = dict((name, os.path.getsize(os.path.join(self.dir.name, name))) for name in self.files())
+        # make sample1 the least recently used
+        with open('resources/sample1.pl', 'rb') as f:
+            old = sut.path(sut.key(f.read()))
+        os.utime(old, (0, 0))
+        sut.max_bytes = sum(names.values()) - 1
+        sut.evict()
+        self.assertFalse(os.path.exists(old))
+        self.assertEqual(sut.evicted, 1)
+        self.assertEqual(sut.evicted_bytes, names[os.path.basename(old)])
+        self.assertEqual(len(self.files()), 1)
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        self.dir.cleanup()
+
+if __name__ == '__main__':
+    main()
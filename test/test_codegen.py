@@ -2,7 +2,8 @@ from unittest import TestCase, main
 from unittest.mock import Mock, ANY, call
 from compiler.table import RelAddr, Pl0Table
 from compiler.codegen import OpCode, Operator, ValInst, RefInst,\
-                             OpInst, RetInst, Pl0CodeGenerator
+                             OpInst, RetInst, Pl0CodeGenerator,\
+                             CodeSegment, FuncInfo, assemble, disassemble, func_index
 
 class TestPl0CodeGenerator(TestCase):
     def setUp(self):
@@ -43,7 +44,7 @@ class TestPl0CodeGenerator(TestCase):
                        , OpInst(Operator.wrt)
                        , RetInst(1,1)
                        ]
-        self.assertEqual(self.sut.codes, expect_codes)
+        self.assertEqual(self.sut.disassemble(), expect_codes)
 
     def test_gencode_with_func(self):
         '''
@@ -91,7 +92,49 @@ class TestPl0CodeGenerator(TestCase):
                        , OpInst(Operator.wrt)
                        , RetInst(1, 0)
                        ]
-        self.assertEqual(self.sut.codes, expect_codes)
+        self.assertEqual(self.sut.disassemble(), expect_codes)
+
+    def test_packed_code(self):
+        '''
+        Codes are packed into parallel columns of `CodeSegment`.
+        '''
+        # Setup
+        self.table.reladdr.side_effect = [RelAddr(1,-2)]
+        self.table.b_level.return_value = 1
+        self.table.f_pars.return_value = 2
+        # Execute
+        back_p = self.sut.gencode_v(OpCode.jpc, 0)
+        self.sut.gencode_t(OpCode.lod, 2)
+        self.sut.gencode_o(Operator.greq)
+        self.sut.backpatch(back_p)
+        self.sut.gencode_r()
+        # Assert
+        self.assertEqual(list(self.sut.code.op), [OpCode.jpc.value, OpCode.lod.value, OpCode.opr.value, OpCode.ret.value])
+        self.assertEqual(list(self.sut.code.a), [3, 1, Operator.greq.value, 1])
+        self.assertEqual(list(self.sut.code.b), [0, -2, 0, 2])
+        self.assertEqual(self.sut.code[1], (OpCode.lod.value, 1, -2))
+
+    def test_assemble_and_disassemble(self):
+        codes = [ ValInst(OpCode.jmp, 3)
+                , ValInst(OpCode.ict, 4)
+                , ValInst(OpCode.lit, -7)
+                , RefInst(OpCode.sto, RelAddr(0, 2))
+                , RefInst(OpCode.cal, RelAddr(0, 1))
+                , OpInst(Operator.wrl)
+                , RetInst(0, 0)
+                ]
+        seg = assemble(codes)
+        self.assertEqual(len(seg), 7)
+        self.assertEqual(disassemble(seg), codes)
+        self.assertEqual(assemble(disassemble(seg)), seg)
+        with self.assertRaises(RuntimeError):
+            assemble([ValInst(OpCode.lit, 2 ** 64)])
+
+    def test_func_index(self):
+        f = FuncInfo('f', 1, 1, 1, 3, 6)
+        g = FuncInfo('g', 1, 0, 6, 6, 6) # removed by `Peephole`
+        main = FuncInfo('dummy', 0, 0, 0, 7, 9)
+        self.assertEqual(func_index([f, g, main]), {1: f, 3: f, 0: main, 7: main})
 
     def tearDown(self):
         pass
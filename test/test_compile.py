@@ -2,7 +2,8 @@ from unittest import TestCase, main, skip
 from unittest.mock import Mock, ANY, call
 from compiler.getsource import SourceReader
 from compiler.table import IdKind, Pl0Table
-from compiler.codegen import OpCode, Operator, Pl0CodeGenerator
+from compiler.codegen import OpCode, Operator, RefInst, ValInst, Pl0CodeGenerator
+from compiler.table import RelAddr
 from compiler.compile import Pl0Compiler
 
 class TestCompile(TestCase):
@@ -13,13 +14,14 @@ class TestCompile(TestCase):
         '''
         Set up Pl0Compiler.
         Use mocking for table and gen objects.
+        Tail calls are not replaced because they need the actual codes.
         '''
         self.reader = SourceReader(file_name)
         # `Mock` constructor ensures that the target class has methods which are actually called.
         # If not, AttributeError is raised.
         self.table = Mock(spec=Pl0Table)
         self.gen = Mock(spec=Pl0CodeGenerator)
-        self.sut = Pl0Compiler(self.reader, self.table, self.gen)
+        self.sut = Pl0Compiler(self.reader, self.table, self.gen, tail_calls=False)
 
     def test_compile_decl(self):
         # Setup
@@ -62,6 +64,8 @@ class TestCompile(TestCase):
     def test_compile_ret(self):
         # Setup
         self.setUpReader('test/compile_ret.pl')
+        # codes generated by the parser as they are, without constant folding
+        self.sut.fold = False
         self.table.kind.return_value = IdKind.Var
         # Execute
         self.sut.compile()
@@ -85,6 +89,8 @@ class TestCompile(TestCase):
     def test_compile_expr1(self):
         # Setup
         self.setUpReader('test/compile_expr1.pl')
+        # codes generated by the parser as they are, without constant folding
+        self.sut.fold = False
         self.table.kind.return_value = IdKind.Var
         # Execute
         self.sut.compile()
@@ -95,6 +101,8 @@ class TestCompile(TestCase):
     def test_compile_expr2(self):
         # Setup
         self.setUpReader('test/compile_expr2.pl')
+        # codes generated by the parser as they are, without constant folding
+        self.sut.fold = False
         self.table.kind.return_value = IdKind.Var
         # Execute
         self.sut.compile()
@@ -106,6 +114,8 @@ class TestCompile(TestCase):
     def test_compile_condition(self):
         # Setup
         self.setUpReader('test/compile_condition.pl')
+        # codes generated by the parser as they are, without constant folding
+        self.sut.fold = False
         self.table.kind.return_value = IdKind.Var
         # Execute
         self.sut.compile()
@@ -118,6 +128,44 @@ class TestCompile(TestCase):
         self.gen.gencode_o.assert_any_call(Operator.lseq)
         self.gen.gencode_o.assert_any_call(Operator.greq)
 
+    def test_fold_expr(self):
+        # Setup
+        self.setUpReader('test/compile_expr2.pl')
+        self.table.kind.return_value = IdKind.Var
+        # Execute
+        self.sut.compile()
+        # Assert: 2 * 3 + 4 * 5 / (3 + 7) is folded into 8 without any operators
+        self.assertEqual(self.gen.gencode_o.call_count, 0)
+        self.assertEqual(self.gen.gencode_v.mock_calls[-1], call(OpCode.lit, 8))
+
+    def test_fold_condition(self):
+        # Setup
+        self.setUpReader('test/compile_condition.pl')
+        self.table.kind.return_value = IdKind.Var
+        # Execute
+        self.sut.compile()
+        # Assert: `odd 0` is folded, and the statement is removed without `jpc`
+        self.assertEqual(self.gen.gencode_o.mock_calls,
+                         [ call(Operator.eq), call(Operator.ls), call(Operator.gr)
+                         , call(Operator.neq), call(Operator.lseq), call(Operator.greq) ])
+        self.assertEqual(self.gen.gencode_v.mock_calls.count(call(OpCode.jpc, 0)), 6)
+
+    def test_tail_call(self):
+        # Setup: the actual table and gen to check the codes
+        self.reader = SourceReader('test/tail1.pl')
+        gen = Pl0CodeGenerator(Pl0Table())
+        self.sut = Pl0Compiler(self.reader, gen.table, gen)
+        # Execute
+        self.sut.compile()
+        # Assert: `return gcd(x - y, y)` stores only `x`, and `return notail(...)` is not a tail call
+        gcd = gen.funcs[0]
+        codes = gen.disassemble()
+        self.assertEqual(len(gcd.tails), 2)
+        self.assertEqual(codes[gcd.tails[1]-1:gcd.tails[1]+1],
+                         [RefInst(OpCode.sto, RelAddr(1, -2)), ValInst(OpCode.jmp, gcd.entry + 1)])
+        self.assertFalse(any(code.op_code == OpCode.cal for code in codes[gcd.entry:gcd.end]))
+        self.assertEqual([len(f.tails) for f in gen.funcs], [2, 1, 1, 1, 0, 0])
+
     def tearDown(self):
         if hasattr(self, 'sut'):
             self.sut.reader.close()
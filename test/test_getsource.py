@@ -1,7 +1,10 @@
 import unittest
+import os
 import string
 import sys
-from compiler.getsource import KeyWd, KeySym, KeyToken, KeyEtc, KeyTable, Token, SourceReader
+import tempfile
+from compiler.getsource import KeyWd, KeySym, KeyToken, KeyEtc, KeyTable, Token, TokenStream, ReadMode, SourceReader, \
+                               MAXNUM
 
 '''
 Execute `python setup.py test` to test all cases
@@ -36,10 +39,8 @@ class TestGetSource(unittest.TestCase):
                 return x
         return None
 
-    def test_next_token(self):
-        sut = SourceReader('test/getsource2.pl')
+    def read_tokens(self, sut):
         tokens = []
-
         try:
             while True:
                 token = sut.next_token()
@@ -48,9 +49,11 @@ class TestGetSource(unittest.TestCase):
                     break
         finally:
             sut.close()
+        return tokens
 
+    def expected_tokens(self, file_name):
         expected = []
-        with open('test/getsource2.expect', 'r') as f:
+        with open(file_name, 'r') as f:
             for line in f.readlines():
                 line = line.strip()
                 xs = line.split(' ', 1)
@@ -64,7 +67,135 @@ class TestGetSource(unittest.TestCase):
                     val = None
                 expected.append(Token(self.to_any_kind(kind), val))
         expected.append(Token(KeyEtc.Others, ''))
+        return expected
+
+    def test_next_token(self):
+        tokens = self.read_tokens(SourceReader('test/getsource2.pl'))
+        self.assertEqual(tokens, self.expected_tokens('test/getsource2.expect'))
+
+    def test_next_token_with_read_modes(self):
+        expected = self.expected_tokens('test/getsource2.expect')
+        for mode in ReadMode:
+            tokens = self.read_tokens(SourceReader('test/getsource2.pl', mode))
+            self.assertEqual(tokens, expected, mode)
+
+    def test_next_token_from_source(self):
+        expected = self.expected_tokens('test/getsource2.expect')
+        with open('test/getsource2.pl', 'r') as f:
+            source = f.read()
+        self.assertEqual(self.read_tokens(SourceReader(source=source)), expected)
+        self.assertEqual(self.read_tokens(SourceReader(source=source.encode())), expected)
+        self.assertEqual(self.read_tokens(SourceReader(source=source.replace('\n', '\r\n'))), expected)
+        for args in [{}, {'input_file': 'test/getsource2.pl', 'source': source}]:
+            with self.assertRaisesRegex(RuntimeError, "either input_file or source"):
+                SourceReader(**args)
+
+    def test_next_token_of_large_number(self):
+        for source in [str(MAXNUM), str(MAXNUM).encode()]:
+            self.assertEqual(self.read_tokens(SourceReader(source=source))[0], Token(KeyToken.Num, MAXNUM))
+        for source in [str(MAXNUM + 1), b'99999999999999999999']:
+            with self.assertRaisesRegex(RuntimeError, "too large number: " + str(int(source))):
+                self.read_tokens(SourceReader(source=source))
+
+    def read_tokens_of_bytes(self, data):
+        '''
+        Return tokens of `data` written into a file and read in each mode, and from memory as str and bytes.
+        '''
+        fd, file_name = tempfile.mkstemp(suffix='.pl')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            results = [self.read_tokens(SourceReader(file_name, mode)) for mode in ReadMode]
+        finally:
+            os.remove(file_name)
+        results.append(self.read_tokens(SourceReader(source=data.decode('utf-8'))))
+        results.append(self.read_tokens(SourceReader(source=data)))
+        return results
+
+    def test_line_endings(self):
+        # `\r` and `\r\n` end lines in every mode, as files read in text mode end lines by them
+        expected = self.expected_tokens('test/getsource2.expect')
+        with open('test/getsource2.pl', 'rb') as f:
+            data = f.read()
+        for ending in [b'\r\n', b'\r']:
+            for tokens in self.read_tokens_of_bytes(data.replace(b'\n', ending)):
+                self.assertEqual(tokens, expected, ending)
+
+    def test_non_ascii(self):
+        # a character out of ASCII is a token of `KeyEtc.Others` in every mode, also when read as UTF-8 bytes
+        expected = [ Token(KeyToken.Id, 'x'), Token(KeyEtc.Others, '\u00e9'), Token(KeyEtc.Others, '\u3042')
+                   , Token(KeyToken.Num, 1), Token(KeyEtc.Others, '') ]
+        for tokens in self.read_tokens_of_bytes('x \u00e9\u3042 1\n'.encode('utf-8')):
+            self.assertEqual(tokens, expected)
+        sut = SourceReader(source='a\u00e9\r'.encode('utf-8'))
+        self.assertEqual([sut.next_char() for _ in range(4)], ['a', '\u00e9', '\r', ''])
+
+    def test_next_char_from_source(self):
+        for source in ["one\ntwo", b"one\ntwo"]:
+            sut = SourceReader(source=source)
+            self.assertEqual([sut.next_char() for _ in range(8)], list("one\ntwo") + [""])
+
+    def test_next_token_symbols(self):
+        tokens = self.read_tokens(SourceReader('test/getsource3.pl'))
+
+        expected = [ Token(KeyToken.Id, 'x1'), Token(KeySym.Assign), Token(KeyToken.Num, 10)
+                   , Token(KeySym.Semicolon, ';'), Token(KeyWd.If), Token(KeyToken.Id, 'a')
+                   , Token(KeySym.NotEq), Token(KeyToken.Id, 'b'), Token(KeyWd.Then)
+                   , Token(KeyToken.Id, 'a'), Token(KeySym.LssEq), Token(KeyToken.Id, 'b')
+                   , Token(KeySym.Semicolon, ';'), Token(KeyToken.Id, 'b'), Token(KeySym.GtrEq)
+                   , Token(KeyToken.Id, 'a'), Token(KeySym.Semicolon, ';'), Token(KeyToken.Id, 'a')
+                   , Token(KeySym.Lss), Token(KeyToken.Id, 'b'), Token(KeySym.Semicolon, ';')
+                   , Token(KeyToken.Id, 'a'), Token(KeySym.Gtr), Token(KeyToken.Id, 'b')
+                   , Token(KeySym.Semicolon, ';'), Token(KeyToken.Id, 'a'), Token(KeyToken.Nul)
+                   , Token(KeyToken.Id, 'b'), Token(KeyEtc.Others, '?'), Token(KeyToken.Num, 7)
+                   , Token(KeyEtc.Others, '')
+                   ]
         self.assertEqual(tokens, expected)
+        for mode in [ReadMode.Buffer, ReadMode.Mmap]:
+            self.assertEqual(self.read_tokens(SourceReader('test/getsource3.pl', mode)), expected, mode)
+
+    def test_tokenize(self):
+        sut = SourceReader(source="x := x + 10;\n  y := 10")
+        tokens = list(sut.tokenize())
+        self.assertEqual(tokens, [ Token(KeyToken.Id, 'x'), Token(KeySym.Assign), Token(KeyToken.Id, 'x')
+                                 , Token(KeySym.Plus, '+'), Token(KeyToken.Num, 10), Token(KeySym.Semicolon, ';')
+                                 , Token(KeyToken.Id, 'y'), Token(KeySym.Assign), Token(KeyToken.Num, 10)
+                                 , Token(KeyEtc.Others, '') ])
+        # the same identifiers and numbers share a token
+        self.assertIs(tokens[0], tokens[2])
+        self.assertIs(tokens[4], tokens[8])
+        # the end of the source is repeated
+        self.assertEqual(sut.next_token(), Token(KeyEtc.Others, ''))
+
+    def test_token_stream(self):
+        for mode in ReadMode:
+            sut = SourceReader('test/getsource3.pl', mode)
+            try:
+                stream = sut.token_stream()
+            finally:
+                sut.close()
+            self.assertEqual(len(stream), 31)
+            self.assertEqual([stream.kind(i) for i in range(4)],
+                             [KeyToken.Id, KeySym.Assign, KeyToken.Num, KeySym.Semicolon])
+            self.assertEqual([stream.value(i) for i in range(4)], ['x1', None, 10, ';'])
+            self.assertEqual([stream.offset(i) for i in range(6)], [0, 3, 6, 8, 10, 13])
+            self.assertEqual(list(stream), self.read_tokens(SourceReader('test/getsource3.pl')))
+            # the cursor stops at the last token
+            tokens = [stream.next_token() for _ in range(len(stream) + 2)]
+            self.assertEqual(tokens[-3:], [Token(KeyEtc.Others, '')] * 3)
+
+    def test_key_table(self):
+        self.assertTrue(KeyTable.is_keywd('begin'))
+        self.assertFalse(KeyTable.is_keywd('begins'))
+        self.assertEqual(KeyTable.to_keywd('writeln'), KeyWd.WriteLn)
+        self.assertIsNone(KeyTable.to_keywd('x'))
+        self.assertEqual(KeyTable.to_keysym(':='), KeySym.Assign)
+        self.assertEqual(KeyTable.to_kind('a'), KeyEtc.Letter)
+        self.assertEqual(KeyTable.to_kind('9'), KeyEtc.Digit)
+        self.assertEqual(KeyTable.to_kind('<'), KeySym.Lss)
+        self.assertEqual(KeyTable.to_kind(':'), KeyEtc.Colon)
+        self.assertEqual(KeyTable.to_kind('?'), KeyEtc.Others)
+        self.assertEqual(KeyTable.to_kind(''), KeyEtc.Others)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,63 @@
+from unittest import main
+from compiler.codegen import OpCode, func_index
+from compiler.vm import Pl0VM, CountingProg
+from compiler.optimize import Peephole
+from compiler.inline import Inliner, inlinable
+from test.helper import OutputTestCase, compile_file
+
+class TestInliner(OutputTestCase):
+    def run_vm(self, gen):
+        '''
+        Return the output and the num of executed codes.
+        '''
+        vm = Pl0VM(gen.code, superinstructions=False)
+        vm.prog = CountingProg(vm.prog)
+        return self.output(vm.run), vm.prog.count
+
+    def test_inlinable(self):
+        gen = compile_file('test/inline1.pl')
+        index = func_index(gen.funcs)
+        self.assertEqual([(f.name, inlinable(gen.code, f, index)) for f in gen.funcs],
+                         [ ('max', True)
+                         , ('scale', True)
+                         , ('tally', True) # assigns a variable of the outer level
+                         , ('sum', False) # calls functions
+                         , ('fact', False) # recursive
+                         , ('dummy', False)
+                         ])
+        self.assertFalse(inlinable(gen.code, gen.funcs[0], index, 4))
+
+    def test_run(self):
+        gen = compile_file('test/inline1.pl')
+        expected, count = self.run_vm(gen)
+        inliner = Inliner()
+        self.assertEqual(inliner.run(gen), 6)
+        self.assertEqual(inliner.inlined, 6)
+        self.assertEqual(gen.c_index, len(gen.code) - 1)
+        calls = [code.raddr.addr for code in gen.disassemble() if code.op_code == OpCode.cal]
+        self.assertEqual(sorted(set(calls)), [gen.funcs[3].entry, gen.funcs[4].entry])
+        output, inlined = self.run_vm(gen)
+        self.assertEqual(output, '4416\n1410190120\n')
+        self.assertEqual(output, expected)
+        self.assertTrue(inlined < count, (inlined, count))
+
+        # dead functions are removed after inlining
+        size = len(gen.code)
+        Peephole().run(gen)
+        self.assertTrue(len(gen.code) < size)
+        self.assertEqual(self.run_vm(gen)[0], expected)
+
+    def test_threshold(self):
+        gen = compile_file('test/inline1.pl')
+        self.assertEqual(Inliner(0).run(gen), 0)
+        self.assertEqual(self.run_vm(gen)[0], '4416\n1410190120\n')
+
+    def test_same_output(self):
+        for file_name in ['resources/sample2.pl', 'test/integrate1.pl', 'test/tail1.pl', 'test/memo1.pl']:
+            gen = compile_file(file_name)
+            expected = self.run_vm(gen)[0]
+            Inliner(100).run(gen)
+            self.assertEqual(self.run_vm(gen)[0], expected, file_name)
+
+if __name__ == '__main__':
+    main()
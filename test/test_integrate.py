@@ -1,9 +1,9 @@
 import sys
 from io import StringIO
 from unittest import TestCase, main
-from compiler.getsource import SourceReader
+from compiler.getsource import ReadMode, SourceReader
 from compiler.table import Pl0Table
-from compiler.codegen import Pl0CodeGenerator
+from compiler.codegen import OpCode, Pl0CodeGenerator
 from compiler.compile import Pl0Compiler
 
 class TestIntegrate(TestCase):
@@ -25,6 +25,66 @@ class TestIntegrate(TestCase):
         # Assert
         self.assertEqual(self.buf.getvalue(), '785595\n84361212\n27\n')
 
+    def test_compile_token_stream_and_execute(self):
+        '''
+        Test to compile a token stream read in advance.
+        '''
+        # Setup
+        reader = SourceReader('test/integrate1.pl', ReadMode.Mmap)
+        try:
+            stream = reader.token_stream()
+        finally:
+            reader.close()
+        table = Pl0Table()
+        self.sut = Pl0Compiler(stream, table, Pl0CodeGenerator(table))
+        # Execute
+        self.sut.compile()
+        self.sut.gen.execute()
+        # Assert
+        self.assertEqual(self.buf.getvalue(), '785595\n84361212\n27\n')
+
+    def test_deep_recursion_and_nesting(self):
+        '''
+        Test that the stack and the display grow beyond their initial sizes.
+        '''
+        # Setup
+        self.sut = self.setUpCompiler('test/integrate2.pl')
+        # Execute
+        self.sut.compile()
+        self.sut.gen.execute()
+        # Assert
+        self.assertEqual(self.buf.getvalue(), '4501500\n28\n')
+
+    def test_stack_overflow(self):
+        # Setup
+        self.sut = self.setUpCompiler('test/integrate2.pl')
+        self.sut.gen.max_stack = 5000
+        # Execute
+        self.sut.compile()
+        # Assert
+        with self.assertRaisesRegex(RuntimeError, "stack overflow"):
+            self.sut.gen.execute()
+
+    def test_constant_folding(self):
+        '''
+        Test that constant expressions and conditions are folded in the same way as the machine evaluates them.
+        '''
+        for fold in [False, True]:
+            self.buf.truncate(0)
+            self.buf.seek(0)
+            # Setup
+            self.sut = self.setUpCompiler('test/integrate3.pl')
+            self.sut.fold = fold
+            # Execute
+            self.sut.compile()
+            self.sut.gen.execute()
+            self.sut.reader.close()
+            # Assert
+            self.assertEqual(self.buf.getvalue(), '-3\n-3\n3\n1\n2\n-7\n6\n10\n', fold)
+        codes = self.sut.gen.disassemble()
+        self.assertEqual(sum(1 for code in codes if code.op_code == OpCode.opr), 22)
+        self.assertEqual(sum(1 for code in codes if code.op_code == OpCode.jpc), 3)
+
     def tearDown(self):
         sys.stdout = sys.__stdout__
         if self.sut is not None:
@@ -0,0 +1,74 @@
+from unittest import main
+from compiler.vm import Pl0VM, LIT, LOD, STO, ADD, LS, ICT, JMP, JPC, RET, WRT
+from compiler.jit import Block, find_blocks, find_loops, translate, Pl0TieredVM
+from test.helper import OutputTestCase, compile_file
+
+class TestPl0TieredVM(OutputTestCase):
+    def compile(self, file_name):
+        return compile_file(file_name).code
+
+    # i := 0; while i < 10 do i := i + 1; write i
+    prog = [ (ICT, 3, 0, 0)
+           , (LIT, 0, 0, 0)
+           , (STO, 0, 2, 0)
+           , (LOD, 0, 2, 0)
+           , (LIT, 10, 0, 0)
+           , (LS, 0, 0, 0)
+           , (JPC, 12, 0, 0)
+           , (LOD, 0, 2, 0)
+           , (LIT, 1, 0, 0)
+           , (ADD, 0, 0, 0)
+           , (STO, 0, 2, 0)
+           , (JMP, 3, 0, 0)
+           , (LOD, 0, 2, 0)
+           , (WRT, 0, 0, 0)
+           , (RET, 0, 0, 0)
+           ]
+
+    def test_find_blocks(self):
+        blocks = find_blocks(self.prog)
+        self.assertEqual([(x.start, x.end) for x in blocks], [(0, 1), (1, 3), (3, 7), (7, 12), (12, 14)])
+        self.assertEqual(find_loops(self.prog), {3: 11})
+
+    def test_translate(self):
+        source = translate(self.prog, [Block(0, 7, 12)], 'block_0')
+        self.assertIn('def block_0(stack, display, top):', source)
+        self.assertIn('stack[display[0] + 2] = (t0 + (1))', source)
+        self.assertIn('return (3, top)', source)
+
+    def test_translate_loop(self):
+        source = translate(self.prog, [Block(0, 3, 7), Block(1, 7, 12)], 'block_0')
+        self.assertIn('while True:', source)
+        self.assertIn('pc = 3', source)
+        self.assertIn('return (12, top)', source)
+
+    def test_same_output_as_vm(self):
+        for file_name in [ 'resources/sample1.pl', 'resources/sample2.pl', 'test/integrate1.pl'
+                         , 'test/integrate2.pl', 'test/integrate3.pl', 'test/native1.pl' ]:
+            code = self.compile(file_name)
+            expected = self.output(Pl0VM(code).run)
+            for threshold in [1, 2, 50]:
+                self.assertEqual(self.output(Pl0TieredVM(code, threshold=threshold).run), expected, file_name)
+
+    def test_stats(self):
+        sut = Pl0TieredVM(self.compile('test/integrate2.pl'))
+        sut.run()
+        stats = sut.stats()
+        self.assertTrue(stats['compiled'] > 0)
+        self.assertTrue(stats['hits'] > 0)
+        self.assertEqual(stats['hits'] + stats['misses'], sut.hits + sut.misses)
+
+    def test_cold_program(self):
+        sut = Pl0TieredVM(self.compile('test/integrate2.pl'), threshold=10**9)
+        sut.run()
+        self.assertEqual(sut.compiled, 0)
+        self.assertEqual(sut.hits, 0)
+        self.assertEqual(self.buf.getvalue(), '4501500\n28\n')
+
+    def test_stack_overflow(self):
+        sut = Pl0TieredVM(self.compile('test/integrate2.pl'), max_stack=5000, threshold=1)
+        with self.assertRaisesRegex(RuntimeError, "stack overflow"):
+            sut.run()
+
+if __name__ == '__main__':
+    main()
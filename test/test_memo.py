@@ -0,0 +1,57 @@
+from unittest import main
+from compiler.vm import Pl0VM
+from compiler.optimize import Peephole
+from compiler.memo import Pl0MemoVM
+from test.helper import OutputTestCase, compile_file
+
+class TestPl0MemoVM(OutputTestCase):
+    def test_mark_pure(self):
+        gen = compile_file('test/memo1.pl')
+        self.assertEqual([(f.name, f.pure) for f in gen.funcs],
+                         [ ('fib', True)
+                         , ('odd1', True) # mutually recursive with `even`
+                         , ('even', True)
+                         , ('last', False) # ends without `return`
+                         , ('counted', False) # assigns a variable of the outer level
+                         , ('twice', False) # calls an impure function
+                         , ('dummy', False)
+                         ])
+        self.assertEqual([f.pure for f in compile_file('resources/sample2.pl').funcs], [True] * 4 + [False])
+
+    def test_same_output_as_vm(self):
+        for file_name in [ 'resources/sample2.pl', 'test/integrate1.pl', 'test/integrate2.pl'
+                         , 'test/integrate3.pl', 'test/native1.pl', 'test/memo1.pl' ]:
+            gen = compile_file(file_name)
+            expected = self.output(Pl0VM(gen.code).run)
+            self.assertEqual(self.output(Pl0MemoVM(gen.code, gen.funcs).run), expected, file_name)
+            self.assertEqual(self.output(Pl0MemoVM(gen.code, gen.funcs, size=1).run), expected, file_name)
+            # a function ending without `return` in native1.pl returns the saved `pc`, which moves
+            Peephole().run(gen)
+            expected = self.output(Pl0VM(gen.code).run)
+            self.assertEqual(self.output(Pl0MemoVM(gen.code, gen.funcs).run), expected, file_name)
+
+    def test_stats(self):
+        gen = compile_file('test/memo1.pl')
+        sut = Pl0MemoVM(gen.code, gen.funcs)
+        sut.run()
+        self.assertEqual(self.buf.getvalue(), '6765018\n664\n')
+        stats = sut.stats()
+        self.assertEqual(sorted(stats), ['even@33', 'fib@2', 'odd1@21'])
+        # fib(0) .. fib(20) are executed once
+        self.assertEqual(stats['fib@2'], {'hits': 18, 'misses': 21, 'size': 21})
+
+    def test_lru(self):
+        gen = compile_file('test/memo1.pl')
+        sut = Pl0MemoVM(gen.code, gen.funcs, size=2)
+        sut.run()
+        self.assertEqual(sut.stats()['fib@2']['size'], 2)
+        self.assertEqual(self.buf.getvalue(), '6765018\n664\n')
+
+    def test_deep_recursion(self):
+        gen = compile_file('test/integrate2.pl')
+        sut = Pl0MemoVM(gen.code, gen.funcs, max_stack=5000)
+        with self.assertRaisesRegex(RuntimeError, "stack overflow"):
+            sut.run()
+
+if __name__ == '__main__':
+    main()
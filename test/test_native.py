@@ -0,0 +1,49 @@
+from unittest import main
+from compiler.vm import Pl0VM
+from compiler.native import Pl0Native
+from test.helper import OutputTestCase, compile_file
+
+class TestPl0Native(OutputTestCase):
+    def test_translate(self):
+        sut = Pl0Native(compile_file('resources/sample1.pl'))
+        self.assertIn('def f_plus_2(a1_2, a1_1):', sut.source)
+        self.assertIn('return (v1_2 + v1_3)', sut.source)
+        self.assertIn('write(str(f_plus_2(7, 8)))', sut.source)
+
+    def test_same_output_as_vm(self):
+        for file_name in [ 'resources/sample1.pl', 'resources/sample2.pl', 'test/integrate1.pl'
+                         , 'test/integrate2.pl', 'test/integrate3.pl', 'test/native2.pl', 'test/tail1.pl' ]:
+            for fold in [True, False]:
+                gen = compile_file(file_name, fold)
+                expected = self.output(Pl0VM(gen.code).run)
+                self.assertEqual(self.output(Pl0Native(gen).run), expected, file_name)
+
+    def test_uplevel_access_and_loops(self):
+        Pl0Native(compile_file('test/native2.pl')).run()
+        self.assertEqual(self.buf.getvalue().split('\n')[:2], ['40', '3'])
+
+    def test_call_enclosing_function(self):
+        # `odd1` calls `even`, which encloses it, at the start of `even`
+        Pl0Native(compile_file('test/native2.pl')).run()
+        self.assertEqual(self.buf.getvalue().split('\n')[2], '01')
+
+    def test_falling_off(self):
+        # `g` ends without `return`
+        with self.assertRaisesRegex(RuntimeError, "function g may end without return"):
+            Pl0Native(compile_file('test/native1.pl'))
+
+    def test_tail_calls(self):
+        sut = Pl0Native(compile_file('test/tail1.pl'))
+        # tail calls of a function without loops continue a loop, and others call the function
+        self.assertIn('a1_1, a1_2 = (a1_1 + 1), (a1_2 - 1)', sut.source)
+        self.assertIn('return f_down_66((a1_1 - 1))', sut.source)
+        sut.run()
+        self.assertEqual(self.buf.getvalue(), '122000021\n1100\n')
+
+    def test_too_deep_calls(self):
+        sut = Pl0Native(compile_file('test/integrate2.pl'), max_depth=1000)
+        with self.assertRaisesRegex(RuntimeError, "too deep calls"):
+            sut.run()
+
+if __name__ == '__main__':
+    main()
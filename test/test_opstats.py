@@ -0,0 +1,85 @@
+import os
+import tempfile
+from unittest import TestCase, main
+from compiler.table import RelAddr
+from compiler.codegen import OpCode, Operator, ValInst, RefInst, OpInst
+from compiler.output import MemorySink
+from compiler.opstats import OpStats, STATIC, DYNAMIC, op_name, load, dump, accumulate
+from test.helper import compile_file
+
+class TestOpStats(TestCase):
+    def test_op_name(self):
+        self.assertEqual(op_name(ValInst(OpCode.lit, 1)), 'lit')
+        self.assertEqual(op_name(RefInst(OpCode.lod, RelAddr(0, 2))), 'lod')
+        self.assertEqual(op_name(OpInst(Operator.add)), 'add')
+
+    def test_static(self):
+        sut = OpStats(STATIC, (1, 2))
+        sut.add_codes([ RefInst(OpCode.lod, RelAddr(0, 2))
+                      , ValInst(OpCode.lit, 1)
+                      , OpInst(Operator.add)
+                      , RefInst(OpCode.lod, RelAddr(0, 2))
+                      , ValInst(OpCode.lit, 2)
+                      ])
+        self.assertEqual(sut.total(), 5)
+        self.assertEqual(sut.most_common(1, 1), [(('lod',), 2)])
+        self.assertEqual(dict(sut.grams[2]), {('lod', 'lit'): 2, ('lit', 'add'): 1, ('add', 'lod'): 1})
+        with self.assertRaisesRegex(RuntimeError, "only in the dynamic mode"):
+            sut.trace([])
+
+    def test_dynamic(self):
+        gen = compile_file('resources/sample2.pl')
+        sut = OpStats(DYNAMIC)
+        out = MemorySink()
+        gen.execute(out, sut)
+        self.assertEqual(out.getvalue(), '785595\n84361212\n27\n')
+        self.assertEqual(sut.runs, 1)
+        self.assertEqual(sut.total(), 582)
+        # every code but the first two starts a trigram
+        self.assertEqual(sum(sut.grams[2].values()), 581)
+        self.assertEqual(sum(sut.grams[3].values()), 580)
+        self.assertEqual(sut.grams[1][('cal',)], sut.grams[1][('ret',)] - 1)
+
+    def test_dynamic_grow(self):
+        # the stack is grown in deep recursion, and the failed code is counted once
+        gen = compile_file('test/integrate2.pl')
+        sut = OpStats(DYNAMIC)
+        gen.execute(MemorySink(), sut)
+        self.assertEqual(sum(sut.grams[2].values()), sut.total() - 1)
+        self.assertEqual(sut.grams[1][('cal',)], sut.grams[1][('ret',)] - 1)
+
+    def test_merge(self):
+        codes = compile_file('resources/sample2.pl').disassemble()
+        one = OpStats()
+        one.add_codes(codes)
+        two = OpStats()
+        two.add_codes(codes)
+        two.add_codes(codes)
+        merged = OpStats().merge(one).merge(one)
+        merged.add_codes(codes)
+        self.assertEqual(merged.runs, 3)
+        self.assertEqual(merged, one.merge(two))
+        with self.assertRaisesRegex(RuntimeError, "can not merge"):
+            merged.merge(OpStats(DYNAMIC))
+        with self.assertRaisesRegex(RuntimeError, "can not merge"):
+            merged.merge(OpStats(STATIC, (1, 2)))
+
+    def test_json(self):
+        gen = compile_file('resources/sample2.pl')
+        sut = OpStats(DYNAMIC)
+        gen.execute(MemorySink(), sut)
+        self.assertEqual(OpStats.loads(sut.dumps()), sut)
+        with tempfile.TemporaryDirectory() as d:
+            file_name = os.path.join(d, 'stats.json')
+            accumulate(sut, file_name)
+            accumulate(sut, file_name)
+            stats = load(file_name)
+            self.assertEqual(stats.runs, 2)
+            self.assertEqual(stats.total(), 2 * 582)
+            dump(sut, file_name)
+            self.assertEqual(load(file_name), sut)
+        with self.assertRaisesRegex(RuntimeError, "unsupported version"):
+            OpStats.loads('{"version": 0}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+from unittest import main
+from compiler.table import RelAddr, FuncEntry, Pl0Table
+from compiler.codegen import OpCode, Operator, ValInst, RefInst, OpInst, RetInst, assemble
+from compiler.vm import Pl0VM
+from compiler.optimize import thread_jumps, invert_branches, remove_dead_codes, fold_pairs, compact, Peephole
+from test.helper import OutputTestCase, compile_file
+
+class TestPeephole(OutputTestCase):
+    def test_thread_jumps(self):
+        codes = [ ValInst(OpCode.jmp, 1)
+                , ValInst(OpCode.jmp, 3)
+                , ValInst(OpCode.lit, 0)
+                , ValInst(OpCode.jpc, 4)
+                , RetInst(0, 0)
+                ]
+        self.assertEqual(thread_jumps(codes), 2)
+        self.assertEqual(codes, [ ValInst(OpCode.jmp, 3)
+                                , ValInst(OpCode.jmp, 3)
+                                , ValInst(OpCode.lit, 0)
+                                , ValInst(OpCode.ict, -1)
+                                , RetInst(0, 0)
+                                ])
+
+    def test_invert_branches(self):
+        codes = [ RefInst(OpCode.lod, RelAddr(0, 2))
+                , ValInst(OpCode.lit, 0)
+                , OpInst(Operator.ls)
+                , ValInst(OpCode.jpc, 5)
+                , ValInst(OpCode.jmp, 7)
+                , OpInst(Operator.wrl)
+                , ValInst(OpCode.jmp, 0)
+                , RetInst(0, 0)
+                ]
+        self.assertEqual(invert_branches(codes), 1)
+        self.assertEqual(codes[2:5], [OpInst(Operator.greq), ValInst(OpCode.jpc, 7), None])
+
+    def test_remove_dead_codes(self):
+        codes = [ ValInst(OpCode.jmp, 3)
+                , OpInst(Operator.wrl) # never reached
+                , RetInst(1, 0)        # never reached
+                , ValInst(OpCode.ict, 2)
+                , RetInst(0, 0)
+                , OpInst(Operator.wrl) # after ret
+                ]
+        self.assertEqual(remove_dead_codes(codes), 3)
+        self.assertEqual(codes, [ValInst(OpCode.jmp, 3), None, None, ValInst(OpCode.ict, 2), RetInst(0, 0), None])
+
+    def test_fold_pairs(self):
+        codes = [ ValInst(OpCode.ict, 0)
+                , RefInst(OpCode.lod, RelAddr(0, 2))
+                , RefInst(OpCode.sto, RelAddr(0, 2))
+                , ValInst(OpCode.lit, 5)
+                , OpInst(Operator.neg)
+                , ValInst(OpCode.lit, 0)
+                , OpInst(Operator.add)
+                , ValInst(OpCode.lit, 1)
+                , OpInst(Operator.mul)
+                , OpInst(Operator.wrt)
+                ]
+        self.assertEqual(fold_pairs(codes), 5)
+        self.assertEqual([code for code in codes if code is not None],
+                         [ValInst(OpCode.lit, -5), OpInst(Operator.wrt)])
+
+    def test_fold_pairs_keeps_target(self):
+        codes = [ RefInst(OpCode.lod, RelAddr(0, 2))
+                , RefInst(OpCode.sto, RelAddr(0, 2))
+                , ValInst(OpCode.jmp, 1)
+                ]
+        self.assertEqual(fold_pairs(codes), 0)
+
+    def test_compact(self):
+        table = Pl0Table()
+        table.table.append(FuncEntry('f', RelAddr(0, 3)))
+        codes = [ ValInst(OpCode.jmp, 4)
+                , None
+                , None
+                , ValInst(OpCode.ict, 2)
+                , RefInst(OpCode.cal, RelAddr(0, 3))
+                , ValInst(OpCode.jpc, 1)
+                ]
+        self.assertEqual(compact(codes, table), [ ValInst(OpCode.jmp, 2)
+                                                , ValInst(OpCode.ict, 2)
+                                                , RefInst(OpCode.cal, RelAddr(0, 1))
+                                                , ValInst(OpCode.jpc, 1)
+                                                ])
+        self.assertEqual(table.table[1].raddr, RelAddr(0, 1))
+
+    def test_run(self):
+        for file_name, expected in [ ('resources/sample2.pl', '785595\n84361212\n27\n')
+                                   , ('test/integrate1.pl', '785595\n84361212\n27\n')
+                                   , ('test/integrate2.pl', '4501500\n28\n')
+                                   ]:
+            gen = compile_file(file_name)
+            size = len(gen.code)
+            removed = Peephole().run(gen)
+            self.assertTrue(removed > 0, file_name)
+            self.assertEqual(len(gen.code), size - removed)
+            self.assertEqual(gen.c_index, len(gen.code) - 1)
+            self.assertEqual(self.output(Pl0VM(gen.code).run), expected, file_name)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import sys
+from io import StringIO
+from unittest import TestCase, main
+from compiler.vm import Pl0VM
+from compiler.jit import Pl0TieredVM
+from compiler.native import Pl0Native
+from compiler.output import StreamSink, LineSink, BufferedSink, MemorySink
+from test.helper import compile_file
+
+class CountingStream(StringIO):
+    def __init__(self):
+        super().__init__()
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+class TestSinks(TestCase):
+    def test_stream_sink(self):
+        stream = CountingStream()
+        sut = StreamSink(stream)
+        sut.write('12')
+        sut.write('\n')
+        self.assertEqual((stream.getvalue(), stream.flushes), ('12\n', 2))
+
+    def test_line_sink(self):
+        stream = CountingStream()
+        sut = LineSink(stream)
+        for s in ['1', '2', '\n', '3']:
+            sut.write(s)
+        self.assertEqual((stream.getvalue(), stream.flushes), ('12\n3', 1))
+
+    def test_buffered_sink(self):
+        r, w = os.pipe()
+        try:
+            sut = BufferedSink(w, size=4)
+            sut.write('12')
+            self.assertEqual(sut.length, 2)
+            sut.write('-345')
+            self.assertEqual(os.read(r, 100), b'12-345')
+            sut.write('\n')
+            sut.close()
+            self.assertEqual(os.read(r, 100), b'\n')
+        finally:
+            os.close(r)
+            os.close(w)
+
+    def test_same_output_of_engines(self):
+        gen = compile_file('test/integrate2.pl')
+        expected = '4501500\n28\n'
+        for run in [ lambda out: Pl0VM(gen.code, out=out).run()
+                   , lambda out: Pl0VM(gen.code, superinstructions=False, out=out).run()
+                   , lambda out: Pl0TieredVM(gen.code, threshold=1, out=out).run()
+                   , lambda out: Pl0Native(gen, out=out).run()
+                   , lambda out: gen.execute(out)
+                   ]:
+            out = MemorySink()
+            run(out)
+            self.assertEqual(out.getvalue(), expected)
+
+    def test_flush_on_error(self):
+        out = CountingStream()
+        sut = Pl0VM(compile_file('test/integrate2.pl').code, max_stack=5000, out=StreamSink(out))
+        with self.assertRaises(RuntimeError):
+            sut.run()
+        self.assertEqual(out.flushes, 1)
+
+    def test_default_sink(self):
+        buf = StringIO()
+        sys.stdout = buf
+        try:
+            Pl0VM(compile_file('test/integrate2.pl').code).run()
+        finally:
+            sys.stdout = sys.__stdout__
+        self.assertEqual(buf.getvalue(), '4501500\n28\n')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import json
+import sys
+from io import StringIO
+from unittest import TestCase, main
+from compiler.phases import Phases
+import main as pl0
+
+class TestPhases(TestCase):
+    def setUp(self):
+        self.buf = StringIO()
+        self.err = StringIO()
+        sys.stdout = self.buf
+        sys.stderr = self.err
+
+    def test_disabled(self):
+        sut = Phases()
+        with sut.phase('read'):
+            pass
+        sut.count('tokens', 1)
+        self.assertFalse(sut.enabled)
+        self.assertEqual(sut.to_dict(), {'phases': {}})
+
+    def test_phase(self):
+        sut = Phases(stats=True)
+        with sut.phase('read'):
+            data = [0] * 10000
+        with sut.phase('read'):
+            pass
+        sut.count('tokens', 3)
+        self.assertEqual(list(sut.phases['read']), ['peak_bytes'])
+        self.assertTrue(sut.phases['read']['peak_bytes'] >= 8 * len(data))
+        self.assertEqual(json.loads(sut.dumps(file='x'))['counts'], {'tokens': 3})
+        with self.assertRaises(ValueError):
+            with sut.phase('execute'):
+                raise ValueError()
+        self.assertIn('execute', sut.phases)
+
+    def test_timings(self):
+        sut = Phases(timings=True)
+        with sut.phase('compile'):
+            pass
+        sut.count('tokens', 3)
+        self.assertEqual(list(sut.phases['compile']), ['seconds'])
+        self.assertEqual(sut.to_dict(), {'phases': sut.phases})
+
+    def test_timings_and_stats(self):
+        # time would be measured while tracing memory
+        with self.assertRaisesRegex(RuntimeError, "separate runs"):
+            Phases(timings=True, stats=True)
+
+    def test_main(self):
+        for engine, executed in [('vm', 582), ('execute', 582), ('python', None)]:
+            self.err.truncate(0)
+            self.err.seek(0)
+            pl0.main('resources/sample2.pl', engine=engine, stats=True)
+            report = json.loads(self.err.getvalue())
+            self.assertEqual(report['file'], 'resources/sample2.pl')
+            self.assertEqual(sorted(report['phases']), ['compile', 'execute', 'read'])
+            self.assertEqual(report['counts'].get('executed'), executed)
+            self.assertEqual(report['counts']['tokens'], 325)
+            self.assertEqual(report['counts']['codes'], 167)
+            self.assertEqual(report['counts']['table_entries'], 8)
+        self.assertEqual(self.buf.getvalue(), '785595\n84361212\n27\n' * 3)
+
+    def test_main_timings(self):
+        pl0.main('resources/sample2.pl', timings=True)
+        report = json.loads(self.err.getvalue())
+        self.assertEqual(sorted(report['phases']), ['compile', 'execute', 'read'])
+        self.assertEqual(list(report['phases']['execute']), ['seconds'])
+        self.assertNotIn('counts', report)
+
+    def test_main_without_report(self):
+        pl0.main('resources/sample2.pl')
+        self.assertEqual(self.err.getvalue(), '')
+
+    def tearDown(self):
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+
+if __name__ == '__main__':
+    main()
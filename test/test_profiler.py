@@ -0,0 +1,76 @@
+from unittest import main
+from compiler.vm import Pl0VM
+from compiler.profiler import Pl0ProfileVM
+from test.helper import OutputTestCase, compile_file
+
+class Clock:
+    '''
+    Clock which advances a second whenever it is read.
+    '''
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1.0
+        return self.now
+
+class TestPl0ProfileVM(OutputTestCase):
+    def test_same_output_as_vm(self):
+        for file_name in ['resources/sample2.pl', 'test/integrate1.pl', 'test/integrate2.pl', 'test/tail1.pl']:
+            gen = compile_file(file_name)
+            expected = self.output(Pl0VM(gen.code).run)
+            sut = Pl0ProfileVM(gen.code, gen.funcs)
+            self.assertEqual(self.output(sut.run), expected, file_name)
+            self.assertEqual(sum(sut.counts), sut.executed, file_name)
+            self.assertEqual(sum(p.codes for p in sut.funcs.values()), sut.executed, file_name)
+            self.assertEqual(sut.frames, [], file_name)
+
+    def test_counts(self):
+        gen = compile_file('resources/sample2.pl')
+        sut = Pl0ProfileVM(gen.code, gen.funcs)
+        sut.run()
+        self.assertEqual(sut.executed, 582)
+        self.assertEqual(sut.counts[0], 1)
+        self.assertEqual([(p.name, p.calls, p.codes) for p in sorted(sut.funcs.values(), key=lambda p: p.entry)],
+                         [ ('multiply', 1, 141)
+                         , ('divide', 2, 196)
+                         , ('gcd', 2, 126) # the recursive call is a tail call
+                         , ('gcd2', 1, 75)
+                         , ('main', 1, 44)
+                         ])
+        self.assertEqual(sut.collapsed(), 'main 44\nmain;divide 196\nmain;gcd 126\nmain;gcd2 75\nmain;multiply 141\n')
+
+    def test_time(self):
+        gen = compile_file('test/tail1.pl')
+        sut = Pl0ProfileVM(gen.code, gen.funcs, clock=Clock())
+        sut.run()
+        notail = [p for p in sut.funcs.values() if p.name == 'notail'][0]
+        self.assertEqual(notail.calls, 101)
+        # 101 nested calls read the clock 202 times, so the outermost one takes 201 ticks,
+        # and recursive calls are not counted again in the inclusive time
+        self.assertEqual(notail.inclusive, 201.0)
+        self.assertEqual(notail.exclusive, 201.0)
+        self.assertEqual(sut.main.inclusive, sum(p.exclusive for p in sut.funcs.values()))
+        self.assertIn('main;notail;notail 12\n', sut.collapsed())
+
+    def test_report(self):
+        gen = compile_file('resources/sample2.pl')
+        sut = Pl0ProfileVM(gen.code, gen.funcs)
+        sut.run()
+        lines = sut.report(top_codes=3).splitlines()
+        self.assertTrue(lines[0].startswith('582 codes executed in '))
+        self.assertEqual([line.split()[0] for line in lines[3:8]],
+                         sorted(['main@124', 'divide@32', 'multiply@2', 'gcd@76', 'gcd2@100'],
+                                key=lambda name: -sut.funcs[int(name.split('@')[1])].exclusive))
+        self.assertEqual(lines[10].split()[:2], ['77', '10'])
+        self.assertEqual(len(lines), 13)
+
+    def test_without_funcs(self):
+        gen = compile_file('resources/sample2.pl')
+        sut = Pl0ProfileVM(gen.code)
+        self.assertEqual(self.output(sut.run), '785595\n84361212\n27\n')
+        self.assertEqual(sorted((p.name, p.entry, p.calls) for p in sut.funcs.values()),
+                         [('f', 2, 1), ('f', 32, 2), ('f', 76, 2), ('f', 100, 1), ('main', 0, 1)])
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import asyncio
+from unittest import TestCase, main
+from compiler.output import MemorySink
+from compiler.vm import Pl0VM, CountingProg
+from compiler.resumable import Pl0ResumableVM, Pl0Scheduler, BudgetExceeded
+from test.helper import compile_file, compile_text
+
+SAMPLE2 = '785595\n84361212\n27\n'
+
+COUNTER = '''
+var i;
+begin
+  i := 0;
+  while i < %d do
+  begin
+    write i;
+    i := i + 1
+  end
+end.
+'''
+
+class TestPl0ResumableVM(TestCase):
+    def test_run_to_end(self):
+        out = MemorySink()
+        sut = Pl0ResumableVM(compile_file('resources/sample2.pl').code, out=out)
+        self.assertTrue(sut.run())
+        self.assertTrue(sut.finished)
+        self.assertEqual(out.getvalue(), SAMPLE2)
+
+    def test_resume(self):
+        code = compile_file('resources/sample2.pl').code
+        for superinstructions in (True, False):
+            out = MemorySink()
+            sut = Pl0ResumableVM(code, superinstructions=superinstructions, out=out)
+            runs = 1
+            while not sut.run(7):
+                runs += 1
+            self.assertEqual(out.getvalue(), SAMPLE2)
+            self.assertEqual(runs, (sut.state.executed + 6) // 7)
+            self.assertTrue(sut.run(7))
+
+    def test_executed(self):
+        code = compile_file('resources/sample2.pl').code
+        sut = Pl0ResumableVM(code, superinstructions=False, out=MemorySink())
+        sut.run()
+        vm = Pl0VM(code, superinstructions=False, out=MemorySink())
+        vm.prog = CountingProg(vm.prog)
+        vm.run()
+        self.assertEqual(sut.state.executed, vm.prog.count)
+
+    def test_grow(self):
+        # recursion grows the stack while the program is suspended and resumed
+        out = MemorySink()
+        sut = Pl0ResumableVM(compile_file('test/tail1.pl').code, out=out)
+        while not sut.run(3):
+            pass
+        expect = MemorySink()
+        Pl0VM(compile_file('test/tail1.pl').code, out=expect).run()
+        self.assertEqual(out.getvalue(), expect.getvalue())
+
+    def test_budget(self):
+        code = compile_text(COUNTER % 1000).code
+        out = MemorySink()
+        sut = Pl0ResumableVM(code, out=out, budget=100)
+        with self.assertRaises(BudgetExceeded):
+            while not sut.run(30):
+                pass
+        self.assertEqual(sut.state.executed, 100)
+        self.assertFalse(sut.finished)
+        with self.assertRaises(BudgetExceeded):
+            sut.run()
+        sut = Pl0ResumableVM(compile_text(COUNTER % 3).code, out=MemorySink(), budget=100)
+        self.assertTrue(sut.run())
+
+class TestPl0Scheduler(TestCase):
+    def test_interleave(self):
+        code = compile_text(COUNTER % 5).code
+        out = MemorySink()
+        # programs write to the same sink in turn
+        vms = [Pl0ResumableVM(code, superinstructions=False, out=out) for _ in range(3)]
+        sut = Pl0Scheduler(quantum=4)
+        results = sut.run(vms)
+        self.assertTrue(all(state.finished for state in results))
+        self.assertEqual(out.getvalue(), '000111222333444')
+        self.assertGreater(sut.switches, 0)
+
+    def test_many_programs(self):
+        codes = [compile_text(COUNTER % n).code for n in range(1, 11)]
+        outs = [MemorySink() for _ in range(2000)]
+        vms = [Pl0ResumableVM(codes[i % 10], out=out) for i, out in enumerate(outs)]
+        results = Pl0Scheduler(quantum=50).run(vms)
+        self.assertTrue(all(state.finished for state in results))
+        for i, out in enumerate(outs):
+            self.assertEqual(out.getvalue(), ''.join(str(k) for k in range(i % 10 + 1)))
+
+    def test_budget_and_errors(self):
+        vms = [Pl0ResumableVM(compile_text(COUNTER % 1000).code, out=MemorySink(), budget=500),
+               Pl0ResumableVM(compile_text('var x; begin x := 0; x := 1 / x end.').code, out=MemorySink()),
+               Pl0ResumableVM(compile_file('resources/sample2.pl').code, out=MemorySink())]
+        results = Pl0Scheduler(quantum=10).run(vms)
+        self.assertIsInstance(results[0], BudgetExceeded)
+        self.assertIsInstance(results[1], ZeroDivisionError)
+        self.assertTrue(results[2].finished)
+        self.assertEqual(vms[2].out.getvalue(), SAMPLE2)
+
+    def test_other_tasks(self):
+        # a program never blocks other tasks of the event loop
+        ticks = []
+        async def tick():
+            for i in range(3):
+                ticks.append(i)
+                await asyncio.sleep(0)
+        async def run():
+            vm = Pl0ResumableVM(compile_text(COUNTER % 100).code, out=MemorySink())
+            task = asyncio.ensure_future(tick())
+            await Pl0Scheduler(quantum=10).execute(vm)
+            self.assertEqual(ticks, [0, 1, 2])
+            await task
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    main()
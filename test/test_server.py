@@ -0,0 +1,157 @@
+import os
+import sys
+import tempfile
+import threading
+from unittest import TestCase, main
+from compiler.server import Pl0Server, MemoryCache, compile_bytes, ENGINES
+from compiler.native import MAX_DEPTH
+from compiler import bytecode
+import client
+
+RECURSE = '''
+function down(n)
+begin
+  if n = 0 then return 0;
+  return 1 + down(n - 1)
+end;
+begin
+  write down(5000); writeln
+end.
+'''
+
+class ServerTestCase(TestCase):
+    budget = None
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'pl0d.sock')
+        self.limit = sys.getrecursionlimit()
+        self.server = Pl0Server(self.path, workers=2, budget=self.budget)
+        self.server.bind()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(10)
+        self.assertFalse(self.thread.is_alive())
+        self.assertEqual(sys.getrecursionlimit(), self.limit)
+        self.dir.cleanup()
+
+    def write(self, name, source):
+        file_name = os.path.join(self.dir.name, name)
+        with open(file_name, 'w') as f:
+            f.write(source)
+        return file_name
+
+    def request(self, file_name, **options):
+        return client.request(self.path, client.build_request(file_name, **options))
+
+class TestPl0Server(ServerTestCase):
+    def test_source(self):
+        response = self.request('resources/sample2.pl')
+        self.assertTrue(response['ok'])
+        self.assertEqual(response['output'], '785595\n84361212\n27\n')
+        self.assertFalse(response['cached'])
+        self.assertIn('compile', response['timings'])
+        self.assertIn('execute', response['timings'])
+
+    def test_cache_hit(self):
+        self.request('resources/sample2.pl')
+        response = self.request('resources/sample2.pl', engine='execute', optimize=True)
+        self.assertTrue(response['ok'])
+        self.assertTrue(response['cached'])
+        self.assertNotIn('compile', response['timings'])
+        self.assertEqual(response['output'], '785595\n84361212\n27\n')
+        response = self.request('resources/sample2.pl', fold=False)
+        self.assertFalse(response['cached'])
+        self.assertEqual(self.server.cache.stats(), {'hits': 1, 'misses': 2, 'size': 2})
+
+    def test_engines(self):
+        for engine in client.ENGINES:
+            response = self.request('test/inline1.pl', engine=engine)
+            self.assertEqual(response['output'], '4416\n1410190120\n', engine)
+
+    def test_compiled_program(self):
+        with open('resources/sample2.pl', 'rb') as f:
+            data = f.read()
+        file_name = os.path.join(self.dir.name, 'sample2' + bytecode.EXTENSION)
+        with open(file_name, 'wb') as f:
+            f.write(compile_bytes(data))
+        response = self.request(file_name)
+        self.assertEqual(response['output'], '785595\n84361212\n27\n')
+
+    def test_error(self):
+        file_name = os.path.join(self.dir.name, 'error.pl')
+        with open(file_name, 'w') as f:
+            f.write('var x; begin x := 1; write x; writeln; x := x / 0 end.')
+        response = self.request(file_name)
+        self.assertFalse(response['ok'])
+        self.assertEqual(response['output'], '1\n')
+        self.assertIn('ZeroDivisionError', response['error'])
+        response = self.request('resources/sample2.pl', engine='python', optimize=True)
+        self.assertFalse(response['ok'])
+        self.assertIn('python engine', response['error'])
+
+    def test_concurrent_native(self):
+        # the recursion limit is not changed by each run of concurrent threads
+        file_name = self.write('recurse.pl', RECURSE)
+        responses = []
+        def run():
+            for _ in range(10):
+                responses.append(self.request(file_name, engine='python'))
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(60)
+        self.assertEqual(sys.getrecursionlimit(), max(self.limit, MAX_DEPTH))
+        self.assertEqual([(r['ok'], r['output']) for r in responses], [(True, '5000\n')] * 40)
+
+    def test_concurrent_requests(self):
+        responses = []
+        def run():
+            responses.append(self.request('resources/sample2.pl'))
+        threads = [threading.Thread(target=run) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(10)
+        self.assertEqual([r['output'] for r in responses], ['785595\n84361212\n27\n'] * 8)
+
+class TestBudget(ServerTestCase):
+    budget = 10000
+
+    def test_engines(self):
+        for engine in ENGINES:
+            response = self.request('test/inline1.pl', engine=engine)
+            if engine in ('vm', 'execute'):
+                self.assertEqual(response['output'], '4416\n1410190120\n', engine)
+            else:
+                self.assertIn('can not stop programs', response['error'], engine)
+
+    def test_infinite_loop(self):
+        file_name = self.write('loop.pl', 'var x; begin x := 0; while 1 = 1 do x := x + 1 end.')
+        for engine in ('vm', 'execute'):
+            response = self.request(file_name, engine=engine)
+            self.assertFalse(response['ok'])
+            self.assertIn('BudgetExceeded', response['error'])
+        # a request can lower the budget
+        response = self.request('resources/sample2.pl', budget=10)
+        self.assertIn('max 10)', response['error'])
+        response = self.request('resources/sample2.pl', budget=10 ** 9)
+        self.assertTrue(response['ok'])
+
+class TestMemoryCache(TestCase):
+    def test_lru(self):
+        sut = MemoryCache(2)
+        sut.put('a', b'1')
+        sut.put('b', b'2')
+        self.assertEqual(sut.get('a'), b'1')
+        sut.put('c', b'3')
+        self.assertIsNone(sut.get('b'))
+        self.assertEqual(sut.get('a'), b'1')
+        self.assertEqual(sut.stats(), {'hits': 2, 'misses': 1, 'size': 2})
+
+if __name__ == '__main__':
+    main()
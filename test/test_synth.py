@@ -0,0 +1,49 @@
+import os
+from unittest import TestCase, main
+from compiler.vm import Pl0VM
+from compiler.native import Pl0Native
+from compiler.output import MemorySink
+from bench.synth import Generator, generate, parse_size
+from test.helper import compile_text
+
+class TestGenerator(TestCase):
+    def test_reproducible(self):
+        self.assertEqual(generate(1), generate(1))
+        self.assertNotEqual(generate(1), generate(2))
+        self.assertNotEqual(generate(1), generate(1, stmts=3))
+
+    def test_valid(self):
+        for seed, params in [ (0, {'budget': 1000})
+                            , (1, {'decls': 0, 'funcs': 1, 'depth': 0})
+                            , (2, {'depth': 4, 'expr_depth': 5, 'budget': 1000})
+                            , (3, {'funcs': 20, 'stmts': 12, 'expr_depth': 1, 'budget': 1000})
+                            , (4, {'loops': 10, 'budget': 100})
+                            ]:
+            gen = compile_text(generate(seed, **params))
+            out = MemorySink()
+            Pl0VM(gen.code, out=out).run()
+            self.assertTrue(out.getvalue().endswith('\n'), seed)
+            expected = MemorySink()
+            gen.execute(expected)
+            self.assertEqual(out.getvalue(), expected.getvalue(), seed)
+            native = MemorySink()
+            Pl0Native(gen, out=native).run()
+            self.assertEqual(out.getvalue(), native.getvalue(), seed)
+
+    def test_params(self):
+        gen = compile_text(generate(5, funcs=3, depth=2))
+        self.assertEqual(len(gen.funcs), 3 * 2 + 1)
+        self.assertEqual(max(f.level for f in gen.funcs), 2)
+
+    def test_size(self):
+        source = generate(6, size=20000)
+        self.assertTrue(20000 <= len(source) < 30000, len(source))
+        compile_text(source)
+        with open(os.devnull, 'w') as f:
+            self.assertEqual(Generator(6).write(f, 20000), len(source))
+        self.assertEqual(parse_size('10K'), 10000)
+        self.assertEqual(parse_size('1.5M'), 1500000)
+        self.assertEqual(parse_size('123'), 123)
+
+if __name__ == '__main__':
+    main()
@@ -84,6 +84,68 @@ class TestTable(TestCase):
         self.assertEqual(self.sut.search('x', IdKind.Par), 4)
         self.sut.t_index = original_ti
 
+    def test_search_shadowing(self):
+        # Execute and Assert
+        self.sut.block_begin(2)
+        self.sut.enter_var('x')
+        self.sut.enter_const('y', 1)
+        ti = self.sut.enter_func('f', 10)
+        self.sut.block_begin(2)
+        self.sut.enter_par('x')
+        self.sut.end_par()
+        self.assertEqual(self.sut.search('x', IdKind.Par), 4)
+        self.assertEqual(self.sut.search('y', IdKind.Const), 2)
+        self.assertEqual(self.sut.search('f', IdKind.Func), ti)
+        self.sut.enter_var('y')
+        self.sut.enter_func('g', 11)
+        self.sut.block_begin(2)
+        self.sut.enter_var('x')
+        self.assertEqual(self.sut.search('x', IdKind.Var), 7)
+        self.assertEqual(self.sut.search('y', IdKind.Var), 5)
+        self.sut.block_end()
+        self.assertEqual(self.sut.search('x', IdKind.Par), 4)
+        self.assertEqual(self.sut.search('g', IdKind.Func), 6)
+        self.sut.block_end()
+        # entries of `f` become invisible
+        self.assertEqual(self.sut.search('x', IdKind.Var), 1)
+        self.assertEqual(self.sut.search('y', IdKind.Const), 2)
+        with self.assertRaises(RuntimeError):
+            self.sut.search('g', IdKind.Func)
+        # new entries overwrite invisible ones
+        self.sut.enter_var('z')
+        self.assertEqual(self.sut.search('z', IdKind.Var), 4)
+        self.assertEqual(self.sut.table[4], VarEntry('z', RelAddr(0, 3)))
+
+    def test_deep_nesting(self):
+        # Execute
+        self.sut.block_begin(2)
+        for i in range(20):
+            self.sut.enter_func('f%d' % i, i)
+            self.sut.block_begin(2)
+            self.sut.enter_var('x')
+        # Assert
+        self.assertEqual(self.sut.b_level(), 20)
+        self.assertEqual(self.sut.reladdr(self.sut.search('x', IdKind.Var)), RelAddr(20, 2))
+        for i in range(20):
+            self.sut.block_end()
+        self.assertEqual(self.sut.search('f0', IdKind.Func), 1)
+        self.assertEqual(self.sut.frame_l(), 2)
+
+    def test_limits(self):
+        # Setup
+        self.sut = Pl0Table(max_table=4, max_level=3)
+        self.sut.block_begin(2)
+        # Execute and Assert
+        self.sut.enter_func('f', 0)
+        self.sut.block_begin(2)
+        self.sut.enter_func('g', 0)
+        self.sut.block_begin(2)
+        with self.assertRaisesRegex(RuntimeError, "too deep"):
+            self.sut.block_begin(2)
+        self.sut.enter_var('x')
+        with self.assertRaisesRegex(RuntimeError, "too many"):
+            self.sut.enter_var('y')
+
     def tearDown(self):
         pass
 
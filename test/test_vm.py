@@ -0,0 +1,145 @@
+from unittest import TestCase, main
+from compiler.table import RelAddr
+from compiler.codegen import OpCode, Operator, ValInst, RefInst, OpInst, RetInst, assemble
+from compiler.output import MemorySink
+from compiler.optimize import Peephole
+from compiler.vm import Pl0VM, predecode, fuse, LIT, LOD, CAL, RET, ADD, WRT,\
+                       INC, STO_VV, JPC_VK, CAL_ICT, ICT, NAMES
+from compiler.memo import Pl0MemoVM
+from compiler.jit import Pl0TieredVM
+from compiler.profiler import Pl0ProfileVM
+from compiler.resumable import Pl0ResumableVM
+from test.helper import OutputTestCase, compile_file
+
+class TestPl0VM(OutputTestCase):
+    def compile(self, file_name, tail_calls=True):
+        return compile_file(file_name, tail_calls=tail_calls).code
+
+    def test_predecode(self):
+        code = assemble([ ValInst(OpCode.lit, 3)
+                        , RefInst(OpCode.lod, RelAddr(1, -2))
+                        , OpInst(Operator.add)
+                        , RefInst(OpCode.cal, RelAddr(0, 7))
+                        , OpInst(Operator.wrt)
+                        , RetInst(1, 2)
+                        ])
+        self.assertEqual(predecode(code), [(LIT, 3, 0, 0), (LOD, 1, -2, 0), (ADD, 0, 0, 0), (CAL, 0, 7, 0), (WRT, 0, 0, 0), (RET, 1, 2, 0)])
+
+    def test_fuse(self):
+        prog = predecode(assemble([ RefInst(OpCode.lod, RelAddr(0, 2))   # 0: x := x - 1
+                                  , ValInst(OpCode.lit, 1)
+                                  , OpInst(Operator.sub)
+                                  , RefInst(OpCode.sto, RelAddr(0, 2))
+                                  , RefInst(OpCode.lod, RelAddr(0, 2))   # 4: if x > 0 then
+                                  , ValInst(OpCode.lit, 0)
+                                  , OpInst(Operator.gr)
+                                  , ValInst(OpCode.jpc, 12)
+                                  , RefInst(OpCode.lod, RelAddr(0, 2))   # 8: y := x * y
+                                  , RefInst(OpCode.lod, RelAddr(0, 3))
+                                  , OpInst(Operator.mul)
+                                  , RefInst(OpCode.sto, RelAddr(0, 3))
+                                  , RefInst(OpCode.cal, RelAddr(0, 13))  # 12
+                                  , ValInst(OpCode.ict, 4)
+                                  ]))
+        fused = fuse(prog)
+        self.assertEqual(len(fused), len(prog))
+        self.assertEqual(fused[0], (INC, 0, 2, -1))
+        self.assertEqual(fused[4][:2], (JPC_VK, 0))
+        self.assertEqual(fused[4][3][0], 0)
+        self.assertEqual(fused[4][3][2], 12)
+        self.assertEqual(fused[8][0], STO_VV)
+        self.assertEqual(fused[12], (CAL_ICT, 0, 14, 4))
+        # codes in the middle of sequences are left for jumps into them
+        self.assertEqual(fused[1:4], prog[1:4])
+
+    def test_jump_into_fused_sequence(self):
+        # var x; begin x := 3; while x > 0 do x := x - 1 (entered at `lit 1`) ...
+        code = assemble([ ValInst(OpCode.ict, 4)
+                        , ValInst(OpCode.lit, 3)
+                        , RefInst(OpCode.sto, RelAddr(0, 2))
+                        , RefInst(OpCode.lod, RelAddr(0, 2))
+                        , ValInst(OpCode.jmp, 6)
+                        , RefInst(OpCode.lod, RelAddr(0, 2))
+                        , ValInst(OpCode.lit, 1)              # 6: target in the middle
+                        , OpInst(Operator.add)
+                        , RefInst(OpCode.sto, RelAddr(0, 2))
+                        , RefInst(OpCode.lod, RelAddr(0, 2))
+                        , OpInst(Operator.wrt)
+                        , RetInst(0, 0)
+                        ])
+        for superinstructions in [False, True]:
+            self.assertEqual(self.output(Pl0VM(code, superinstructions=superinstructions).run), '4')
+
+    def test_run_without_superinstructions(self):
+        Pl0VM(self.compile('test/integrate1.pl'), superinstructions=False).run()
+        self.assertEqual(self.buf.getvalue(), '785595\n84361212\n27\n')
+
+    def test_run(self):
+        for file_name in ['resources/sample2.pl', 'test/integrate1.pl']:
+            self.assertEqual(self.output(Pl0VM(self.compile(file_name)).run), '785595\n84361212\n27\n', file_name)
+
+    def test_deep_recursion_and_nesting(self):
+        Pl0VM(self.compile('test/integrate2.pl')).run()
+        self.assertEqual(self.buf.getvalue(), '4501500\n28\n')
+
+    def test_stack_overflow(self):
+        sut = Pl0VM(self.compile('test/integrate2.pl'), max_stack=5000)
+        with self.assertRaisesRegex(RuntimeError, "stack overflow"):
+            sut.run()
+
+    def test_tail_calls(self):
+        # count(20000, 0) needs 80000 slots of the stack without tail calls
+        Pl0VM(self.compile('test/tail1.pl'), max_stack=2000).run()
+        self.assertEqual(self.buf.getvalue(), '122000021\n1100\n')
+        sut = Pl0VM(self.compile('test/tail1.pl', tail_calls=False), max_stack=2000)
+        with self.assertRaisesRegex(RuntimeError, "stack overflow"):
+            sut.run()
+
+class TestLoops(TestCase):
+    '''
+    Every main loop generated by `make_loop` runs programs in the same way as `Pl0VM.loop`.
+    '''
+    FILES = [ 'resources/sample1.pl', 'resources/sample2.pl', 'test/integrate1.pl', 'test/integrate2.pl'
+            , 'test/integrate3.pl', 'test/native1.pl', 'test/native2.pl', 'test/tail1.pl', 'test/memo1.pl'
+            , 'test/inline1.pl' ]
+
+    def output(self, make, resume=False):
+        out = MemorySink()
+        vm = make(out)
+        if resume:
+            # small quanta stop the loop at many points, including between calls and their returns
+            while not vm.run(7):
+                pass
+        else:
+            vm.run()
+        return ''.join(out.parts)
+
+    def test_names(self):
+        self.assertEqual(sorted(NAMES), list(range(CAL_ICT + 1)))
+        self.assertEqual(NAMES[ICT], 'ICT')
+
+    def test_all_loops_agree(self):
+        for file_name in self.FILES:
+            for fold in [True, False]:
+                for optimize in [False, True]:
+                    gen = compile_file(file_name, fold)
+                    if optimize:
+                        Peephole().run(gen)
+                    code, funcs = gen.code, gen.funcs
+                    # integrate2.pl makes every loop grow the stack in the middle of recursive calls
+                    expected = self.output(lambda out: Pl0VM(code, superinstructions=False, out=out))
+                    loops = [ ('fused', lambda out: Pl0VM(code, out=out))
+                            , ('memo', lambda out: Pl0MemoVM(code, funcs, out=out))
+                            , ('tiered', lambda out: Pl0TieredVM(code, threshold=1, out=out))
+                            , ('profile', lambda out: Pl0ProfileVM(code, funcs, out=out))
+                            , ('resumable', lambda out: Pl0ResumableVM(code, out=out))
+                            ]
+                    for name, make in loops:
+                        self.assertEqual(self.output(make), expected, (file_name, fold, optimize, name))
+                    self.assertEqual(self.output(lambda out: Pl0ResumableVM(code, out=out), True), expected,
+                                     (file_name, fold, optimize, 'resumable'))
+                    self.assertEqual(self.output(lambda out: Pl0ResumableVM(code, superinstructions=False, out=out),
+                                                 True), expected, (file_name, fold, optimize, 'resumable unfused'))
+
+if __name__ == '__main__':
+    main()